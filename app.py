@@ -6,34 +6,58 @@ Routes are organized in separate blueprint modules in the routes package.
 """
 
 from flask import Flask
-from database import init_database, add_sample_data
+from config import load_storage_config
+from database import configure_database, init_database, add_sample_data
 from routes import register_blueprints
+import metrics
+from slow_query_log import configure_slow_query_log
+from services.payment_jobs import configure_payment_queue, get_payment_queue
 import webbrowser
 from threading import Timer
 
 def open_browser():
     webbrowser.open_new("http://127.0.0.1:5000")
 
-def create_app():
+def create_app(config=None):
     """
     Application factory function to create and configure Flask app.
     
+    Args:
+        config: Optional mapping merged into app.config (e.g. LIBRARY_DB_PATH,
+                LIBRARY_DB_JOURNAL_MODE; see config.py for all storage keys).
+                PAYMENT_GATEWAY replaces the gateway used by queued payments.
+    
     Returns:
         Flask: Configured Flask application instance
     """
     app = Flask(__name__)
+    if config:
+        app.config.update(config)
     #@app.route('/')
     #def index():
     #    return "Welcome to the Library Management System"
         
     app.secret_key = "super secret key"
     
-    # Initialize the database
+    # Apply storage settings (env vars < app.config) and initialize the database.
+    # The payment queue is replaced first so no old worker writes to the new database.
+    settings = load_storage_config(app.config)
+    configure_payment_queue(settings['LIBRARY_PAYMENT_WORKERS'], app.config.get('PAYMENT_GATEWAY'))
+    configure_database(settings)
+    configure_slow_query_log(settings['LIBRARY_SLOW_QUERY_LOG'], settings['LIBRARY_SLOW_QUERY_MS'],
+                             settings['LIBRARY_SLOW_QUERY_LOG_MAX_BYTES'], settings['LIBRARY_SLOW_QUERY_LOG_BACKUPS'])
     init_database()
     
+    # Restart payment jobs a previous run left queued
+    get_payment_queue().resume()
+    
     # Add sample data for testing and demonstration
     add_sample_data()
     
+    # Per-request latency/SQL metrics (/metrics) and optional X-Profile reports
+    if settings['LIBRARY_METRICS_ENABLED']:
+        metrics.init_app(app, profiling=settings['LIBRARY_PROFILING_ENABLED'])
+    
     # Register all route blueprints
     register_blueprints(app)
     
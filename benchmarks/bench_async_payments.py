@@ -0,0 +1,66 @@
+"""
+Benchmark: nightly fee collection, sequential vs async fan-out
+
+Charges `--charges` patrons through the fake gateway server (one request
+costs `--latency` seconds). The sequential figure is one charge at a time,
+like calling PaymentGateway.process_payment() in a loop; it is timed on a
+sample and extrapolated. The async runs use AsyncPaymentGateway's batch API
+at each `--concurrency`, over reused keep-alive connections, with
+`--failure-rate` of gateway requests answered 503 and retried.
+
+Usage:
+    python benchmarks/bench_async_payments.py [--charges 2000] [--latency 0.5] [--concurrency 10 50 200] [--failure-rate 0.02]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.async_payment_service import AsyncPaymentGateway
+from fake_gateway import FakeGatewayServer
+
+SEQUENTIAL_SAMPLE = 10
+
+
+async def collect(base_url: str, charges, concurrency: int):
+    async with AsyncPaymentGateway(base_url=base_url, max_concurrency=concurrency, backoff=0.05) as gateway:
+        start = time.perf_counter()
+        results = await gateway.process_payments(charges)
+        return time.perf_counter() - start, results, gateway.stats()
+
+
+async def run(args):
+    charges = [(f'{100000 + i % 900000}', 5.0, 'Late fees') for i in range(args.charges)]
+    async with FakeGatewayServer(args.latency, args.failure_rate, seed=1) as server:
+        print(f"{'mode':<16} {'charges':>8} {'seconds':>9} {'charges/s':>10} {'failed':>7} "
+              f"{'retries':>8} {'connections':>12}")
+
+        elapsed, results, stats = await collect(server.base_url, charges[:SEQUENTIAL_SAMPLE], 1)
+        estimate = elapsed / SEQUENTIAL_SAMPLE * args.charges
+        print(f"{'sequential':<16} {args.charges:>8} {estimate:>8.0f}* {args.charges / estimate:>10.1f} "
+              f"{'-':>7} {stats['retries']:>8} {stats['connections_opened']:>12}")
+
+        for concurrency in args.concurrency:
+            elapsed, results, stats = await collect(server.base_url, charges, concurrency)
+            failed = sum(1 for success, _, _ in results if not success)
+            print(f"{f'async x{concurrency}':<16} {args.charges:>8} {elapsed:>9.1f} {args.charges / elapsed:>10.1f} "
+                  f"{failed:>7} {stats['retries']:>8} {stats['connections_opened']:>12}")
+    print(f"* extrapolated from {SEQUENTIAL_SAMPLE} charges")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare sequential and async batch charging.')
+    parser.add_argument('--charges', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.5, help='Gateway seconds per request')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--failure-rate', type=float, default=0.02, help='Share of gateway requests answered 503')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark: book lookup cache on vs off
+
+Runs repeated borrow/return cycles through the service layer, each preceded
+by the lookups the routes make around them (get_book_by_id for the fee
+payment page, get_book_by_isbn for the duplicate-ISBN check), once with the
+book cache disabled and once enabled, and prints cycle throughput and the
+cache hit rate.
+
+Usage:
+    python benchmarks/bench_book_cache.py [--books 200] [--cycles 5000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+from config import load_storage_config
+from services.library_service import borrow_book_by_patron, return_book_by_patron
+
+
+def seed(count: int):
+    conn = database.get_db_connection()
+    try:
+        conn.executemany('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, 5, 5)
+        ''', ((f'Book {i}', f'Author {i % 50}', f'979{i:010d}') for i in range(1, count + 1)))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run(enabled: bool, books: int, cycles: int, lookups: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        database.configure_database(load_storage_config({
+            'LIBRARY_DB_PATH': os.path.join(tmp, 'cache.db'),
+            'LIBRARY_BOOK_CACHE_ENABLED': enabled,
+        }))
+        database.init_database()
+        seed(books)
+        rng = random.Random(42)
+
+        start = time.perf_counter()
+        for _ in range(cycles):
+            book_id = rng.randint(1, books)
+            for _ in range(lookups):
+                database.get_book_by_id(book_id)
+                database.get_book_by_isbn(f'979{book_id:010d}')
+            borrow_book_by_patron('123456', book_id)
+            return_book_by_patron('123456', book_id)
+        elapsed = time.perf_counter() - start
+
+        stats = database.get_book_cache_stats()
+        database.close_pool()
+    return elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare borrow/return cycles with the book cache on and off.')
+    parser.add_argument('--books', type=int, default=200)
+    parser.add_argument('--cycles', type=int, default=5000)
+    parser.add_argument('--lookups', type=int, default=3, help='lookups by id and by ISBN per cycle')
+    args = parser.parse_args()
+
+    print(f"{'cache':<6} {'cycles/s':>9} {'hit rate':>9} {'evictions':>10}")
+    for enabled in (False, True):
+        elapsed, stats = run(enabled, args.books, args.cycles, args.lookups)
+        print(f"{'on' if enabled else 'off':<6} {args.cycles / elapsed:>9.0f} "
+              f"{stats['hit_rate']:>8.0%} {stats['evictions']:>10}")
+
+
+if __name__ == '__main__':
+    main()
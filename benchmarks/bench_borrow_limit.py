@@ -0,0 +1,93 @@
+"""
+Benchmark: borrow latency as loan history grows
+
+Seeds borrow_records with a growing history of returned loans (spread over
+many patrons, with a heavy share for the benchmarked patron) and times
+borrow_book_by_patron() / return_book_by_patron() cycles. Also times the
+limit check on its own: the old COUNT(*) over borrow_records against the
+patrons.active_loans counter read.
+
+Usage:
+    python benchmarks/bench_borrow_limit.py [--history 0 10000 100000 1000000] [--cycles 500]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+from config import load_storage_config
+from services.library_service import borrow_book_by_patron, return_book_by_patron
+
+PATRON_ID = '123456'
+
+
+def seed(history: int):
+    now = datetime.now()
+    conn = database.get_db_connection()
+    try:
+        conn.execute('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES ('Benchmark Book', 'Author', '9790000000001', 10, 10)
+        ''')
+        conn.executemany('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date)
+            VALUES (?, 1, ?, ?, ?)
+        ''', ((PATRON_ID if i % 10 == 0 else f'{200000 + i % 5000}',
+               (now - timedelta(minutes=i + 20160)).isoformat(),
+               (now - timedelta(minutes=i)).isoformat(),
+               (now - timedelta(minutes=i + 1)).isoformat()) for i in range(history)))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def time_query(statement: str, repeat: int) -> float:
+    conn = database.get_db_connection()
+    try:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(statement, (PATRON_ID,)).fetchone()
+        return (time.perf_counter() - start) / repeat
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure borrow latency against loan history size.')
+    parser.add_argument('--history', type=int, nargs='+', default=[0, 10000, 100000, 1000000])
+    parser.add_argument('--cycles', type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'history':>9} {'borrow us':>10} {'return us':>10} {'COUNT(*) us':>12} {'counter us':>11}")
+    for history in args.history:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.configure_database(load_storage_config({'LIBRARY_DB_PATH': os.path.join(tmp, 'limit.db')}))
+            database.init_database()
+            seed(history)
+
+            borrow = returned = 0.0
+            for _ in range(args.cycles):
+                start = time.perf_counter()
+                borrow_book_by_patron(PATRON_ID, 1)
+                middle = time.perf_counter()
+                return_book_by_patron(PATRON_ID, 1)
+                returned += time.perf_counter() - middle
+                borrow += middle - start
+
+            count = time_query('SELECT COUNT(*) FROM borrow_records '
+                               'WHERE patron_id = ? AND return_date IS NULL', args.cycles)
+            counter = time_query('SELECT active_loans FROM patrons WHERE patron_id = ?', args.cycles)
+            print(f"{history:>9} {borrow / args.cycles * 1e6:>10.0f} {returned / args.cycles * 1e6:>10.0f} "
+                  f"{count * 1e6:>12.1f} {counter * 1e6:>11.1f}")
+            database.close_pool()
+
+
+if __name__ == '__main__':
+    main()
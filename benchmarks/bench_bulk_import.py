@@ -0,0 +1,74 @@
+"""
+Benchmark: bulk catalog import vs one add_book_to_catalog() call per book
+
+Writes a CSV of generated books and loads it into an empty database with
+services.import_service.import_books(), then loads the first --loop-max of
+the same books one at a time through add_book_to_catalog() (duplicate check,
+connection and commit per book). Prints rows/s for both.
+
+Usage:
+    python benchmarks/bench_bulk_import.py [--rows 10000 100000 500000] [--loop-max 5000]
+"""
+
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+from config import load_storage_config
+from services.import_service import import_books, IMPORT_BATCH_SIZE
+from services.library_service import add_book_to_catalog
+
+
+def generate(count: int):
+    for i in range(count):
+        yield f'Generated Title {i}', f'Author {i % 5000}', f'979{i:010d}', i % 5 + 1
+
+
+def use_database(path: str):
+    database.close_pool()
+    database.configure_database(load_storage_config({'LIBRARY_DB_PATH': path}))
+    database.init_database()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare bulk import with per-book inserts.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 500000])
+    parser.add_argument('--loop-max', type=int, default=5000, help='books loaded one at a time')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'bulk rows/s':>12} {'per-book rows/s':>16} {'speedup':>8}")
+    for count in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = os.path.join(tmp, 'books.csv')
+            with open(csv_path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['title', 'author', 'isbn', 'total_copies'])
+                writer.writerows(generate(count))
+
+            use_database(os.path.join(tmp, 'bulk.db'))
+            with open(csv_path, 'rb') as stream:
+                result = import_books(stream, 'csv', batch_size=args.batch_size)
+            assert result['inserted'] == count, result['errors'][:5]
+            bulk = result['rows_per_second']
+
+            use_database(os.path.join(tmp, 'loop.db'))
+            looped = min(count, args.loop_max)
+            start = time.perf_counter()
+            for title, author, isbn, copies in generate(looped):
+                add_book_to_catalog(title, author, isbn, copies)
+            per_book = looped / (time.perf_counter() - start)
+
+            print(f"{count:>8} {bulk:>12.0f} {per_book:>16.0f} {bulk / per_book:>7.0f}x")
+            database.close_pool()
+
+
+if __name__ == '__main__':
+    main()
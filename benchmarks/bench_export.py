@@ -0,0 +1,85 @@
+"""
+Benchmark: streaming export vs get_all_books()
+
+Seeds the books table at each size and writes it to CSV twice: once from
+get_all_books() (the whole table as a list of dicts) and once with
+services.export_service.export_table(). Prints time and peak Python memory
+(tracemalloc) for each; the streamed peak should not grow with the table.
+
+Usage:
+    python benchmarks/bench_export.py [--sizes 10000 100000 1000000] [--gzip]
+"""
+
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+from config import load_storage_config
+from services.export_service import export_table
+
+
+def seed(count: int):
+    conn = database.get_db_connection()
+    try:
+        conn.executemany('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, 3, 3)
+        ''', ((f'Exported Title {i}', f'Author {i % 1000}', f'979{i:010d}') for i in range(count)))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def list_export(path: str):
+    books = database.get_all_books()
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(books[0]))
+        writer.writeheader()
+        writer.writerows(books)
+
+
+def streamed_export(path: str, compress: bool):
+    with open(path, 'wb') as f:
+        for chunk in export_table('books', 'csv', compress):
+            f.write(chunk)
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare streamed export with get_all_books().')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--gzip', action='store_true', help='gzip the streamed export')
+    args = parser.parse_args()
+
+    print(f"{'books':>9} {'list s':>8} {'list peak MB':>13} {'stream s':>9} {'stream peak MB':>15}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.configure_database(load_storage_config({'LIBRARY_DB_PATH': os.path.join(tmp, 'export.db')}))
+            database.init_database()
+            seed(size)
+            list_time, list_peak = measure(list_export, os.path.join(tmp, 'list.csv'))
+            stream_time, stream_peak = measure(streamed_export, os.path.join(tmp, 'stream.csv'), args.gzip)
+            print(f"{size:>9} {list_time:>8.2f} {list_peak / 2**20:>13.1f} "
+                  f"{stream_time:>9.2f} {stream_peak / 2**20:>15.2f}")
+            database.close_pool()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark: whole-library late-fee run, looped per-book vs batch
+
+Seeds open overdue loans spread over many patrons and times billing every
+one of them with calculate_late_fee_for_book() (one query per loan) against
+calculate_late_fees_batch() (one streamed query, fees looked up per chunk).
+The looped run is skipped above --loop-max loans.
+
+Usage:
+    python benchmarks/bench_late_fees.py [--loans 1000 10000 100000] [--loop-max 10000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+from config import load_storage_config
+from services.library_service import calculate_late_fee_for_book, calculate_late_fees_batch
+
+
+def seed(count: int, patrons: int):
+    rng = random.Random(42)
+    now = datetime.now()
+    conn = database.get_db_connection()
+    try:
+        conn.executemany('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, 1000, 1000)
+        ''', ((f'Book {i}', 'Author', f'979{i:010d}') for i in range(1, count + 1)))
+        loans = []
+        for i in range(count):
+            due_date = now - timedelta(days=rng.randint(1, 60), hours=rng.randint(0, 23))
+            loans.append((f'{100000 + i % patrons}', i + 1,
+                          (due_date - timedelta(days=14)).isoformat(), due_date.isoformat()))
+        conn.executemany('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+            VALUES (?, ?, ?, ?)
+        ''', loans)
+        conn.commit()
+        return [(patron_id, book_id) for patron_id, book_id, _, _ in loans]
+    finally:
+        conn.close()
+
+
+def looped_run(loans):
+    totals = {}
+    for patron_id, book_id in loans:
+        fee_amount = calculate_late_fee_for_book(patron_id, book_id)['fee_amount']
+        totals[patron_id] = totals.get(patron_id, 0.0) + fee_amount
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare looped and batch whole-library late-fee runs.')
+    parser.add_argument('--loans', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--loans-per-patron', type=int, default=3)
+    parser.add_argument('--loop-max', type=int, default=10000, help='skip the looped run above this size')
+    args = parser.parse_args()
+
+    print(f"{'loans':>8} {'looped ms':>10} {'batch ms':>9} {'speedup':>8} {'match':>6}")
+    for count in args.loans:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.configure_database(load_storage_config({'LIBRARY_DB_PATH': os.path.join(tmp, 'fees.db')}))
+            database.init_database()
+            loans = seed(count, max(1, count // args.loans_per_patron))
+
+            start = time.perf_counter()
+            result = calculate_late_fees_batch()
+            batch = time.perf_counter() - start
+
+            if count <= args.loop_max:
+                start = time.perf_counter()
+                totals = looped_run(loans)
+                looped = time.perf_counter() - start
+                match = all(round(totals[p], 2) == info['fee_amount'] for p, info in result['patrons'].items())
+                print(f"{count:>8} {looped * 1000:>10.0f} {batch * 1000:>9.1f} {looped / batch:>7.0f}x {str(match):>6}")
+            else:
+                print(f"{count:>8} {'-':>10} {batch * 1000:>9.1f} {'-':>8} {'-':>6}")
+            database.close_pool()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark: cost of request instrumentation
+
+Times `--requests` GETs per endpoint through Flask's test client with
+LIBRARY_METRICS_ENABLED off and on, and once with an X-Profile header
+(cProfile on every request), so the per-request overhead of the metrics
+middleware and the SQL statement observer can be read off directly. Each
+figure is the best of `--rounds` alternating runs.
+
+Usage:
+    python benchmarks/bench_metrics_overhead.py [--requests 2000] [--rounds 3]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+import metrics
+from app import create_app
+
+ENDPOINTS = ('/api/books/1', '/api/books?limit=20', '/catalog')
+
+
+def timed(client, path: str, requests: int, headers=None) -> float:
+    client.get(path, headers=headers)
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get(path, headers=headers)
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure metrics middleware overhead per request.')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'endpoint':<22} {'off us':>8} {'on us':>8} {'overhead':>9} {'X-Profile us':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'metrics.db')
+        off_client = create_app({'LIBRARY_DB_PATH': path, 'LIBRARY_METRICS_ENABLED': False}).test_client()
+        on_client = create_app({'LIBRARY_DB_PATH': path, 'LIBRARY_PROFILING_ENABLED': True}).test_client()
+        for endpoint in ENDPOINTS:
+            off, on = [], []
+            for _ in range(args.rounds):
+                # The SQL observer is process-wide, so it is attached only for the "on" runs
+                database.remove_statement_observer(metrics._observe_statement)
+                off.append(timed(off_client, endpoint, args.requests))
+                database.add_statement_observer(metrics._observe_statement)
+                on.append(timed(on_client, endpoint, args.requests))
+            profiled = timed(on_client, endpoint, max(args.requests // 10, 1), {'X-Profile': '1'})
+            off, on = min(off), min(on)
+            print(f"{endpoint:<22} {off * 1e6:>8.0f} {on * 1e6:>8.0f} {(on - off) / off:>8.1%} "
+                  f"{profiled * 1e6:>13.0f}")
+        database.close_pool()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark: patron payment history lookups as the payments ledger grows
+
+Seeds the payments table with `--rows` ledger entries spread over 50,000
+patrons (one heavy patron gets 1% of them) and times the first page and a
+page deep into the heavy patron's history through get_patron_payments_page(),
+against the same page fetched with LIMIT/OFFSET, and an idempotency key lookup.
+
+Usage:
+    python benchmarks/bench_payment_history.py [--rows 10000 100000 1000000] [--repeat 200]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+from config import load_storage_config
+
+PATRON_ID = '123456'
+PAGE = 20
+
+
+def seed(rows: int):
+    start = datetime(2020, 1, 1)
+    conn = database.get_db_connection()
+    try:
+        conn.executemany('''
+            INSERT INTO payments (kind, patron_id, book_id, amount, status, transaction_id,
+                                  idempotency_key, message, created_at, updated_at)
+            VALUES ('charge', ?, 1, 5.0, 'succeeded', ?, ?, 'Payment successful!', ?, ?)
+        ''', ((PATRON_ID if i % 100 == 0 else f'{200000 + i % 50000}', f'txn_{i}', f'key-{i}',
+               (start + timedelta(seconds=i)).isoformat(), (start + timedelta(seconds=i)).isoformat())
+              for i in range(rows)))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def timed(call, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        call()
+    return (time.perf_counter() - start) / repeat
+
+
+def offset_page(offset: int):
+    conn = database.get_db_connection()
+    try:
+        return conn.execute('''
+            SELECT * FROM payments WHERE patron_id = ?
+            ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?
+        ''', (PATRON_ID, PAGE, offset)).fetchall()
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time payment history queries against ledger size.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'first page us':>14} {'deep keyset us':>15} {'deep OFFSET us':>15} {'by key us':>10}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.configure_database(load_storage_config({'LIBRARY_DB_PATH': os.path.join(tmp, 'ledger.db')}))
+            database.init_database()
+            seed(rows)
+
+            # Walk to the middle of the heavy patron's history to get a deep cursor
+            depth = rows // 100 // 2 // PAGE * PAGE
+            payments, _ = database.get_patron_payments_page(PATRON_ID, limit=max(depth, 1))
+            cursor = (payments[-1]['created_at'], payments[-1]['id'])
+
+            first = timed(lambda: database.get_patron_payments_page(PATRON_ID, limit=PAGE), args.repeat)
+            deep = timed(lambda: database.get_patron_payments_page(PATRON_ID, cursor, PAGE), args.repeat)
+            offset = timed(lambda: offset_page(depth), args.repeat)
+            by_key = timed(lambda: database.get_payment_by_key(f'key-{rows // 2}'), args.repeat)
+            print(f"{rows:>9} {first * 1e6:>14.0f} {deep * 1e6:>15.0f} {offset * 1e6:>15.0f} {by_key * 1e6:>10.1f}")
+            database.close_pool()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark: late fee payment request throughput, blocking vs queued
+
+Simulates `--clients` concurrent requests paying late fees through a gateway
+that takes `--latency` seconds per charge. The blocking path calls
+pay_late_fees() in the request thread; the queued path calls
+enqueue_late_fee_payment() and leaves the charge to the worker pool, so the
+request only pays for an INSERT. Reports requests/s for both and how long
+the workers take to drain the queue.
+
+Usage:
+    python benchmarks/bench_payment_jobs.py [--clients 16] [--requests 400] [--latency 0.5] [--workers 8 32]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+from config import load_storage_config
+from services.library_service import enqueue_late_fee_payment, pay_late_fees
+from services.payment_jobs import configure_payment_queue, get_payment_queue, shutdown_payment_queue
+from services.payment_service import PaymentGateway
+
+PATRONS = 100
+
+
+class SlowGateway(PaymentGateway):
+    """Gateway that always approves after a fixed delay."""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+
+    def process_payment(self, patron_id, amount, description=""):
+        time.sleep(self.latency)
+        return True, f"txn_{patron_id}_{time.time_ns()}", f"Payment of ${amount:.2f} processed successfully"
+
+
+def seed():
+    now = datetime.now()
+    conn = database.get_db_connection()
+    try:
+        conn.execute('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES ('Benchmark Book', 'Author', '9790000000001', ?, 0)
+        ''', (PATRONS,))
+        conn.executemany('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+            VALUES (?, 1, ?, ?)
+        ''', ((f'{100000 + i}', (now - timedelta(days=24)).isoformat(), (now - timedelta(days=10)).isoformat())
+              for i in range(PATRONS)))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run_clients(request, clients: int, requests: int) -> float:
+    """Issue `requests` calls from `clients` threads; returns elapsed seconds."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(lambda i: request(f'{100000 + i % PATRONS}', 1), range(requests)))
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for result in results if not result[0])
+    if failed:
+        print(f"  warning: {failed} requests failed: {next(r[1] for r in results if not r[0])}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare blocking and queued late fee payment throughput.')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent request threads')
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--latency', type=float, default=0.5, help='Gateway seconds per charge')
+    parser.add_argument('--workers', type=int, nargs='+', default=[8, 32], help='Payment worker pool sizes')
+    args = parser.parse_args()
+
+    gateway = SlowGateway(args.latency)
+    with tempfile.TemporaryDirectory() as tmp:
+        database.configure_database(load_storage_config({'LIBRARY_DB_PATH': os.path.join(tmp, 'payments.db')}))
+        database.init_database()
+        seed()
+
+        # The blocking path is bounded by clients / latency, so a tenth of the requests is enough
+        blocking_requests = max(args.clients, args.requests // 10)
+        elapsed = run_clients(lambda patron_id, book_id: pay_late_fees(patron_id, book_id, gateway),
+                              args.clients, blocking_requests)
+        print(f"{'mode':<20} {'requests':>9} {'requests/s':>11} {'drain s':>8} {'payments/s':>11}")
+        print(f"{'blocking':<20} {blocking_requests:>9} {blocking_requests / elapsed:>11.1f} {'-':>8} "
+              f"{blocking_requests / elapsed:>11.1f}")
+
+        for workers in args.workers:
+            configure_payment_queue(workers, gateway)
+            start = time.perf_counter()
+            elapsed = run_clients(enqueue_late_fee_payment, args.clients, args.requests)
+            get_payment_queue().wait()
+            drained = time.perf_counter() - start
+            stats = get_payment_queue().stats()
+            shutdown_payment_queue()
+            print(f"{f'queued ({workers} workers)':<20} {args.requests:>9} {args.requests / elapsed:>11.1f} "
+                  f"{drained:>8.1f} {stats['succeeded'] / drained:>11.1f}")
+        database.close_pool()
+
+
+if __name__ == '__main__':
+    main()
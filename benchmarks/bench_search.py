@@ -0,0 +1,97 @@
+"""
+Benchmark: catalog search, Python full scan vs SQL pushdown
+
+Seeds a throw-away database at each catalog size and times the old
+search_books_in_catalog implementation (get_all_books() + substring test in
+Python) against database.search_books() for title/author/ISBN queries and
+database.search_books_fulltext() for ranked full-text queries.
+
+Usage:
+    python benchmarks/bench_search.py [--sizes 10000 100000 1000000] [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+from config import load_storage_config
+
+QUERIES = [
+    ('title', 'contains', 'river 0042'),
+    ('title', 'prefix', 'the river 00042'),
+    ('author', 'contains', 'smith'),
+    ('isbn', 'exact', '9790000012345'),
+    ('any', 'fulltext', 'river 0000042'),
+]
+
+
+def legacy_search(search_term: str, search_type: str):
+    """The pre-pushdown implementation: load every book, filter in Python."""
+    search_term = search_term.strip().lower()
+    results = []
+    for book in database.get_all_books():
+        if search_type in ('title', 'any') and search_term in book['title'].lower():
+            results.append(book)
+        elif search_type == 'author' and search_term in book['author'].lower():
+            results.append(book)
+        elif search_type == 'isbn' and search_term == book['isbn']:
+            results.append(book)
+    return results
+
+
+def seed(count: int):
+    authors = ['Smith', 'Jones', 'Garcia', 'Chen', 'Okafor', 'Novak', 'Silva']
+    conn = database.get_db_connection()
+    try:
+        conn.executemany('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, 3, 3)
+        ''', ((f'The River {i:07d}', f'{authors[i % len(authors)]} {i % 1000}', f'979{i:010d}')
+              for i in range(count)))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def best_of(repeat: int, func, *args, **kwargs) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare Python full-scan search with SQL pushdown.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--limit', type=int, default=100, help='LIMIT used by the SQL path')
+    args = parser.parse_args()
+
+    print(f"{'books':>9} {'type':<7} {'match':<9} {'legacy ms':>10} {'sql ms':>9} {'speedup':>8}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.configure_database(load_storage_config({'LIBRARY_DB_PATH': os.path.join(tmp, 'search.db')}))
+            database.init_database()
+            seed(size)
+            for search_type, match, term in QUERIES:
+                legacy = best_of(args.repeat, legacy_search, term, search_type)
+                if search_type == 'any':
+                    pushed = best_of(args.repeat, database.search_books_fulltext, term, limit=args.limit)
+                else:
+                    pushed = best_of(args.repeat, database.search_books, term, search_type,
+                                     match=match, limit=args.limit)
+                print(f"{size:>9} {search_type:<7} {match:<9} {legacy * 1000:>10.1f} "
+                      f"{pushed * 1000:>9.2f} {legacy / pushed:>7.0f}x")
+            database.close_pool()
+
+
+if __name__ == '__main__':
+    main()
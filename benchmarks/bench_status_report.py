@@ -0,0 +1,109 @@
+"""
+Benchmark: patron status report, N+1 queries vs two set-based queries
+
+Seeds a patron with a number of overdue loans and a long returned history,
+then times the old get_patron_status_report implementation (borrowed books,
+one calculate_late_fee_for_book() per overdue book, then a separate history
+query) against the current two-query version.
+
+Usage:
+    python benchmarks/bench_status_report.py [--history 10 100 1000 10000] [--overdue 5]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+from config import load_storage_config
+from services.library_service import calculate_late_fee_for_book, get_patron_status_report
+
+PATRON_ID = '123456'
+
+
+def legacy_status_report(patron_id: str):
+    """The pre-rewrite implementation: one late-fee lookup per overdue book."""
+    currently_borrowed = database.get_patron_borrowed_books(patron_id)
+    total_late_fees = 0.00
+    for book in currently_borrowed:
+        if book['is_overdue']:
+            total_late_fees += calculate_late_fee_for_book(patron_id, book['book_id'])['fee_amount']
+    conn = database.get_db_connection()
+    try:
+        records = conn.execute('''
+            SELECT br.*, b.title, b.author 
+            FROM borrow_records br 
+            JOIN books b ON br.book_id = b.id 
+            WHERE br.patron_id = ? AND br.return_date IS NOT NULL
+            ORDER BY br.borrow_date DESC
+        ''', (patron_id,)).fetchall()
+    finally:
+        conn.close()
+    history = [(datetime.fromisoformat(r['borrow_date']), datetime.fromisoformat(r['due_date']),
+                datetime.fromisoformat(r['return_date'])) for r in records]
+    return round(total_late_fees, 2), history
+
+
+def seed(history: int, overdue: int):
+    now = datetime.now()
+    conn = database.get_db_connection()
+    try:
+        conn.executemany('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, 10, 10)
+        ''', ((f'Book {i}', 'Author', f'979{i:010d}') for i in range(1, 101)))
+        returned = []
+        for i in range(history):
+            borrowed = now - timedelta(days=30 + i % 3000, minutes=i)
+            returned.append((PATRON_ID, i % 100 + 1, borrowed.isoformat(),
+                             (borrowed + timedelta(days=14)).isoformat(),
+                             (borrowed + timedelta(days=10 + i % 10)).isoformat()))
+        for i in range(overdue):
+            returned.append((PATRON_ID, i + 1, (now - timedelta(days=20 + i)).isoformat(),
+                             (now - timedelta(days=6 + i)).isoformat(), None))
+        conn.executemany('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date)
+            VALUES (?, ?, ?, ?, ?)
+        ''', returned)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def best_of(repeat: int, func, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the N+1 status report with the two-query version.')
+    parser.add_argument('--history', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--overdue', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'history':>8} {'overdue':>8} {'legacy ms':>10} {'report ms':>10} {'speedup':>8}")
+    for history in args.history:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.configure_database(load_storage_config({'LIBRARY_DB_PATH': os.path.join(tmp, 'report.db')}))
+            database.init_database()
+            seed(history, args.overdue)
+            legacy = best_of(args.repeat, legacy_status_report, PATRON_ID)
+            current = best_of(args.repeat, get_patron_status_report, PATRON_ID)
+            print(f"{history:>8} {args.overdue:>8} {legacy * 1000:>10.2f} {current * 1000:>10.2f} "
+                  f"{legacy / current:>7.1f}x")
+            database.close_pool()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark: /catalog read throughput while a writer loop hammers /borrow
+
+Runs the same workload against a rollback-journal database and a WAL
+database and prints catalog requests/s plus the number of failed requests
+(typically "database is locked") for each.
+
+Usage:
+    python benchmarks/bench_wal_catalog.py [--seconds 5] [--readers 4] [--books 500]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+from app import create_app
+
+
+def seed_books(count: int):
+    """Insert `count` extra books so /catalog has a realistic payload."""
+    conn = database.get_db_connection()
+    try:
+        conn.executemany('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(f'Benchmark Book {i:06d}', f'Author {i % 97}', f'979{i:010d}', 5, 5)
+              for i in range(count)])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run(journal_mode: str, seconds: float, readers: int, books: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            'LIBRARY_DB_PATH': os.path.join(tmp, 'bench.db'),
+            'LIBRARY_DB_JOURNAL_MODE': journal_mode,
+            'LIBRARY_DB_POOL_SIZE': readers + 2,
+        })
+        seed_books(books)
+
+        stop = threading.Event()
+        lock = threading.Lock()
+        counts = {'reads': 0, 'read_errors': 0, 'writes': 0, 'write_errors': 0}
+
+        def reader():
+            client = app.test_client()
+            while not stop.is_set():
+                response = client.get('/catalog')
+                with lock:
+                    counts['reads' if response.status_code == 200 else 'read_errors'] += 1
+
+        def writer():
+            client = app.test_client()
+            while not stop.is_set():
+                # Borrow then return the same copy so availability never runs out
+                for url in ('/borrow', '/return'):
+                    response = client.post(url, data={'patron_id': '654321', 'book_id': '1'})
+                    with lock:
+                        counts['writes' if response.status_code < 500 else 'write_errors'] += 1
+
+        threads = [threading.Thread(target=reader) for _ in range(readers)]
+        threads.append(threading.Thread(target=writer))
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        database.close_pool()
+
+    counts['journal_mode'] = journal_mode
+    counts['reads_per_sec'] = counts['reads'] / seconds
+    counts['writes_per_sec'] = counts['writes'] / seconds
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--books', type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'journal':<8} {'reads/s':>10} {'read errs':>10} {'writes/s':>10} {'write errs':>11}")
+    for mode in ('DELETE', 'WAL'):
+        result = run(mode, args.seconds, args.readers, args.books)
+        print(f"{mode:<8} {result['reads_per_sec']:>10.1f} {result['read_errors']:>10} "
+              f"{result['writes_per_sec']:>10.1f} {result['write_errors']:>11}")
+
+
+if __name__ == '__main__':
+    main()
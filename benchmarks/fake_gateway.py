@@ -0,0 +1,162 @@
+"""
+Fake payment gateway server for benchmarks and tests
+
+A small asyncio HTTP/1.1 server speaking the API AsyncPaymentGateway expects
+(POST /charges, POST /refunds, GET /charges/<id>), with keep-alive,
+configurable latency, injected 503s and Idempotency-Key replay. Decisions
+come from services.payment_service's simulate_* helpers, so it approves and
+declines exactly like PaymentGateway.
+
+Usage:
+    python benchmarks/fake_gateway.py [--port 8765] [--latency 0.5] [--failure-rate 0.0]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+from typing import Dict, Optional, Tuple
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.payment_service import simulate_charge, simulate_refund, simulate_status
+
+REASONS = {200: 'OK', 400: 'Bad Request', 402: 'Payment Required', 404: 'Not Found', 503: 'Service Unavailable'}
+
+
+class FakeGatewayServer:
+    """
+    In-process fake gateway.
+
+    Args:
+        latency: Seconds each request takes
+        failure_rate: Share of requests answered with 503
+        fail_first: Answer this many requests with 503 before anything else
+        seed: Random seed for failure injection
+    """
+
+    def __init__(self, latency: float = 0.5, failure_rate: float = 0.0, fail_first: int = 0,
+                 host: str = '127.0.0.1', port: int = 0, seed: Optional[int] = None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.fail_first = fail_first
+        self.host = host
+        self.port = port
+        self.stats = {'connections': 0, 'requests': 0, 'injected_failures': 0, 'replays': 0}
+        self._random = random.Random(seed)
+        self._responses = {}
+        self._server = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> str:
+        """Start listening; returns the base URL."""
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.base_url
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.stats['connections'] += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path = request_line.decode('latin-1').split()[:2]
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                status, data = await self._handle(method, path, headers, body)
+                payload = json.dumps(data).encode()
+                writer.write((f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                              f"Content-Type: application/json\r\n"
+                              f"Content-Length: {len(payload)}\r\n"
+                              f"Connection: keep-alive\r\n\r\n").encode('latin-1') + payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, method: str, path: str, headers: Dict, body: bytes) -> Tuple[int, Dict]:
+        self.stats['requests'] += 1
+        await asyncio.sleep(self.latency)
+
+        key = headers.get('idempotency-key')
+        if key and key in self._responses:
+            self.stats['replays'] += 1
+            return self._responses[key]
+        if self.fail_first > 0 or self._random.random() < self.failure_rate:
+            self.fail_first = max(0, self.fail_first - 1)
+            self.stats['injected_failures'] += 1
+            return 503, {'error': 'Service temporarily unavailable'}
+
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            return 400, {'error': 'Invalid JSON body'}
+
+        if method == 'POST' and path.endswith('/charges'):
+            success, transaction_id, message = simulate_charge(str(data.get('customer_id', '')),
+                                                               float(data.get('amount', 0)))
+            response = (200, {'id': transaction_id, 'message': message}) if success else (402, {'error': message})
+        elif method == 'POST' and path.endswith('/refunds'):
+            success, message = simulate_refund(str(data.get('transaction_id', '')), float(data.get('amount', 0)))
+            response = (200, {'message': message}) if success else (400, {'error': message})
+        elif method == 'GET' and '/charges/' in path:
+            result = simulate_status(path.rsplit('/', 1)[1])
+            response = (404 if result['status'] == 'not_found' else 200, result)
+        else:
+            response = (404, {'error': 'Not found'})
+
+        if key:
+            self._responses[key] = response
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a fake payment gateway.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.5, help='Seconds per request')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of requests answered with 503')
+    args = parser.parse_args()
+
+    async def serve():
+        server = FakeGatewayServer(args.latency, args.failure_rate, host=args.host, port=args.port)
+        print(f"Fake gateway listening on {await server.start()}")
+        await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
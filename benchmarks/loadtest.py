@@ -0,0 +1,401 @@
+"""
+Load test: drive the HTTP endpoints at fixed concurrency and report latency
+
+`run` seeds a synthetic database (or reuses `--db`), serves the app from a
+separate process on a local port, and sends a weighted mix of requests over
+`--concurrency` keep-alive connections for `--duration` seconds:
+
+    catalog          GET  /catalog
+    search           GET  /search?q=<word>&type=title|author
+    api_search       GET  /api/search?q=<word>&type=title|author
+    borrow           POST /borrow            (per-worker patrons, so the borrow limit is never hit)
+    return           POST /return            (books the same worker borrowed)
+    borrower_status  POST /borrower_status   (a patron with loans)
+    late_fee         GET  /api/late_fee/<patron_id>/<book_id>   (an active loan)
+
+The report (JSON on stdout, or `--output`) holds p50/p95/p99/mean/max latency,
+throughput and status codes per endpoint and overall, plus the scale, seed,
+git commit and SQLite version, so two runs can be diffed with `compare`.
+Request choices and seeded data are derived from `--seed`, so reruns issue the same
+request stream (timing still varies with the machine).
+
+Usage:
+    python benchmarks/loadtest.py run [--books 10000] [--patrons 2000] [--loans 50000] [--seed 1]
+                                      [--concurrency 8] [--duration 10] [--warmup 2] [--mix catalog=2,search=1,...]
+                                      [--db bench.db] [--url http://127.0.0.1:5000] [--output run.json]
+    python benchmarks/loadtest.py compare base.json head.json [--tolerance 10]
+"""
+
+import argparse
+import http.client
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+from config import load_storage_config
+from services.synthetic_data_service import generate_library
+
+ENDPOINTS = ('catalog', 'search', 'api_search', 'borrow', 'return', 'borrower_status', 'late_fee')
+
+DEFAULT_MIX = {'catalog': 20, 'search': 15, 'api_search': 15, 'borrow': 10, 'return': 10,
+               'borrower_status': 15, 'late_fee': 15}
+
+BORROW_LIMIT = 5
+
+# Days of loan history seeded; short, so the database has plenty of open loans
+LOAD_HISTORY_DAYS = 90
+
+# Worker w borrows and returns as patrons 900000 + w * PATRONS_PER_WORKER + k
+BORROWER_BASE = 900000
+PATRONS_PER_WORKER = 20
+
+
+def seed_database(path: str, books: int, patrons: int, loans: int, seed: int = 1):
+    """Create and populate() a database at `path`, then restore the previous database settings."""
+    original = load_storage_config({'LIBRARY_DB_PATH': database.DATABASE})
+    database.configure_database(load_storage_config({'LIBRARY_DB_PATH': path}))
+    try:
+        database.init_database()
+        populate(books, patrons, loans, seed)
+    finally:
+        database.configure_database(original)
+
+
+def populate(books: int, patrons: int, loans: int, seed: int = 1):
+    """
+    Add `books` books, `patrons` patrons (IDs 100000...) and `loans` borrow
+    records to the configured, empty database with the synthetic data
+    generator (services/synthetic_data_service.py).
+
+    The loans cover the last 90 days, so a good share of them are still
+    open and some overdue; open loans respect the borrow limit and the
+    copies on the shelf.
+    """
+    generate_library(books, patrons, loans, history_days=LOAD_HISTORY_DAYS, seed=seed)
+
+
+def load_targets(path: str, seed: int = 1, sample: int = 2000) -> Dict:
+    """Read what the request mix needs from a seeded database: book IDs, open loans, search words."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    try:
+        max_book = conn.execute('SELECT MAX(id) FROM books').fetchone()[0] or 1
+        active = conn.execute('''
+            SELECT patron_id, book_id FROM borrow_records
+            WHERE return_date IS NULL AND patron_id < ? ORDER BY id LIMIT ?
+        ''', (str(BORROWER_BASE), sample)).fetchall()
+        patrons = [row[0] for row in conn.execute('''
+            SELECT patron_id FROM patrons WHERE patron_id < ? ORDER BY active_loans DESC, patron_id LIMIT ?
+        ''', (str(BORROWER_BASE), sample))]
+        titles = [row[0] for row in conn.execute('SELECT title FROM books ORDER BY id LIMIT 200')]
+    finally:
+        conn.close()
+    words = sorted({word for title in titles for word in title.split()}) or ['a']
+    rng.shuffle(active)
+    return {'max_book_id': max_book, 'loans': active or [('100000', 1)], 'patrons': patrons or ['100000'],
+            'words': words}
+
+
+def _serve(db_path: str, pool_size: int, port_queue):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from app import create_app
+
+    class KeepAliveHandler(WSGIRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    app = create_app({'LIBRARY_DB_PATH': db_path, 'LIBRARY_DB_POOL_SIZE': pool_size})
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=KeepAliveHandler)
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+def start_server(db_path: str, pool_size: int = 16) -> Tuple[str, multiprocessing.Process]:
+    """Serve the app for `db_path` from a child process (so it does not share the load generator's GIL)."""
+    context = multiprocessing.get_context('spawn')
+    port_queue = context.Queue()
+    process = context.Process(target=_serve, args=(db_path, pool_size, port_queue), daemon=True)
+    process.start()
+    return f'http://127.0.0.1:{port_queue.get(timeout=60)}', process
+
+
+class _Worker(threading.Thread):
+    """One keep-alive connection issuing requests from the mix until the deadline."""
+
+    def __init__(self, index: int, base_url: str, targets: Dict, mix: Dict[str, int], seed: int,
+                 start_at: float, deadline: float):
+        super().__init__(daemon=True)
+        self.rng = random.Random(seed * 1000 + index)
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.targets = targets
+        self.names, self.weights = list(mix), list(mix.values())
+        self.start_at, self.deadline = start_at, deadline
+        self.patrons = [f'{BORROWER_BASE + index * PATRONS_PER_WORKER + k}' for k in range(PATRONS_PER_WORKER)]
+        self.borrowed = []
+        self.samples = []   # (endpoint, seconds, status); status 0 = connection error
+        self.conn = None
+
+    def request(self) -> Tuple[str, str, str, Optional[str]]:
+        name = self.rng.choices(self.names, self.weights)[0]
+        if name == 'return' and not self.borrowed:
+            name = 'borrow'
+        elif name == 'borrow' and len(self.borrowed) >= len(self.patrons) * (BORROW_LIMIT - 1):
+            name = 'return'
+        targets, rng = self.targets, self.rng
+
+        if name == 'catalog':
+            return name, 'GET', '/catalog', None
+        if name in ('search', 'api_search'):
+            query = urlencode({'q': rng.choice(targets['words']), 'type': rng.choice(('title', 'author'))})
+            return name, 'GET', f"{'/search' if name == 'search' else '/api/search'}?{query}", None
+        if name == 'borrow':
+            patron_id, book_id = rng.choice(self.patrons), rng.randint(1, targets['max_book_id'])
+            self.borrowed.append((patron_id, book_id))
+            return name, 'POST', '/borrow', urlencode({'patron_id': patron_id, 'book_id': book_id})
+        if name == 'return':
+            patron_id, book_id = self.borrowed.pop(rng.randrange(len(self.borrowed)))
+            return name, 'POST', '/return', urlencode({'patron_id': patron_id, 'book_id': book_id})
+        if name == 'borrower_status':
+            return name, 'POST', '/borrower_status', urlencode({'action': 'query',
+                                                                'patron_id': rng.choice(targets['patrons'])})
+        patron_id, book_id = rng.choice(targets['loans'])
+        return name, 'GET', f'/api/late_fee/{patron_id}/{book_id}', None
+
+    def run(self):
+        while time.perf_counter() < self.deadline:
+            name, method, path, body = self.request()
+            headers = {'Content-Type': 'application/x-www-form-urlencoded'} if body is not None else {}
+            start = time.perf_counter()
+            try:
+                if self.conn is None:
+                    self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+                self.conn.request(method, path, body, headers)
+                response = self.conn.getresponse()
+                response.read()
+                status = response.status
+                if response.getheader('Connection', '').lower() == 'close':
+                    self.conn.close()
+                    self.conn = None
+            except (OSError, http.client.HTTPException):
+                status = 0
+                if self.conn is not None:
+                    self.conn.close()
+                    self.conn = None
+            end = time.perf_counter()
+            if start >= self.start_at:
+                self.samples.append((name, end - start, status))
+        if self.conn is not None:
+            self.conn.close()
+
+
+def run_load(base_url: str, targets: Dict, concurrency: int, duration: float, warmup: float = 0.0,
+             mix: Optional[Dict[str, int]] = None, seed: int = 1) -> List[Tuple[str, float, int]]:
+    """
+    Send the request mix from `concurrency` connections for `warmup + duration`
+    seconds. Returns (endpoint, seconds, status) for requests started after the warmup.
+    """
+    start_at = time.perf_counter() + warmup
+    workers = [_Worker(i, base_url, targets, mix or DEFAULT_MIX, seed, start_at, start_at + duration)
+               for i in range(concurrency)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return [sample for worker in workers for sample in worker.samples]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _latency_stats(samples, duration: float) -> Dict:
+    latencies = sorted(seconds for _, seconds, _ in samples)
+    statuses = {}
+    for _, _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, _, status in samples if status == 0 or status >= 500),
+        'throughput_rps': round(len(samples) / duration, 1) if duration else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        'status_codes': statuses,
+    }
+
+
+def summarize(samples, duration: float) -> Dict:
+    """Per-endpoint and overall latency statistics for run_load() samples."""
+    by_endpoint = {}
+    for sample in samples:
+        by_endpoint.setdefault(sample[0], []).append(sample)
+    return {
+        'total': _latency_stats(samples, duration),
+        'endpoints': {name: _latency_stats(by_endpoint[name], duration)
+                      for name in ENDPOINTS if name in by_endpoint},
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    """'catalog=2,search=1' -> {'catalog': 2, 'search': 1}; unknown endpoints raise ValueError."""
+    mix = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        name, _, weight = item.partition('=')
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name!r}; choose from {', '.join(ENDPOINTS)}.")
+        mix[name] = int(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("The mix needs at least one endpoint with a positive weight.")
+    return mix
+
+
+def print_table(report: Dict, stream=sys.stderr):
+    print(f"{'endpoint':<16} {'requests':>9} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}",
+          file=stream)
+    rows = list(report['endpoints'].items()) + [('total', report['total'])]
+    for name, stats in rows:
+        print(f"{name:<16} {stats['requests']:>9} {stats['throughput_rps']:>8.1f} {stats['p50_ms']:>8.1f} "
+              f"{stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['errors']:>7}", file=stream)
+
+
+def run(args) -> Dict:
+    mix = parse_mix(args.mix) if args.mix else dict(DEFAULT_MIX)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, 'loadtest.db')
+        if not os.path.exists(db_path):
+            print(f"Seeding {args.books} books, {args.patrons} patrons, {args.loans} loans...", file=sys.stderr)
+            seed_database(db_path, args.books, args.patrons, args.loans, args.seed)
+        targets = load_targets(db_path, args.seed)
+
+        process = None
+        base_url = args.url
+        if base_url is None:
+            base_url, process = start_server(db_path, args.pool_size)
+        try:
+            samples = run_load(base_url, targets, args.concurrency, args.duration, args.warmup, mix, args.seed)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.join()
+
+    report = {
+        'meta': {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'scale': {'books': args.books, 'patrons': args.patrons, 'loans': args.loans, 'db': args.db},
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'warmup_s': args.warmup,
+            'mix': mix,
+            'url': args.url,
+        },
+        **summarize(samples, args.duration),
+    }
+    return report
+
+
+def compare(base: Dict, head: Dict, tolerance: float) -> List[str]:
+    """Print p50/p95/p99/throughput changes per endpoint; returns the regressions beyond `tolerance` percent."""
+    regressions = []
+    print(f"{'endpoint':<16} {'metric':<15} {'base':>10} {'head':>10} {'change':>8}")
+    names = [name for name in ENDPOINTS if name in base['endpoints'] and name in head['endpoints']] + ['total']
+    for name in names:
+        old = base['total'] if name == 'total' else base['endpoints'][name]
+        new = head['total'] if name == 'total' else head['endpoints'][name]
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps'):
+            change = (new[metric] - old[metric]) / old[metric] * 100 if old[metric] else 0.0
+            worse = -change if metric == 'throughput_rps' else change
+            flag = '  !' if worse > tolerance else ''
+            if flag:
+                regressions.append(f"{name} {metric}")
+            print(f"{name:<16} {metric:<15} {old[metric]:>10.1f} {new[metric]:>10.1f} {change:>+7.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the HTTP endpoints and report latency percentiles.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Seed, serve and load the app; print a JSON report')
+    run_parser.add_argument('--books', type=int, default=10000)
+    run_parser.add_argument('--patrons', type=int, default=2000)
+    run_parser.add_argument('--loans', type=int, default=50000)
+    run_parser.add_argument('--seed', type=int, default=1)
+    run_parser.add_argument('--concurrency', type=int, default=8, help='Connections sending requests at once')
+    run_parser.add_argument('--duration', type=float, default=10.0, help='Measured seconds')
+    run_parser.add_argument('--warmup', type=float, default=2.0, help='Unmeasured seconds before the run')
+    run_parser.add_argument('--mix', help='Endpoint weights, e.g. catalog=2,search=1 (default: all endpoints)')
+    run_parser.add_argument('--db', help='Use (or seed, if missing) this database instead of a temporary one')
+    run_parser.add_argument('--url', help='Load an already running server instead of starting one (needs --db)')
+    run_parser.add_argument('--pool-size', type=int, default=16, help='LIBRARY_DB_POOL_SIZE for the started server')
+    run_parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+
+    compare_parser = commands.add_parser('compare', help='Diff two JSON reports')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('head')
+    compare_parser.add_argument('--tolerance', type=float, default=10.0,
+                                help='Percent change flagged as a regression (exit status 1)')
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.head) as f:
+            head = json.load(f)
+        sys.exit(1 if compare(base, head, args.tolerance) else 0)
+
+    if args.url and not args.db:
+        parser.error('--url needs --db (the database the server uses) to pick request targets')
+    try:
+        parse_mix(args.mix or 'catalog')
+    except ValueError as e:
+        parser.error(str(e))
+    report = run(args)
+    print_table(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+"""
+Micro-benchmarks for services/library_service.py with baseline regression gates
+
+Times add_book_to_catalog, borrow_book_by_patron, return_book_by_patron,
+calculate_late_fee_for_book, search_books_in_catalog and
+get_patron_status_report one call at a time against an in-memory and a
+file-backed database seeded at each `--sizes` (books; patrons and loans
+scale with it). Each benchmark is warmed up, then called for at least
+`--min-time` seconds (and `--min-rounds` calls); min/median/mean/stddev
+per call are reported, like pytest-benchmark.
+
+`--save` stores the run as a baseline. `--compare` checks a run against a
+stored baseline and exits 1 when any benchmark's `--stat` (median by
+default; min is steadier on noisy machines) is more than `--tolerance`
+percent slower. The garbage collector is paused while a call is timed.
+Baselines are only comparable on the same machine, so the default file is
+named after the platform and Python version.
+
+Usage:
+    python benchmarks/microbench.py [--sizes 1000 10000 100000] [--backends memory file] [-k search]
+                                    [--min-time 0.5] [--save] [--compare] [--tolerance 25] [--stat median|min]
+                                    [--baseline PATH] [--json out.json]
+"""
+
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+from config import load_storage_config
+from services.library_service import (
+    add_book_to_catalog, borrow_book_by_patron, return_book_by_patron,
+    calculate_late_fee_for_book, search_books_in_catalog, get_patron_status_report
+)
+from benchmarks.loadtest import populate
+
+BACKENDS = ('memory', 'file')
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_TOLERANCE = 25.0
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+WARMUP_CALLS = 5
+MAX_ROUNDS = 100000
+
+BENCHMARKS = ('add_book_to_catalog', 'borrow_book_by_patron', 'return_book_by_patron',
+              'calculate_late_fee_for_book', 'search_books_in_catalog', 'get_patron_status_report')
+
+# Patron used only by the borrow/return benchmarks
+BENCH_PATRON = '800000'
+
+
+def default_baseline_path() -> str:
+    machine = f"{platform.system()}-{platform.machine()}-py{sys.version_info[0]}{sys.version_info[1]}".lower()
+    return os.path.join(BASELINE_DIR, f'microbench-{machine}.json')
+
+
+def _expect(result, name: str):
+    """Fail loudly if a call took an error path, which would make its timing meaningless."""
+    ok = result[0] if isinstance(result, tuple) else 'error' not in result
+    if not ok:
+        raise RuntimeError(f"{name} failed during the benchmark: {result}")
+
+
+def benchmarks(targets: Dict) -> Dict[str, Tuple[Callable, Optional[Callable], Optional[Callable]]]:
+    """
+    The benchmarks for one seeded database, as name -> (call, setup, teardown).
+    Each takes the call index; only `call` is timed.
+    """
+    # 979 prefix: the synthetic catalog only uses 978
+    isbns = (f'979{i:010d}' for i in itertools.count())
+    books = targets['available_books']
+    loans, patrons, words = targets['loans'], targets['patrons'], targets['words']
+
+    def add_book(i):
+        _expect(add_book_to_catalog(f'Benchmark Title {i}', 'Benchmark Author', next(isbns), 3), 'add_book_to_catalog')
+
+    def borrow(i):
+        _expect(borrow_book_by_patron(BENCH_PATRON, books[i % len(books)]), 'borrow_book_by_patron')
+
+    def give_back(i):
+        _expect(return_book_by_patron(BENCH_PATRON, books[i % len(books)]), 'return_book_by_patron')
+
+    def late_fee(i):
+        _expect(calculate_late_fee_for_book(*loans[i % len(loans)]), 'calculate_late_fee_for_book')
+
+    def search(i):
+        search_books_in_catalog(words[i % len(words)], 'title')
+
+    def status_report(i):
+        _expect(get_patron_status_report(patrons[i % len(patrons)]), 'get_patron_status_report')
+
+    return {
+        'add_book_to_catalog': (add_book, None, None),
+        'borrow_book_by_patron': (borrow, None, give_back),
+        'return_book_by_patron': (give_back, borrow, None),
+        'calculate_late_fee_for_book': (late_fee, None, None),
+        'search_books_in_catalog': (search, None, None),
+        'get_patron_status_report': (status_report, None, None),
+    }
+
+
+def measure(call: Callable, setup: Optional[Callable] = None, teardown: Optional[Callable] = None,
+            min_time: float = 0.5, min_rounds: int = 20) -> Dict:
+    """Time `call` one invocation at a time; returns per-call statistics in microseconds."""
+    index = 0
+    for _ in range(WARMUP_CALLS):
+        if setup:
+            setup(index)
+        call(index)
+        if teardown:
+            teardown(index)
+        index += 1
+
+    times = []
+    deadline = time.perf_counter() + min_time
+    while (len(times) < min_rounds or time.perf_counter() < deadline) and len(times) < MAX_ROUNDS:
+        if setup:
+            setup(index)
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            call(index)
+            times.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+        if teardown:
+            teardown(index)
+        index += 1
+
+    return {
+        'rounds': len(times),
+        'min_us': round(min(times) * 1e6, 2),
+        'median_us': round(statistics.median(times) * 1e6, 2),
+        'mean_us': round(statistics.fmean(times) * 1e6, 2),
+        'stddev_us': round(statistics.pstdev(times) * 1e6, 2),
+        'ops': round(len(times) / sum(times), 1),
+    }
+
+
+def database_path(backend: str, size: int, tmp: str) -> str:
+    if backend == 'memory':
+        # Shared cache, so every pooled connection sees the same in-memory database
+        return f'file:microbench-{size}?mode=memory&cache=shared'
+    return os.path.join(tmp, f'microbench-{size}.db')
+
+
+def bench_targets() -> Dict:
+    """Arguments for the benchmarks, read from the configured database through the pool."""
+    conn = database.get_db_connection()
+    try:
+        books = [row[0] for row in conn.execute(
+            'SELECT id FROM books WHERE available_copies > 1 ORDER BY id LIMIT 500')]
+        loans = [tuple(row) for row in conn.execute(
+            'SELECT patron_id, book_id FROM borrow_records WHERE return_date IS NULL ORDER BY id LIMIT 2000')]
+        patrons = [row[0] for row in conn.execute(
+            'SELECT patron_id FROM patrons ORDER BY active_loans DESC, patron_id LIMIT 2000')]
+        titles = [row[0] for row in conn.execute('SELECT title FROM books ORDER BY id LIMIT 200')]
+    finally:
+        conn.close()
+    return {'available_books': books, 'loans': loans, 'patrons': patrons,
+            'words': sorted({word for title in titles for word in title.split()})}
+
+
+def run(sizes, backends, min_time: float, min_rounds: int, keyword: Optional[str] = None,
+        seed: int = 1) -> Dict[str, Dict]:
+    """Run every benchmark for every backend and size; returns {"name[backend-size]": stats}."""
+    results = {}
+    original = load_storage_config({'LIBRARY_DB_PATH': database.DATABASE})
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for backend, size in itertools.product(backends, sizes):
+                if keyword and not any(keyword in f'{name}[{backend}-{size}]' for name in BENCHMARKS):
+                    continue
+                database.configure_database(load_storage_config({'LIBRARY_DB_PATH': database_path(backend, size, tmp)}))
+                database.init_database()
+                populate(size, max(50, size // 5), size * 2, seed)
+                for name, (call, setup, teardown) in benchmarks(bench_targets()).items():
+                    key = f'{name}[{backend}-{size}]'
+                    if keyword and keyword not in key:
+                        continue
+                    results[key] = measure(call, setup, teardown, min_time, min_rounds)
+                    print(f"{key:<52} {results[key]['median_us']:>10.1f} us  "
+                          f"(min {results[key]['min_us']:.1f}, {results[key]['rounds']} rounds)", file=sys.stderr)
+                database.close_pool()
+    finally:
+        database.configure_database(original)
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float,
+            stat: str = 'median') -> List[str]:
+    """
+    Compare `stat` ('median', 'min' or 'mean') with a baseline. Prints one line
+    per benchmark present in both and returns the keys that are more than
+    `tolerance` percent slower.
+    """
+    regressions = []
+    print(f"{'benchmark':<52} {'base us':>10} {'now us':>10} {'change':>8}   ({stat})")
+    for key, stats in results.items():
+        if key not in baseline:
+            continue
+        base, now = baseline[key][f'{stat}_us'], stats[f'{stat}_us']
+        change = (now - base) / base * 100 if base else 0.0
+        flag = '  REGRESSION' if change > tolerance else ''
+        if flag:
+            regressions.append(key)
+        print(f"{key:<52} {base:>10.1f} {now:>10.1f} {change:>+7.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark library_service functions.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='Books per database')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('-k', dest='keyword', help='Only run benchmarks whose id contains this text')
+    parser.add_argument('--min-time', type=float, default=0.5, help='Seconds to spend per benchmark')
+    parser.add_argument('--min-rounds', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--baseline', default=default_baseline_path(), help='Baseline file')
+    parser.add_argument('--save', action='store_true', help='Store this run as the baseline')
+    parser.add_argument('--compare', action='store_true', help='Fail if slower than the baseline')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Percent slowdown allowed by --compare')
+    parser.add_argument('--stat', choices=['median', 'min', 'mean'], default='median',
+                        help='Statistic compared with the baseline')
+    parser.add_argument('--json', help='Also write the results here')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)['benchmarks']
+        except FileNotFoundError:
+            parser.error(f"No baseline at {args.baseline}; create one with --save")
+
+    results = run(args.sizes, args.backends, args.min_time, args.min_rounds, args.keyword, args.seed)
+    report = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'min_time': args.min_time,
+        },
+        'benchmarks': results,
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.baseline}", file=sys.stderr)
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance, args.stat)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed more than {args.tolerance:.0f}%", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
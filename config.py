@@ -0,0 +1,107 @@
+"""
+Configuration module for Library Management System
+Collects storage settings from defaults, environment variables and app config
+"""
+
+import os
+from typing import Dict, Mapping, Optional
+
+# Default storage settings. Every key can be overridden by an environment
+# variable of the same name or by an entry in Flask's app.config.
+DEFAULT_STORAGE_CONFIG = {
+    'LIBRARY_DB_PATH': 'library.db',
+    'LIBRARY_DB_JOURNAL_MODE': 'WAL',
+    'LIBRARY_DB_SYNCHRONOUS': 'NORMAL',
+    'LIBRARY_DB_CACHE_SIZE': -64000,        # negative = KiB, i.e. 64 MB page cache
+    'LIBRARY_DB_MMAP_SIZE': 268435456,      # 256 MB memory-mapped I/O
+    'LIBRARY_DB_TEMP_STORE': 'MEMORY',
+    'LIBRARY_DB_BUSY_TIMEOUT': 5000,        # milliseconds
+    'LIBRARY_DB_POOL_SIZE': 5,
+    'LIBRARY_DB_POOL_TIMEOUT': 30.0,        # seconds
+    'LIBRARY_BOOK_CACHE_ENABLED': True,     # read-through cache for book lookups
+    'LIBRARY_BOOK_CACHE_SIZE': 4096,        # maximum cached lookups
+    'LIBRARY_BOOK_CACHE_TTL': 30.0,         # seconds before a cached book is re-read
+    'LIBRARY_PAYMENT_WORKERS': 8,           # threads sending queued payments to the gateway
+    'LIBRARY_METRICS_ENABLED': True,        # request/SQL/gateway metrics served at /metrics
+    'LIBRARY_PROFILING_ENABLED': False,     # honour the X-Profile request header (cProfile report)
+    'LIBRARY_SLOW_QUERY_LOG': '',           # JSON Lines file for slow statements ('' = off)
+    'LIBRARY_SLOW_QUERY_MS': 100.0,         # log statements taking at least this many milliseconds
+    'LIBRARY_SLOW_QUERY_LOG_MAX_BYTES': 10485760,  # rotate the log at 10 MB
+    'LIBRARY_SLOW_QUERY_LOG_BACKUPS': 5,    # rotated log files to keep
+}
+
+JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+TEMP_STORE_MODES = ('DEFAULT', 'FILE', 'MEMORY')
+
+
+def _coerce(key: str, value):
+    """Convert a raw (possibly string) setting to the type of its default."""
+    default = DEFAULT_STORAGE_CONFIG[key]
+    if isinstance(value, str) and not isinstance(default, str):
+        value = value.strip()
+    if isinstance(default, bool):
+        if isinstance(value, str):
+            if value.lower() not in ('1', 'true', 'yes', 'on', '0', 'false', 'no', 'off'):
+                raise ValueError(f"{key} must be true or false, got {value!r}.")
+            return value.lower() in ('1', 'true', 'yes', 'on')
+        return bool(value)
+    try:
+        if isinstance(default, int):
+            return int(value)
+        if isinstance(default, float):
+            return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be a number, got {value!r}.")
+    return str(value)
+
+
+def _check_choice(config: Dict, key: str, choices):
+    value = config[key].upper()
+    if value not in choices:
+        raise ValueError(f"{key} must be one of {', '.join(choices)}, got {config[key]!r}.")
+    config[key] = value
+
+
+def load_storage_config(overrides: Optional[Mapping] = None) -> Dict:
+    """
+    Build the storage configuration.
+
+    Precedence (lowest to highest): DEFAULT_STORAGE_CONFIG, environment
+    variables, `overrides` (typically Flask's app.config).
+
+    Args:
+        overrides: Optional mapping with LIBRARY_DB_* keys
+
+    Returns:
+        dict: Validated storage settings
+
+    Raises:
+        ValueError: If a setting has an invalid value
+    """
+    config = {}
+    for key in DEFAULT_STORAGE_CONFIG:
+        value = DEFAULT_STORAGE_CONFIG[key]
+        if key in os.environ:
+            value = os.environ[key]
+        if overrides is not None and key in overrides:
+            value = overrides[key]
+        config[key] = _coerce(key, value)
+
+    _check_choice(config, 'LIBRARY_DB_JOURNAL_MODE', JOURNAL_MODES)
+    _check_choice(config, 'LIBRARY_DB_SYNCHRONOUS', SYNCHRONOUS_MODES)
+    _check_choice(config, 'LIBRARY_DB_TEMP_STORE', TEMP_STORE_MODES)
+
+    if config['LIBRARY_DB_POOL_SIZE'] < 1:
+        raise ValueError("LIBRARY_DB_POOL_SIZE must be at least 1.")
+    if config['LIBRARY_PAYMENT_WORKERS'] < 1:
+        raise ValueError("LIBRARY_PAYMENT_WORKERS must be at least 1.")
+    if config['LIBRARY_BOOK_CACHE_SIZE'] < 0:
+        raise ValueError("LIBRARY_BOOK_CACHE_SIZE must not be negative.")
+    if config['LIBRARY_DB_BUSY_TIMEOUT'] < 0:
+        raise ValueError("LIBRARY_DB_BUSY_TIMEOUT must not be negative.")
+    for key in ('LIBRARY_SLOW_QUERY_MS', 'LIBRARY_SLOW_QUERY_LOG_MAX_BYTES', 'LIBRARY_SLOW_QUERY_LOG_BACKUPS'):
+        if config[key] < 0:
+            raise ValueError(f"{key} must not be negative.")
+
+    return config
@@ -3,119 +3,755 @@ Database module for Library Management System
 Handles all database operations and connections
 """
 
+import html
+import re
 import sqlite3
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
-# Database configuration
-DATABASE = 'library.db'
+from cache import LRUCache
+from config import load_storage_config
+from migrations import reconcile_patrons_batch, run_migrations
+
+# Database configuration (see config.py; overridable via LIBRARY_DB_* env vars)
+_storage_config = load_storage_config()
+DATABASE = _storage_config['LIBRARY_DB_PATH']
+JOURNAL_MODE = _storage_config['LIBRARY_DB_JOURNAL_MODE']
+
+# Per-connection PRAGMAs applied to every new pooled connection
+CONNECTION_PRAGMAS = {
+    'busy_timeout': _storage_config['LIBRARY_DB_BUSY_TIMEOUT'],
+    'synchronous': _storage_config['LIBRARY_DB_SYNCHRONOUS'],
+    'cache_size': _storage_config['LIBRARY_DB_CACHE_SIZE'],
+    'mmap_size': _storage_config['LIBRARY_DB_MMAP_SIZE'],
+    'temp_store': _storage_config['LIBRARY_DB_TEMP_STORE'],
+}
+
+# Book lookup cache configuration
+BOOK_CACHE_ENABLED = _storage_config['LIBRARY_BOOK_CACHE_ENABLED']
+_book_cache = LRUCache(_storage_config['LIBRARY_BOOK_CACHE_SIZE'], _storage_config['LIBRARY_BOOK_CACHE_TTL'])
+
+# Connection pool configuration
+POOL_SIZE = _storage_config['LIBRARY_DB_POOL_SIZE']        # maximum number of open connections
+POOL_TIMEOUT = _storage_config['LIBRARY_DB_POOL_TIMEOUT']  # seconds to wait for a free connection
+POOL_PRE_PING = True     # run a health check before handing out an idle connection
+
+# Called as observer(sql, parameters, seconds) after every statement run with
+# execute()/executemany() on a pooled connection (see metrics.py)
+_statement_observers: List[Callable[[str, object, float], None]] = []
+
+def add_statement_observer(observer: Callable[[str, object, float], None]):
+    """Register a callback that is told about every statement and how long it took."""
+    if observer not in _statement_observers:
+        _statement_observers.append(observer)
+
+def remove_statement_observer(observer: Callable[[str, object, float], None]):
+    """Unregister a callback added with add_statement_observer()."""
+    if observer in _statement_observers:
+        _statement_observers.remove(observer)
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    sqlite3 connection owned by a ConnectionPool.
+
+    close() hands the connection back to its pool instead of closing it, so
+    existing `conn = get_db_connection() ... conn.close()` call sites keep
+    working unchanged. Use dispose() to really close the underlying handle.
+
+    execute() and executemany() report to the statement observers. The time
+    covers running the statement up to its first row; rows read later with
+    fetchone()/fetchmany() are not included.
+    """
+    pool = None
+    checked_out = False
+
+    def execute(self, sql, parameters=()):
+        if not _statement_observers:
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - start
+            for observer in list(_statement_observers):
+                observer(sql, parameters, elapsed)
+
+    def executemany(self, sql, seq_of_parameters):
+        if not _statement_observers:
+            return super().executemany(sql, seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            elapsed = time.perf_counter() - start
+            for observer in list(_statement_observers):
+                observer(sql, None, elapsed)
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        elif self.checked_out:
+            self.pool.release(self)
+
+    def dispose(self):
+        self.pool = None
+        super().close()
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of SQLite connections (checkout/checkin).
+
+    At most `max_size` connections are open at any time. When all of them are
+    checked out, acquire() blocks for up to `timeout` seconds and then raises
+    sqlite3.OperationalError.
+    """
+
+    def __init__(self, database: str, max_size: int = POOL_SIZE,
+                 timeout: float = POOL_TIMEOUT, pre_ping: bool = POOL_PRE_PING,
+                 pragmas: Optional[Dict] = None):
+        if max_size < 1:
+            raise ValueError("Pool size must be at least 1.")
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pre_ping = pre_ping
+        self.pragmas = dict(pragmas or {})
+        self._idle = []
+        self._cond = threading.Condition()
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+        self._stats = {
+            'checkouts': 0,
+            'checkins': 0,
+            'created': 0,
+            'discarded': 0,
+            'timeouts': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+    def _connect(self) -> PooledConnection:
+        conn = sqlite3.connect(self.database, factory=PooledConnection,
+                               check_same_thread=False,
+                               uri=self.database.startswith('file:'))
+        conn.row_factory = sqlite3.Row  # This enables column access by name
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        conn.pool = self
+        return conn
+
+    def _is_healthy(self, conn: PooledConnection) -> bool:
+        try:
+            sqlite3.Connection.execute(conn, 'SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn: PooledConnection):
+        """Close a connection and free its slot. Caller must not hold the lock."""
+        try:
+            conn.dispose()
+        except sqlite3.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._stats['discarded'] += 1
+            self._cond.notify()
+
+    def acquire(self) -> PooledConnection:
+        """Check out a connection, opening a new one if the pool is not full."""
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        while True:
+            conn = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise sqlite3.OperationalError("Connection pool is closed.")
+                    if self._idle:
+                        conn = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise sqlite3.OperationalError(
+                            f"Timed out after {self.timeout}s waiting for a database connection.")
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats['created'] += 1
+            elif self.pre_ping and not self._is_healthy(conn):
+                self._discard(conn)
+                continue
+
+            waited = time.perf_counter() - start
+            with self._cond:
+                self._in_use += 1
+                self._stats['checkouts'] += 1
+                self._stats['wait_time_total'] += waited
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+            conn.checked_out = True
+            return conn
+
+    def release(self, conn: PooledConnection):
+        """Check a connection back in, rolling back any unfinished transaction."""
+        if not conn.checked_out:
+            return
+        conn.checked_out = False
+        with self._cond:
+            self._in_use -= 1
+            self._stats['checkins'] += 1
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        with self._cond:
+            if not self._closed:
+                self._idle.append(conn)
+                self._cond.notify()
+                return
+        self._discard(conn)
+
+    def close(self):
+        """Close every idle connection; checked-out ones are closed on checkin."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self) -> Dict:
+        """Return a snapshot of the pool metrics."""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self._size,
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+            })
+        checkouts = stats['checkouts']
+        stats['wait_time_avg'] = stats['wait_time_total'] / checkouts if checkouts else 0.0
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.database != DATABASE:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DATABASE, POOL_SIZE, POOL_TIMEOUT, POOL_PRE_PING,
+                                   CONNECTION_PRAGMAS)
+        return _pool
+
+def configure_pool(max_size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT,
+                   pre_ping: bool = POOL_PRE_PING) -> ConnectionPool:
+    """Replace the process-wide pool with one using the given settings."""
+    global _pool, POOL_SIZE, POOL_TIMEOUT, POOL_PRE_PING
+    POOL_SIZE, POOL_TIMEOUT, POOL_PRE_PING = max_size, timeout, pre_ping
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(DATABASE, max_size, timeout, pre_ping, CONNECTION_PRAGMAS)
+        return _pool
+
+def configure_database(config: Dict):
+    """
+    Apply a storage configuration (see config.load_storage_config).
+
+    Sets the database path, journal mode, connection PRAGMAs and pool
+    settings, and replaces the process-wide pool. Call init_database()
+    afterwards to create the schema and switch the journal mode.
+    """
+    global DATABASE, JOURNAL_MODE, BOOK_CACHE_ENABLED, _book_cache
+    DATABASE = config['LIBRARY_DB_PATH']
+    JOURNAL_MODE = config['LIBRARY_DB_JOURNAL_MODE']
+    CONNECTION_PRAGMAS.update({
+        'busy_timeout': config['LIBRARY_DB_BUSY_TIMEOUT'],
+        'synchronous': config['LIBRARY_DB_SYNCHRONOUS'],
+        'cache_size': config['LIBRARY_DB_CACHE_SIZE'],
+        'mmap_size': config['LIBRARY_DB_MMAP_SIZE'],
+        'temp_store': config['LIBRARY_DB_TEMP_STORE'],
+    })
+    BOOK_CACHE_ENABLED = config['LIBRARY_BOOK_CACHE_ENABLED']
+    _book_cache = LRUCache(config['LIBRARY_BOOK_CACHE_SIZE'], config['LIBRARY_BOOK_CACHE_TTL'])
+    configure_pool(config['LIBRARY_DB_POOL_SIZE'], config['LIBRARY_DB_POOL_TIMEOUT'])
+
+def close_pool():
+    """Close the process-wide pool (e.g. at shutdown or between tests)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = None
+
+def get_pool_stats() -> Dict:
+    """Get connection pool metrics (checkouts, wait time, connections in use)."""
+    return get_pool().stats()
 
 def get_db_connection():
-    """Get a database connection."""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row  # This enables column access by name
-    return conn
+    """Get a database connection from the pool. Call close() to return it."""
+    return get_pool().acquire()
 
 def init_database():
-    """Initialize the database with required tables."""
-    conn = get_db_connection()
-    
-    # Create books table
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS books (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            author TEXT NOT NULL,
-            isbn TEXT UNIQUE NOT NULL,
-            total_copies INTEGER NOT NULL,
-            available_copies INTEGER NOT NULL
-        )
-    ''')
-    
-    # Create borrow_records table
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS borrow_records (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            patron_id TEXT NOT NULL,
-            book_id INTEGER NOT NULL,
-            borrow_date TEXT NOT NULL,
-            due_date TEXT NOT NULL,
-            return_date TEXT,
-            FOREIGN KEY (book_id) REFERENCES books (id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    """Initialize the database: set the journal mode and apply pending schema migrations."""
+    conn = get_db_connection()
+    try:
+        # Journal mode is persistent in the database file; WAL lets catalog
+        # readers proceed while a borrow/return transaction is writing.
+        conn.execute(f'PRAGMA journal_mode = {JOURNAL_MODE}')
+        
+        # Create or upgrade tables and indexes (see migrations.py)
+        run_migrations(conn)
+    finally:
+        conn.close()
 
 def add_sample_data():
     """Add sample data to the database if it's empty."""
     conn = get_db_connection()
-    book_count = conn.execute('SELECT COUNT(*) as count FROM books').fetchone()['count']
-    
-    if book_count == 0:
-        # Add sample books
-        sample_books = [
-            ('The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565', 3),
-            ('To Kill a Mockingbird', 'Harper Lee', '9780061120084', 2),
-            ('1984', 'George Orwell', '9780451524935', 1)
-        ]
+    try:
+        book_count = conn.execute('SELECT COUNT(*) as count FROM books').fetchone()['count']
         
-        for title, author, isbn, copies in sample_books:
+        if book_count == 0:
+            # Add sample books
+            sample_books = [
+                ('The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565', 3),
+                ('To Kill a Mockingbird', 'Harper Lee', '9780061120084', 2),
+                ('1984', 'George Orwell', '9780451524935', 1)
+            ]
+            
+            for title, author, isbn, copies in sample_books:
+                conn.execute('''
+                    INSERT INTO books (title, author, isbn, total_copies, available_copies)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (title, author, isbn, copies, copies))
+            
+            # Make 1984 unavailable by adding a borrow record
             conn.execute('''
-                INSERT INTO books (title, author, isbn, total_copies, available_copies)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (title, author, isbn, copies, copies))
-        
-        # Make 1984 unavailable by adding a borrow record
-        conn.execute('''
-            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
-            VALUES (?, ?, ?, ?)
-        ''', ('123456', 3, 
-              (datetime.now() - timedelta(days=5)).isoformat(),
-              (datetime.now() + timedelta(days=9)).isoformat()))
-        
-        # Update available copies for 1984
-        conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
-        
-        conn.commit()
-    
-    conn.close()
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                VALUES (?, ?, ?, ?)
+            ''', ('123456', 3, 
+                  (datetime.now() - timedelta(days=5)).isoformat(),
+                  (datetime.now() + timedelta(days=9)).isoformat()))
+            
+            # Update available copies for 1984
+            conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
+            
+            conn.commit()
+    finally:
+        conn.close()
 
 # Helper Functions for Database Operations
 
 def get_all_books() -> List[Dict]:
     """Get all books from the database."""
     conn = get_db_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
-    conn.close()
+    try:
+        books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
+    finally:
+        conn.close()
     return [dict(book) for book in books]
 
+def get_books_page(after: Optional[Tuple[str, int]] = None, before: Optional[Tuple[str, int]] = None,
+                   limit: int = 50) -> Tuple[List[Dict], bool]:
+    """
+    Get one page of the catalog ordered by (title, id) using keyset pagination.
+
+    Seeking past the (title, id) of the last row shown is an index range
+    scan on idx_books_title, so every page costs the same no matter how
+    deep into the catalog it is.
+
+    Args:
+        after: (title, id) of the last book on the previous page, for the next page
+        before: (title, id) of the first book on the current page, for the previous page
+        limit: Page size
+
+    Returns:
+        tuple: (books in title order, has_more) where has_more tells whether
+               further rows exist in the direction of travel
+    """
+    if before is not None:
+        sql = 'SELECT * FROM books WHERE (title, id) < (?, ?) ORDER BY title DESC, id DESC LIMIT ?'
+        params = (before[0], before[1], limit + 1)
+    elif after is not None:
+        sql = 'SELECT * FROM books WHERE (title, id) > (?, ?) ORDER BY title, id LIMIT ?'
+        params = (after[0], after[1], limit + 1)
+    else:
+        sql = 'SELECT * FROM books ORDER BY title, id LIMIT ?'
+        params = (limit + 1,)
+    
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+    
+    books = [dict(row) for row in rows[:limit]]
+    if before is not None:
+        books.reverse()
+    return books, len(rows) > limit
+
+def iter_books(batch_size: int = 500) -> Iterator[Dict]:
+    """
+    Yield every book in title order, fetching `batch_size` rows at a time.
+
+    Memory use is bounded by the batch size rather than the catalog size.
+    Each batch is one get_books_page() call, so a pooled connection is only
+    held while a page is read, never while a slow client consumes it.
+    """
+    after = None
+    while True:
+        books, has_more = get_books_page(after=after, limit=batch_size)
+        yield from books
+        if not has_more:
+            break
+        after = (books[-1]['title'], books[-1]['id'])
+
+# Tables that can be exported in bulk, with their columns and key order
+EXPORT_TABLES = {
+    'books': (('id', 'title', 'author', 'isbn', 'total_copies', 'available_copies'), 'id'),
+    'borrow_records': (('id', 'patron_id', 'book_id', 'borrow_date', 'due_date', 'return_date'), 'id'),
+    'patrons': (('patron_id', 'active_loans', 'fees_assessed'), 'patron_id'),
+}
+
+def iter_table_rows(table: str, batch_size: int = 1000) -> Iterator[List[sqlite3.Row]]:
+    """
+    Yield every row of an exportable table in primary-key order, `batch_size` rows at a time.
+
+    Each batch is a keyset query (key > last key seen) on a connection
+    that goes back to the pool before the batch is yielded, so a slow
+    download never pins a pooled connection. Every row is exported once;
+    rows changed while the export runs appear as of the batch that read
+    them.
+
+    Raises:
+        ValueError: If the table is not in EXPORT_TABLES
+    """
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown table: {table}")
+    columns, key = EXPORT_TABLES[table]
+    select = f'SELECT {", ".join(columns)} FROM {table}'
+    
+    last = None
+    while True:
+        conn = get_db_connection()
+        try:
+            if last is None:
+                rows = conn.execute(f'{select} ORDER BY {key} LIMIT ?', (batch_size,)).fetchall()
+            else:
+                rows = conn.execute(f'{select} WHERE {key} > ? ORDER BY {key} LIMIT ?',
+                                    (last, batch_size)).fetchall()
+        finally:
+            conn.close()
+        if not rows:
+            break
+        yield rows
+        if len(rows) < batch_size:
+            break
+        last = rows[-1][key]
+
+# Columns clients may request through field projection
+BOOK_FIELDS = ('id', 'title', 'author', 'isbn', 'total_copies', 'available_copies')
+
+def get_catalog_version() -> int:
+    """Get the catalog version counter (incremented by triggers on every books change)."""
+    conn = get_db_connection()
+    try:
+        return conn.execute('SELECT version FROM catalog_version WHERE id = 1').fetchone()['version']
+    finally:
+        conn.close()
+
+def _projection(fields: Optional[List[str]]) -> List[str]:
+    """Validate requested fields; 'id' is always selected (it is the cursor)."""
+    if not fields:
+        return list(BOOK_FIELDS)
+    unknown = [field for field in fields if field not in BOOK_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return ['id'] + [field for field in BOOK_FIELDS if field in fields and field != 'id']
+
+def get_books_after_id(after_id: int = 0, limit: int = 100,
+                       fields: Optional[List[str]] = None) -> Tuple[List[Dict], bool, int]:
+    """
+    Get books in id order after a cursor, with optional column projection.
+
+    The page and the catalog version are read in the same transaction, so
+    the version always describes exactly the rows returned.
+
+    Args:
+        after_id: Return books with id greater than this
+        limit: Maximum number of books
+        fields: Columns to return (default: all of BOOK_FIELDS)
+
+    Returns:
+        tuple: (books, has_more, catalog_version)
+
+    Raises:
+        ValueError: If fields contains an unknown column
+    """
+    columns = ', '.join(_projection(fields))
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN')
+        version = conn.execute('SELECT version FROM catalog_version WHERE id = 1').fetchone()['version']
+        rows = conn.execute(f'SELECT {columns} FROM books WHERE id > ? ORDER BY id LIMIT ?',
+                            (after_id, limit + 1)).fetchall()
+        conn.commit()
+    finally:
+        conn.close()
+    return [dict(row) for row in rows[:limit]], len(rows) > limit, version
+
+def get_book_fields(book_id: int, fields: Optional[List[str]] = None) -> Tuple[Optional[Dict], int]:
+    """
+    Get one book with optional column projection, plus the catalog version.
+
+    Returns:
+        tuple: (book or None, catalog_version)
+
+    Raises:
+        ValueError: If fields contains an unknown column
+    """
+    columns = ', '.join(_projection(fields))
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN')
+        version = conn.execute('SELECT version FROM catalog_version WHERE id = 1').fetchone()['version']
+        book = conn.execute(f'SELECT {columns} FROM books WHERE id = ?', (book_id,)).fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+    return (dict(book) if book else None), version
+
+# Book lookup cache. Book rows are cached under ('id', id) only; ('isbn', isbn)
+# maps to the book id (or None for an unknown ISBN), so invalidating a book id
+# can never leave a stale copy behind under its ISBN. Lookups take the cache
+# generation before reading SQLite, so a row read just before a write commits
+# is not cached after that write's invalidation.
+
+def _cache_book(book: Optional[Dict], generation: int):
+    if book is not None:
+        _book_cache.set(('id', book['id']), dict(book), generation)
+        _book_cache.set(('isbn', book['isbn']), book['id'], generation)
+
+def invalidate_book_cache(book_id: Optional[int] = None, isbn: Optional[str] = None):
+    """
+    Drop cached lookups after a write to the books table.
+    Call with neither argument to drop everything (e.g. after a bulk change).
+    """
+    if book_id is None and isbn is None:
+        _book_cache.clear()
+        return
+    if book_id is not None:
+        _book_cache.delete(('id', book_id))
+    if isbn is not None:
+        _book_cache.delete(('isbn', isbn))
+
+def get_book_cache_stats() -> Dict:
+    """Get book cache counters (hits, misses, evictions, size, hit rate)."""
+    stats = _book_cache.stats()
+    stats['enabled'] = BOOK_CACHE_ENABLED
+    return stats
+
 def get_book_by_id(book_id: int) -> Optional[Dict]:
-    """Get a specific book by ID."""
+    """Get a specific book by ID (served from the book cache when enabled)."""
+    if BOOK_CACHE_ENABLED:
+        hit, book = _book_cache.get(('id', book_id))
+        if hit:
+            return dict(book) if book else None
+        generation = _book_cache.generation()
+    
     conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
-    conn.close()
-    return dict(book) if book else None
+    try:
+        book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+    finally:
+        conn.close()
+    book = dict(book) if book else None
+    
+    if BOOK_CACHE_ENABLED:
+        if book is None:
+            _book_cache.set(('id', book_id), None, generation)
+        _cache_book(book, generation)
+    return book
 
 def get_book_by_isbn(isbn: str) -> Optional[Dict]:
-    """Get a specific book by ISBN."""
+    """Get a specific book by ISBN (served from the book cache when enabled)."""
+    if BOOK_CACHE_ENABLED:
+        hit, book_id = _book_cache.get(('isbn', isbn))
+        if hit and book_id is None:
+            return None
+        if hit:
+            hit, book = _book_cache.get(('id', book_id))
+            if hit and book is not None:
+                return dict(book)
+        generation = _book_cache.generation()
+    
+    conn = get_db_connection()
+    try:
+        book = conn.execute('SELECT * FROM books WHERE isbn = ?', (isbn,)).fetchone()
+    finally:
+        conn.close()
+    book = dict(book) if book else None
+    
+    if BOOK_CACHE_ENABLED:
+        if book is None:
+            _book_cache.set(('isbn', isbn), None, generation)
+        _cache_book(book, generation)
+    return book
+
+# Columns that search_books() may filter on (never interpolate user input)
+SEARCH_COLUMNS = {'title': 'title', 'author': 'author'}
+
+def _escape_like(term: str) -> str:
+    """Escape LIKE wildcards so the term is matched literally."""
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def search_books(search_term: str, search_type: str, match: str = 'contains',
+                 limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+    """
+    Search books in SQL and return only the matching rows.
+
+    Args:
+        search_term: Term to look for
+        search_type: 'title', 'author' (case-insensitive) or 'isbn' (exact)
+        match: 'contains' (substring) or 'prefix' (uses the NOCASE indexes)
+        limit: Maximum number of rows to return (None = no limit)
+        offset: Number of matching rows to skip
+
+    Returns:
+        list: Matching book dictionaries ordered by title
+    """
+    if search_type == 'isbn':
+        sql = 'SELECT * FROM books WHERE isbn = ?'
+        params = [search_term]
+    elif search_type in SEARCH_COLUMNS:
+        column = SEARCH_COLUMNS[search_type]
+        pattern = _escape_like(search_term) + '%'
+        if match == 'prefix':
+            sql = f"SELECT * FROM books WHERE {column} LIKE ? ESCAPE '\\' ORDER BY {column} COLLATE NOCASE, id"
+        else:
+            pattern = '%' + pattern
+            sql = f"SELECT * FROM books WHERE {column} LIKE ? ESCAPE '\\' ORDER BY title"
+        params = [pattern]
+    else:
+        return []
+    
+    if limit is not None:
+        sql += ' LIMIT ? OFFSET ?'
+        params += [limit, offset]
+    elif offset:
+        sql += ' LIMIT -1 OFFSET ?'
+        params.append(offset)
+    
+    conn = get_db_connection()
+    try:
+        books = conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+    return [dict(book) for book in books]
+
+# Markers FTS5 wraps around matched terms; replaced by <mark> after HTML escaping
+_HIGHLIGHT_START = '\x02'
+_HIGHLIGHT_END = '\x03'
+
+def _highlight_html(text: str) -> str:
+    """HTML-escape an FTS5 highlight() result and turn its markers into <mark> tags."""
+    return (html.escape(text)
+            .replace(_HIGHLIGHT_START, '<mark>')
+            .replace(_HIGHLIGHT_END, '</mark>'))
+
+def _fulltext_query(search_term: str, operator: str) -> str:
+    """Turn free text into a safe FTS5 query: every word becomes a quoted prefix term."""
+    words = re.findall(r'\w+', search_term)
+    return f' {operator} '.join(f'"{word}"*' for word in words)
+
+def search_books_fulltext(search_term: str, limit: int = 20, offset: int = 0) -> List[Dict]:
+    """
+    Full-text search over title and author using the books_fts index.
+
+    Every word is matched as a prefix, and all words must match; if that
+    finds nothing, books matching any of the words are returned instead.
+    Results are ranked by bm25 (title matches weigh more than author).
+
+    Args:
+        search_term: Free text entered by the patron
+        limit: Maximum number of results
+        offset: Number of results to skip
+
+    Returns:
+        list: Book dictionaries with 'title_highlight' and 'author_highlight'
+              (HTML-escaped, matches wrapped in <mark>) and 'score'
+    """
+    query = _fulltext_query(search_term, 'AND')
+    if not query:
+        return []
+    
     conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE isbn = ?', (isbn,)).fetchone()
-    conn.close()
-    return dict(book) if book else None
+    try:
+        # Choose AND or the OR fallback once, from the whole result set, so
+        # every page of one search comes from the same query
+        if (len(re.findall(r'\w+', search_term)) > 1
+                and not conn.execute('SELECT 1 FROM books_fts WHERE books_fts MATCH ? LIMIT 1', (query,)).fetchone()):
+            query = _fulltext_query(search_term, 'OR')
+        rows = conn.execute('''
+            SELECT b.*,
+                   highlight(books_fts, 0, ?, ?) AS title_highlight,
+                   highlight(books_fts, 1, ?, ?) AS author_highlight,
+                   bm25(books_fts, 10.0, 5.0) AS score
+            FROM books_fts
+            JOIN books b ON b.id = books_fts.rowid
+            WHERE books_fts MATCH ?
+            ORDER BY score
+            LIMIT ? OFFSET ?
+        ''', (_HIGHLIGHT_START, _HIGHLIGHT_END, _HIGHLIGHT_START, _HIGHLIGHT_END,
+              query, limit, offset)).fetchall()
+    finally:
+        conn.close()
+    
+    books = []
+    for row in rows:
+        book = dict(row)
+        book['title_highlight'] = _highlight_html(book['title_highlight'])
+        book['author_highlight'] = _highlight_html(book['author_highlight'])
+        books.append(book)
+    return books
 
 def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
     """Get currently borrowed books for a patron."""
     conn = get_db_connection()
-    records = conn.execute('''
-        SELECT br.*, b.title, b.author 
-        FROM borrow_records br 
-        JOIN books b ON br.book_id = b.id 
-        WHERE br.patron_id = ? AND br.return_date IS NULL
-        ORDER BY br.borrow_date
-    ''', (patron_id,)).fetchall()
-    conn.close()
+    try:
+        records = conn.execute('''
+            SELECT br.*, b.title, b.author 
+            FROM borrow_records br 
+            JOIN books b ON br.book_id = b.id 
+            WHERE br.patron_id = ? AND br.return_date IS NULL
+            ORDER BY br.borrow_date
+        ''', (patron_id,)).fetchall()
+    finally:
+        conn.close()
     
     borrowed_books = []
     for record in records:
@@ -130,30 +766,203 @@ def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
     
     return borrowed_books
 
+def get_patron_history_page(patron_id: str, before: Optional[Tuple[str, int]] = None,
+                            limit: int = 20) -> Tuple[List[Dict], bool]:
+    """
+    Get one page of a patron's returned loans, newest first.
+    
+    Keyset pagination on (borrow_date, id) so deep pages cost the same as
+    the first one.
+    
+    Args:
+        patron_id: 6-digit library card ID
+        before: (borrow_date ISO string, record id) of the last loan on the previous page
+        limit: Maximum number of loans to return
+        
+    Returns:
+        tuple: (loans: list of dicts with datetime fields, has_more: bool)
+    """
+    where = 'br.patron_id = ? AND br.return_date IS NOT NULL'
+    params = [patron_id]
+    if before is not None:
+        where += ' AND (br.borrow_date, br.id) < (?, ?)'
+        params += list(before)
+    
+    conn = get_db_connection()
+    try:
+        records = conn.execute(f'''
+            SELECT br.id, br.book_id, br.borrow_date, br.due_date, br.return_date, b.title, b.author
+            FROM borrow_records br 
+            JOIN books b ON br.book_id = b.id 
+            WHERE {where}
+            ORDER BY br.borrow_date DESC, br.id DESC
+            LIMIT ?
+        ''', params + [limit + 1]).fetchall()
+    finally:
+        conn.close()
+    
+    loans = []
+    for record in records[:limit]:
+        loans.append({
+            'id': record['id'],
+            'book_id': record['book_id'],
+            'title': record['title'],
+            'author': record['author'],
+            'borrow_date': datetime.fromisoformat(record['borrow_date']),
+            'due_date': datetime.fromisoformat(record['due_date']),
+            'return_date': datetime.fromisoformat(record['return_date'])
+        })
+    
+    return loans, len(records) > limit
+
+def get_patron_loans_and_summary(patron_id: str, as_of: datetime) -> Tuple[List[Dict], Dict]:
+    """
+    Get a patron's open loans and loan counts in one query.
+    
+    The open loans (as in get_patron_borrowed_books) and one row of counts
+    over all of the patron's loans are combined with UNION ALL; each half
+    is an index search. Open loans are bounded by the borrow limit, so they
+    are put in borrow order here rather than with an ORDER BY that would
+    need a temporary b-tree.
+    
+    Returns:
+        tuple: (open loans oldest first, summary dict with total_loans,
+        active_loans, returned_loans and overdue_loans (returned late, or
+        still out past the due date at `as_of`))
+    """
+    conn = get_db_connection()
+    try:
+        records = conn.execute('''
+            SELECT br.id, br.book_id, br.borrow_date, br.due_date, b.title, b.author,
+                   NULL AS total_loans, NULL AS returned_loans, NULL AS overdue_loans
+            FROM borrow_records br
+            JOIN books b ON br.book_id = b.id
+            WHERE br.patron_id = ? AND br.return_date IS NULL
+            UNION ALL
+            SELECT NULL, NULL, NULL, NULL, NULL, NULL,
+                   COUNT(*), COUNT(return_date),
+                   COALESCE(SUM(CASE WHEN return_date IS NULL THEN due_date < ?
+                                     ELSE return_date > due_date END), 0)
+            FROM borrow_records
+            WHERE patron_id = ?
+        ''', (patron_id, as_of.isoformat(), patron_id)).fetchall()
+    finally:
+        conn.close()
+    
+    counts = next(record for record in records if record['id'] is None)
+    loans = sorted((record for record in records if record['id'] is not None),
+                   key=lambda record: (record['borrow_date'], record['id']))
+    borrowed_books = []
+    for record in loans:
+        borrowed_books.append({
+            'book_id': record['book_id'],
+            'title': record['title'],
+            'author': record['author'],
+            'borrow_date': datetime.fromisoformat(record['borrow_date']),
+            'due_date': datetime.fromisoformat(record['due_date']),
+            'is_overdue': as_of > datetime.fromisoformat(record['due_date'])
+        })
+    
+    summary = {
+        'total_loans': counts['total_loans'],
+        'active_loans': counts['total_loans'] - counts['returned_loans'],
+        'returned_loans': counts['returned_loans'],
+        'overdue_loans': counts['overdue_loans']
+    }
+    return borrowed_books, summary
+
+def iter_overdue_loans(as_of: datetime, batch_size: int = 5000) -> Iterator[List[sqlite3.Row]]:
+    """
+    Yield every open loan due before `as_of` in chunks of `batch_size` rows.
+    
+    Each row is (patron_id, book_id, due_date ISO string). The pooled
+    connection is held until the generator is exhausted or closed.
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute('''
+            SELECT patron_id, book_id, due_date
+            FROM borrow_records
+            WHERE return_date IS NULL AND due_date < ?
+        ''', (as_of.isoformat(),))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
 def get_patron_borrow_count(patron_id: str) -> int:
-    """Get the number of books currently borrowed by a patron."""
+    """Get the number of books currently borrowed by a patron (from the patrons counter)."""
     conn = get_db_connection()
-    count = conn.execute('''
-        SELECT COUNT(*) as count FROM borrow_records 
-        WHERE patron_id = ? AND return_date IS NULL
-    ''', (patron_id,)).fetchone()['count']
-    conn.close()
+    try:
+        row = conn.execute('''
+            SELECT active_loans FROM patrons WHERE patron_id = ?
+        ''', (patron_id,)).fetchone()
+        count = row['active_loans'] if row else 0
+    finally:
+        conn.close()
     return count
 
 def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int) -> bool:
     """Insert a new book into the database."""
     conn = get_db_connection()
     try:
-        conn.execute('''
+        cursor = conn.execute('''
             INSERT INTO books (title, author, isbn, total_copies, available_copies)
             VALUES (?, ?, ?, ?, ?)
         ''', (title, author, isbn, total_copies, available_copies))
         conn.commit()
-        conn.close()
+        # Forget any cached "not found" for this ISBN or the new id
+        invalidate_book_cache(cursor.lastrowid, isbn)
         return True
     except Exception as e:
-        conn.close()
         return False
+    finally:
+        conn.close()
+
+def insert_books_batch(books: List[Tuple[str, str, str, int]]) -> Tuple[int, set]:
+    """
+    Insert many books in one transaction, skipping ISBNs already in the catalog.
+
+    Existing ISBNs are found with set-based IN (...) lookups on the unique
+    ISBN index inside the same BEGIN IMMEDIATE transaction as the insert, so
+    a concurrent insert cannot turn a skipped duplicate into a failure.
+
+    Args:
+        books: (title, author, isbn, total_copies) tuples; available copies start at total
+
+    Returns:
+        tuple: (number inserted, set of ISBNs that already existed)
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        isbns = [book[2] for book in books]
+        existing = set()
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(isbns), 500):
+            chunk = isbns[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            existing.update(row[0] for row in conn.execute(
+                f'SELECT isbn FROM books WHERE isbn IN ({placeholders})', chunk))
+        
+        rows = [(title, author, isbn, copies, copies) for title, author, isbn, copies in books
+                if isbn not in existing]
+        conn.executemany('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    # Drop cached "no such ISBN" entries for the new books
+    invalidate_book_cache()
+    return len(rows), existing
 
 def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
     """Insert a new borrow record into the database."""
@@ -164,11 +973,11 @@ def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, du
             VALUES (?, ?, ?, ?)
         ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
         conn.commit()
-        conn.close()
         return True
     except Exception as e:
-        conn.close()
         return False
+    finally:
+        conn.close()
 
 def update_book_availability(book_id: int, change: int) -> bool:
     """Update the available copies of a book by a given amount (+1 for return, -1 for borrow)."""
@@ -178,11 +987,12 @@ def update_book_availability(book_id: int, change: int) -> bool:
             UPDATE books SET available_copies = available_copies + ? WHERE id = ?
         ''', (change, book_id))
         conn.commit()
-        conn.close()
+        invalidate_book_cache(book_id)
         return True
     except Exception as e:
-        conn.close()
         return False
+    finally:
+        conn.close()
 
 def update_borrow_record_return_date(patron_id: str, book_id: int, return_date: datetime) -> bool:
     """Update the return date for a borrow record."""
@@ -194,8 +1004,508 @@ def update_borrow_record_return_date(patron_id: str, book_id: int, return_date:
             WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
         ''', (return_date.isoformat(), patron_id, book_id))
         conn.commit()
-        conn.close()
         return True
     except Exception as e:
-        conn.close()
         return False
+    finally:
+        conn.close()
+
+def borrow_book_transaction(patron_id: str, book_id: int, borrow_date: datetime,
+                            due_date: datetime, borrow_limit: int) -> Tuple[str, Optional[Dict]]:
+    """
+    Borrow a book atomically on a single connection.
+
+    Runs the availability check, the patron limit check, the conditional
+    decrement of available_copies and the borrow record insert inside one
+    BEGIN IMMEDIATE transaction, so concurrent borrowers cannot both take
+    the last copy and a failure never leaves a half-applied borrow.
+
+    Args:
+        patron_id: 6-digit library card ID
+        book_id: ID of the book to borrow
+        borrow_date: Borrow timestamp
+        due_date: Due timestamp
+        borrow_limit: Reject the borrow when the patron already holds more than this many books
+
+    Returns:
+        tuple: (status, book) where status is 'borrowed', 'not_found',
+               'unavailable', 'limit_reached' or 'error'
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+        if book is None:
+            conn.rollback()
+            return 'not_found', None
+        book = dict(book)
+        
+        if book['available_copies'] <= 0:
+            conn.rollback()
+            return 'unavailable', book
+        
+        # patrons.active_loans is maintained by triggers on borrow_records
+        patron = conn.execute('''
+            SELECT active_loans FROM patrons WHERE patron_id = ?
+        ''', (patron_id,)).fetchone()
+        count = patron['active_loans'] if patron else 0
+        if count > borrow_limit:
+            conn.rollback()
+            return 'limit_reached', book
+        
+        cursor = conn.execute('''
+            UPDATE books SET available_copies = available_copies - 1 
+            WHERE id = ? AND available_copies > 0
+        ''', (book_id,))
+        if cursor.rowcount != 1:
+            conn.rollback()
+            return 'unavailable', book
+        
+        conn.execute('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+            VALUES (?, ?, ?, ?)
+        ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
+        conn.commit()
+        invalidate_book_cache(book_id)
+        book['available_copies'] -= 1
+        return 'borrowed', book
+    except Exception as e:
+        conn.rollback()
+        return 'error', None
+    finally:
+        conn.close()
+
+def return_book_transaction(patron_id: str, book_id: int, return_date: datetime,
+                            late_fee: Optional[Callable[[datetime, datetime], float]] = None
+                            ) -> Tuple[str, Optional[Dict]]:
+    """
+    Return a book atomically on a single connection.
+
+    Closes the patron's oldest open loan for the book, increments
+    available_copies and adds any late fee to patrons.fees_assessed
+    inside one BEGIN IMMEDIATE transaction.
+
+    Args:
+        patron_id: 6-digit library card ID
+        book_id: ID of the book to return
+        return_date: Return timestamp
+        late_fee: Fee schedule, called as late_fee(due_date, return_date)
+
+    Returns:
+        tuple: (status, loan) where status is 'returned', 'not_found',
+               'no_record' or 'error'. loan holds the book title, the
+               loan's borrow_date/due_date as datetimes and fee_amount.
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        book = conn.execute('SELECT title FROM books WHERE id = ?', (book_id,)).fetchone()
+        if book is None:
+            conn.rollback()
+            return 'not_found', None
+        
+        record = conn.execute('''
+            SELECT id, borrow_date, due_date FROM borrow_records 
+            WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+            ORDER BY borrow_date
+            LIMIT 1
+        ''', (patron_id, book_id)).fetchone()
+        loan = {'book_id': book_id, 'title': book['title']}
+        if record is None:
+            conn.rollback()
+            return 'no_record', loan
+        
+        conn.execute('''
+            UPDATE borrow_records SET return_date = ? 
+            WHERE id = ? AND return_date IS NULL
+        ''', (return_date.isoformat(), record['id']))
+        conn.execute('''
+            UPDATE books SET available_copies = available_copies + 1 WHERE id = ?
+        ''', (book_id,))
+        due_date = datetime.fromisoformat(record['due_date'])
+        fee_amount = late_fee(due_date, return_date) if late_fee else 0.00
+        if fee_amount > 0:
+            conn.execute('''
+                UPDATE patrons SET fees_assessed = fees_assessed + ? WHERE patron_id = ?
+            ''', (fee_amount, patron_id))
+        conn.commit()
+        invalidate_book_cache(book_id)
+        
+        loan.update({
+            'borrow_date': datetime.fromisoformat(record['borrow_date']),
+            'due_date': due_date,
+            'return_date': return_date,
+            'fee_amount': fee_amount,
+        })
+        return 'returned', loan
+    except Exception as e:
+        conn.rollback()
+        return 'error', None
+    finally:
+        conn.close()
+
+def _placeholders(values) -> str:
+    return ', '.join('?' * len(values))
+
+def borrow_books_transaction(patron_id: str, book_ids: List[int], borrow_date: datetime,
+                             due_date: datetime, borrow_limit: int) -> Tuple[str, List[Tuple[int, str, Optional[Dict]]]]:
+    """
+    Borrow several books for one patron in a single BEGIN IMMEDIATE transaction.
+
+    Books are checked in the order given, with the same rules as
+    borrow_book_transaction(); books that pass are borrowed and the rest are
+    reported, so one unavailable book does not block the others. All reads
+    happen after the write lock is taken, so the in-memory availability and
+    loan counts cannot go stale before the batched UPDATE/INSERT.
+
+    Args:
+        patron_id: 6-digit library card ID
+        book_ids: Books to borrow (a repeated id borrows another copy)
+        borrow_date: Borrow timestamp
+        due_date: Due timestamp
+        borrow_limit: Reject a book when the patron already holds more than this many
+
+    Returns:
+        tuple: ('ok' or 'error', [(book_id, status, book), ...]) with the
+               per-book statuses of borrow_book_transaction()
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        unique_ids = list(dict.fromkeys(book_ids))
+        books = {row['id']: dict(row) for row in conn.execute(
+            f'SELECT * FROM books WHERE id IN ({_placeholders(unique_ids)})', unique_ids)}
+        patron = conn.execute('SELECT active_loans FROM patrons WHERE patron_id = ?', (patron_id,)).fetchone()
+        count = patron['active_loans'] if patron else 0
+        
+        results = []
+        borrowed = []
+        for book_id in book_ids:
+            book = books.get(book_id)
+            if book is None:
+                results.append((book_id, 'not_found', None))
+            elif book['available_copies'] <= 0:
+                results.append((book_id, 'unavailable', dict(book)))
+            elif count > borrow_limit:
+                results.append((book_id, 'limit_reached', dict(book)))
+            else:
+                book['available_copies'] -= 1
+                count += 1
+                borrowed.append(book_id)
+                results.append((book_id, 'borrowed', dict(book)))
+        
+        conn.executemany('''
+            UPDATE books SET available_copies = available_copies - 1 WHERE id = ?
+        ''', [(book_id,) for book_id in borrowed])
+        conn.executemany('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+            VALUES (?, ?, ?, ?)
+        ''', [(patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()) for book_id in borrowed])
+        conn.commit()
+        for book_id in set(borrowed):
+            invalidate_book_cache(book_id)
+        return 'ok', results
+    except Exception as e:
+        conn.rollback()
+        return 'error', []
+    finally:
+        conn.close()
+
+def return_books_transaction(patron_id: str, book_ids: List[int], return_date: datetime,
+                             late_fee: Optional[Callable[[datetime, datetime], float]] = None
+                             ) -> Tuple[str, List[Tuple[int, str, Optional[Dict]]]]:
+    """
+    Return several books for one patron in a single BEGIN IMMEDIATE transaction.
+
+    Each book closes the patron's oldest open loan for it, as in
+    return_book_transaction(). Fees for the whole batch are added to
+    patrons.fees_assessed with one UPDATE.
+
+    Args:
+        patron_id: 6-digit library card ID
+        book_ids: Books to return (a repeated id returns another copy)
+        return_date: Return timestamp
+        late_fee: Fee schedule, called as late_fee(due_date, return_date)
+
+    Returns:
+        tuple: ('ok' or 'error', [(book_id, status, loan), ...]) with the
+               per-book statuses and loan dicts of return_book_transaction()
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        unique_ids = list(dict.fromkeys(book_ids))
+        titles = {row['id']: row['title'] for row in conn.execute(
+            f'SELECT id, title FROM books WHERE id IN ({_placeholders(unique_ids)})', unique_ids)}
+        open_loans = {}
+        for record in conn.execute(f'''
+            SELECT id, book_id, borrow_date, due_date FROM borrow_records
+            WHERE patron_id = ? AND return_date IS NULL AND book_id IN ({_placeholders(unique_ids)})
+            ORDER BY borrow_date, id
+        ''', [patron_id] + unique_ids):
+            open_loans.setdefault(record['book_id'], []).append(record)
+        
+        results = []
+        closed = []
+        total_fee = 0.00
+        for book_id in book_ids:
+            if book_id not in titles:
+                results.append((book_id, 'not_found', None))
+                continue
+            loan = {'book_id': book_id, 'title': titles[book_id]}
+            if not open_loans.get(book_id):
+                results.append((book_id, 'no_record', loan))
+                continue
+            record = open_loans[book_id].pop(0)
+            due_date = datetime.fromisoformat(record['due_date'])
+            fee_amount = late_fee(due_date, return_date) if late_fee else 0.00
+            total_fee += fee_amount
+            closed.append((record['id'], book_id))
+            loan.update({
+                'borrow_date': datetime.fromisoformat(record['borrow_date']),
+                'due_date': due_date,
+                'return_date': return_date,
+                'fee_amount': fee_amount,
+            })
+            results.append((book_id, 'returned', loan))
+        
+        conn.executemany('''
+            UPDATE borrow_records SET return_date = ? WHERE id = ? AND return_date IS NULL
+        ''', [(return_date.isoformat(), record_id) for record_id, _ in closed])
+        conn.executemany('''
+            UPDATE books SET available_copies = available_copies + 1 WHERE id = ?
+        ''', [(book_id,) for _, book_id in closed])
+        if total_fee > 0:
+            conn.execute('''
+                UPDATE patrons SET fees_assessed = fees_assessed + ? WHERE patron_id = ?
+            ''', (total_fee, patron_id))
+        conn.commit()
+        for _, book_id in closed:
+            invalidate_book_cache(book_id)
+        return 'ok', results
+    except Exception as e:
+        conn.rollback()
+        return 'error', []
+    finally:
+        conn.close()
+
+def reconcile_patron_counters_batch(after: str, limit: int,
+                                    late_fee: Callable[[datetime, datetime], float],
+                                    fix: bool = True) -> Tuple[int, List[Dict], Optional[str]]:
+    """
+    Check (and optionally repair) the patrons counters for one batch of patrons.
+
+    Takes the next `limit` patron ids after `after` from patrons and
+    borrow_records, recounts their open loans and re-assesses the late fees
+    on their returned loans, and compares both with the stored counters.
+    The batch runs in one BEGIN IMMEDIATE transaction, so borrows and returns
+    cannot slip in between the recount and the repair.
+
+    Args:
+        after: Last patron id of the previous batch ('' to start)
+        limit: Patrons per batch
+        late_fee: Fee schedule, called as late_fee(due_date, return_date)
+        fix: Overwrite counters that do not match
+
+    Returns:
+        tuple: (patrons checked, mismatches, last patron id or None when done)
+    """
+    conn = get_db_connection()
+    try:
+        return reconcile_patrons_batch(conn, after, limit, late_fee, fix)
+    finally:
+        conn.close()
+
+# Payment jobs (see services/payment_jobs.py)
+
+PAYMENT_JOB_COLUMNS = ('id', 'kind', 'patron_id', 'book_id', 'amount', 'description', 'reference',
+                       'status', 'transaction_id', 'message', 'idempotency_key', 'created_at', 'updated_at')
+
+def insert_payment_job(kind: str, amount: float, description: str = '', patron_id: Optional[str] = None,
+                       book_id: Optional[int] = None, reference: Optional[str] = None,
+                       idempotency_key: Optional[str] = None) -> Optional[int]:
+    """
+    Queue a gateway charge or refund.
+
+    Returns:
+        int: The new job id, or None if `idempotency_key` already has a job
+    """
+    now = datetime.now().isoformat()
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute('''
+            INSERT INTO payment_jobs (kind, patron_id, book_id, amount, description, reference,
+                                      status, idempotency_key, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, 'queued', ?, ?, ?)
+            ON CONFLICT (idempotency_key) WHERE idempotency_key IS NOT NULL DO NOTHING
+        ''', (kind, patron_id, book_id, amount, description, reference, idempotency_key, now, now))
+        conn.commit()
+        return cursor.lastrowid if cursor.rowcount == 1 else None
+    finally:
+        conn.close()
+
+def get_payment_job(job_id: int) -> Optional[Dict]:
+    """Get a payment job by id."""
+    conn = get_db_connection()
+    try:
+        row = conn.execute(f'''
+            SELECT {', '.join(PAYMENT_JOB_COLUMNS)} FROM payment_jobs WHERE id = ?
+        ''', (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+def get_payment_job_by_key(idempotency_key: str) -> Optional[Dict]:
+    """Get the payment job queued under an idempotency key."""
+    conn = get_db_connection()
+    try:
+        row = conn.execute(f'''
+            SELECT {', '.join(PAYMENT_JOB_COLUMNS)} FROM payment_jobs WHERE idempotency_key = ?
+        ''', (idempotency_key,)).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+def start_payment_job(job_id: int) -> Optional[Dict]:
+    """
+    Move a queued job to 'processing' and return it.
+
+    The status check and update are one statement, so a job submitted to
+    more than one worker is still only sent to the gateway once.
+
+    Returns:
+        dict: The job, or None if it does not exist or is no longer queued
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute('''
+            UPDATE payment_jobs SET status = 'processing', updated_at = ?
+            WHERE id = ? AND status = 'queued'
+        ''', (datetime.now().isoformat(), job_id))
+        conn.commit()
+        if cursor.rowcount == 0:
+            return None
+        row = conn.execute(f'''
+            SELECT {', '.join(PAYMENT_JOB_COLUMNS)} FROM payment_jobs WHERE id = ?
+        ''', (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return dict(row)
+
+def finish_payment_job(job_id: int, status: str, transaction_id: Optional[str], message: str) -> bool:
+    """Record the gateway outcome ('succeeded' or 'failed') of a processing job."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute('''
+            UPDATE payment_jobs SET status = ?, transaction_id = ?, message = ?, updated_at = ?
+            WHERE id = ? AND status = 'processing'
+        ''', (status, transaction_id, message, datetime.now().isoformat(), job_id))
+        conn.commit()
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+def get_unfinished_payment_job_ids() -> Tuple[List[int], List[int]]:
+    """Ids of queued jobs and of jobs left 'processing' (e.g. by a crash), oldest first."""
+    conn = get_db_connection()
+    try:
+        rows = conn.execute('''
+            SELECT id, status FROM payment_jobs
+            WHERE status IN ('queued', 'processing') ORDER BY id
+        ''').fetchall()
+    finally:
+        conn.close()
+    return ([row['id'] for row in rows if row['status'] == 'queued'],
+            [row['id'] for row in rows if row['status'] == 'processing'])
+
+# Payments ledger
+
+PAYMENT_COLUMNS = ('id', 'kind', 'patron_id', 'book_id', 'amount', 'status', 'transaction_id', 'reference',
+                   'idempotency_key', 'message', 'created_at', 'updated_at')
+
+def insert_payment(kind: str, amount: float, patron_id: Optional[str] = None, book_id: Optional[int] = None,
+                   reference: Optional[str] = None, idempotency_key: Optional[str] = None) -> Optional[int]:
+    """
+    Record a gateway call as 'pending' before it is made.
+
+    Returns:
+        int: The new payment id, or None if `idempotency_key` is already in the ledger
+    """
+    now = datetime.now().isoformat()
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute('''
+            INSERT INTO payments (kind, patron_id, book_id, amount, status, reference, idempotency_key,
+                                  created_at, updated_at)
+            VALUES (?, ?, ?, ?, 'pending', ?, ?, ?, ?)
+            ON CONFLICT (idempotency_key) WHERE idempotency_key IS NOT NULL DO NOTHING
+        ''', (kind, patron_id, book_id, amount, reference, idempotency_key, now, now))
+        conn.commit()
+        return cursor.lastrowid if cursor.rowcount == 1 else None
+    finally:
+        conn.close()
+
+def complete_payment(payment_id: int, status: str, transaction_id: Optional[str], message: str) -> bool:
+    """Store the gateway outcome ('succeeded' or 'failed') of a pending payment."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute('''
+            UPDATE payments SET status = ?, transaction_id = ?, message = ?, updated_at = ?
+            WHERE id = ? AND status = 'pending'
+        ''', (status, transaction_id, message, datetime.now().isoformat(), payment_id))
+        conn.commit()
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+def _get_payment(where: str, params: Tuple) -> Optional[Dict]:
+    conn = get_db_connection()
+    try:
+        row = conn.execute(f'''
+            SELECT {', '.join(PAYMENT_COLUMNS)} FROM payments WHERE {where}
+        ''', params).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+def get_payment_by_key(idempotency_key: str) -> Optional[Dict]:
+    """Get the payment recorded under an idempotency key."""
+    return _get_payment('idempotency_key = ?', (idempotency_key,))
+
+def get_charge_by_transaction(transaction_id: str) -> Optional[Dict]:
+    """Get the successful charge with a gateway transaction id."""
+    return _get_payment("transaction_id = ? AND kind = 'charge' AND status = 'succeeded'", (transaction_id,))
+
+def get_patron_payments_page(patron_id: str, before: Optional[Tuple[str, int]] = None,
+                             limit: int = 20) -> Tuple[List[Dict], bool]:
+    """
+    Get one page of a patron's ledger entries, newest first.
+    
+    Keyset pagination on (created_at, id) over idx_payments_patron_created.
+    
+    Args:
+        patron_id: 6-digit library card ID
+        before: (created_at ISO string, payment id) of the last entry on the previous page
+        limit: Maximum number of entries to return
+        
+    Returns:
+        tuple: (payments: list of dicts, has_more: bool)
+    """
+    where = 'patron_id = ?'
+    params = [patron_id]
+    if before is not None:
+        where += ' AND (created_at, id) < (?, ?)'
+        params += list(before)
+    
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(f'''
+            SELECT {', '.join(PAYMENT_COLUMNS)} FROM payments
+            WHERE {where}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        ''', params + [limit + 1]).fetchall()
+    finally:
+        conn.close()
+    
+    return [dict(row) for row in rows[:limit]], len(rows) > limit
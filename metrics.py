@@ -0,0 +1,325 @@
+"""
+Metrics module for Library Management System
+Prometheus-style counters and histograms for HTTP requests, SQL statements
+and payment gateway calls, plus an optional per-request cProfile breakdown
+(X-Profile request header)
+"""
+
+import cProfile
+import io
+import pstats
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import database
+
+# Default latency buckets in seconds (the Prometheus client defaults)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Buckets for "statements per request"
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Lines of cProfile output and slowest statements in an X-Profile report
+PROFILE_TOP_FUNCTIONS = 30
+PROFILE_TOP_STATEMENTS = 10
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, optionally split by label values."""
+
+    type = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        """Add `amount` to the series for the given label values (in label order)."""
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}' for key, value in values]
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by label values."""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        """Record one observation for the given label values (in label order)."""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), sum, count
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *label_values) -> int:
+        with self._lock:
+            series = self._series.get(label_values)
+            return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            snapshot = sorted((key, (list(counts), total, count)) for key, (counts, total, count)
+                              in self._series.items())
+        lines = []
+        for key, (counts, total, count) in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels, key, f'le="{_format_value(bound)}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labels, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+# A collector returns (name, type, help, [(labels dict, value), ...]) tuples at scrape time
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict, float]]]]]
+
+
+class MetricsRegistry:
+    """Holds metrics and scrape-time collectors, and renders them as Prometheus text."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Collector):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format (0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, metric_type, help, samples in collector():
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(tuple(labels), tuple(labels.values()))} '
+                                 f'{_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+REQUESTS = REGISTRY.counter(
+    'library_http_requests_total', 'HTTP requests by endpoint, method and status.',
+    ('endpoint', 'method', 'status'))
+REQUEST_DURATION = REGISTRY.histogram(
+    'library_http_request_duration_seconds', 'HTTP request latency by endpoint.', ('endpoint', 'method'))
+REQUEST_SQL_STATEMENTS = REGISTRY.histogram(
+    'library_http_request_sql_statements', 'SQL statements issued per HTTP request.', ('endpoint',),
+    COUNT_BUCKETS)
+REQUEST_SQL_DURATION = REGISTRY.histogram(
+    'library_http_request_sql_seconds', 'Time spent in SQL per HTTP request.', ('endpoint',))
+SQL_STATEMENTS = REGISTRY.counter(
+    'library_sql_statements_total', 'SQL statements by leading keyword.', ('operation',))
+SQL_DURATION = REGISTRY.histogram(
+    'library_sql_statement_duration_seconds', 'SQL statement latency by leading keyword.', ('operation',),
+    (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0))
+GATEWAY_DURATION = REGISTRY.histogram(
+    'library_payment_gateway_duration_seconds', 'Payment gateway call latency by operation and outcome.',
+    ('operation', 'outcome'))
+
+
+def observe_gateway_call(operation: str, seconds: float, outcome: str):
+    """
+    Record one payment gateway call.
+
+    Args:
+        operation: 'charge', 'refund' or 'status'
+        seconds: Wall-clock duration of the call
+        outcome: 'success', 'declined' or 'error'
+    """
+    GATEWAY_DURATION.observe(seconds, operation, outcome)
+
+
+def _collect_book_cache():
+    stats = database.get_book_cache_stats()
+    for key in ('hits', 'misses', 'evictions', 'expirations', 'invalidations'):
+        yield (f'library_book_cache_{key}_total', 'counter', f'Book cache {key}.', [({}, stats[key])])
+    yield ('library_book_cache_entries', 'gauge', 'Books currently cached.', [({}, stats['size'])])
+    yield ('library_book_cache_hit_ratio', 'gauge', 'Book cache hits / lookups since start.',
+           [({}, round(stats['hit_rate'], 6))])
+
+
+def _collect_pool():
+    stats = database.get_pool_stats()
+    yield ('library_db_pool_connections', 'gauge', 'Open pooled connections by state.',
+           [({'state': 'in_use'}, stats['in_use']), ({'state': 'idle'}, stats['idle'])])
+    yield ('library_db_pool_checkouts_total', 'counter', 'Connections checked out of the pool.',
+           [({}, stats['checkouts'])])
+    yield ('library_db_pool_timeouts_total', 'counter', 'Checkouts that timed out waiting.',
+           [({}, stats['timeouts'])])
+    yield ('library_db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a pooled connection.',
+           [({}, round(stats['wait_time_total'], 6))])
+
+
+REGISTRY.add_collector(_collect_book_cache)
+REGISTRY.add_collector(_collect_pool)
+
+
+# Per-request accounting: set by the before_request hook, read by the statement observer
+_request_stats: ContextVar[Optional[Dict]] = ContextVar('library_request_stats', default=None)
+
+_KEYWORD = re.compile(r'\s*(\w+)')
+
+
+def _observe_statement(sql: str, parameters, seconds: float):
+    match = _KEYWORD.match(sql)
+    operation = match.group(1).upper() if match else 'OTHER'
+    SQL_STATEMENTS.inc(operation)
+    SQL_DURATION.observe(seconds, operation)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats['sql_statements'] += 1
+        stats['sql_seconds'] += seconds
+        if stats['statements'] is not None:
+            stats['statements'].append((seconds, sql))
+
+
+def render_metrics() -> str:
+    """Current metrics in the Prometheus text format."""
+    return REGISTRY.render()
+
+
+def _profile_report(stats: Dict, request, response, elapsed: float) -> str:
+    out = io.StringIO()
+    out.write(f"{request.method} {request.full_path.rstrip('?')} -> {response.status_code} "
+              f"in {elapsed * 1000:.1f} ms\n")
+    out.write(f"SQL: {stats['sql_statements']} statements, {stats['sql_seconds'] * 1000:.1f} ms\n")
+    for seconds, sql in sorted(stats['statements'], key=lambda item: -item[0])[:PROFILE_TOP_STATEMENTS]:
+        out.write(f"  {seconds * 1000:8.3f} ms  {' '.join(sql.split())[:160]}\n")
+    out.write(f"\ncProfile, top {PROFILE_TOP_FUNCTIONS} by cumulative time:\n")
+    pstats.Stats(stats['profiler'], stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+    return out.getvalue()
+
+
+def init_app(app, profiling: bool = False):
+    """
+    Instrument a Flask app.
+
+    Records request latency, status and SQL per request, and adds a
+    Server-Timing header. With `profiling`, a request carrying an X-Profile
+    header is run under cProfile and answered with a plain-text report of
+    its SQL statements and hottest functions instead of the normal body.
+
+    Args:
+        app: Flask application
+        profiling: Honour the X-Profile request header
+    """
+    from flask import g, request
+
+    database.add_statement_observer(_observe_statement)
+    app.extensions['library_metrics'] = {'profiling': profiling}
+
+    @app.before_request
+    def start_request_metrics():
+        profile = profiling and bool(request.headers.get('X-Profile'))
+        stats = {'sql_statements': 0, 'sql_seconds': 0.0, 'statements': [] if profile else None,
+                 'profiler': None, 'start': time.perf_counter()}
+        g.library_metrics_token = _request_stats.set(stats)
+        if profile:
+            stats['profiler'] = cProfile.Profile()
+            stats['profiler'].enable()
+
+    @app.after_request
+    def record_request_metrics(response):
+        stats = _request_stats.get()
+        if stats is None:
+            return response
+        if stats['profiler'] is not None:
+            stats['profiler'].disable()
+        elapsed = time.perf_counter() - stats['start']
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+        REQUESTS.inc(endpoint, request.method, str(response.status_code))
+        REQUEST_DURATION.observe(elapsed, endpoint, request.method)
+        REQUEST_SQL_STATEMENTS.observe(stats['sql_statements'], endpoint)
+        REQUEST_SQL_DURATION.observe(stats['sql_seconds'], endpoint)
+        response.headers['Server-Timing'] = (f"app;dur={elapsed * 1000:.1f}, "
+                                             f"sql;dur={stats['sql_seconds'] * 1000:.1f};"
+                                             f"desc=\"{stats['sql_statements']} statements\"")
+
+        if stats['profiler'] is not None:
+            report = _profile_report(stats, request, response, elapsed)
+            response.direct_passthrough = False
+            response.set_data(report)
+            response.mimetype = 'text/plain'
+            # The report replaces the body, so it must not be cached as the real response
+            response.headers.pop('ETag', None)
+            response.headers['Cache-Control'] = 'no-store'
+            response.headers['X-Profile-Duration-Ms'] = f'{elapsed * 1000:.1f}'
+            response.headers['X-Profile-SQL-Statements'] = str(stats['sql_statements'])
+            response.headers['X-Profile-SQL-Ms'] = f"{stats['sql_seconds'] * 1000:.1f}"
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(exc):
+        token = g.pop('library_metrics_token', None)
+        if token is not None:
+            _request_stats.reset(token)
@@ -0,0 +1,571 @@
+"""
+Schema Migrations Module for Library Management System
+Versioned, ordered schema changes applied at startup or from the command line
+
+Each migration is a function registered with @migration(version, description).
+Pending migrations run in version order and every applied version is recorded
+in the schema_version table, so an existing library.db is upgraded in place.
+
+Usage:
+    python migrations.py status            # show applied / pending migrations
+    python migrations.py upgrade [--target N]
+    python migrations.py rebuild-fts       # (re)build the full-text search index
+    python migrations.py reconcile-patrons [--check]   # verify/repair patron counters
+"""
+
+import argparse
+import sqlite3
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Rows updated per transaction by backfill_in_batches()
+BACKFILL_BATCH_SIZE = 10000
+
+MIGRATIONS: List[Dict] = []
+
+
+def migration(version: int, description: str, transactional: bool = True):
+    """
+    Register a migration function.
+
+    Args:
+        version: Unique, increasing schema version number
+        description: Short human readable summary
+        transactional: When True the migration runs inside one BEGIN IMMEDIATE
+                       transaction together with its schema_version row. Set to
+                       False for long backfills that commit in batches; such
+                       migrations must be safe to re-run after an interruption.
+    """
+    def register(func: Callable[[sqlite3.Connection], None]):
+        if any(m['version'] == version for m in MIGRATIONS):
+            raise ValueError(f"Duplicate migration version {version}.")
+        MIGRATIONS.append({
+            'version': version,
+            'description': description,
+            'transactional': transactional,
+            'apply': func,
+        })
+        MIGRATIONS.sort(key=lambda m: m['version'])
+        return func
+    return register
+
+
+def backfill_in_batches(conn: sqlite3.Connection, table: str, statement: str,
+                        batch_size: int = BACKFILL_BATCH_SIZE, pause: float = 0.0) -> int:
+    """
+    Run an UPDATE/INSERT ... SELECT over `table` in rowid ranges, one short
+    transaction per range, so writers are never locked out for long and WAL
+    readers are never blocked.
+
+    Args:
+        conn: Database connection
+        table: Table whose rowid range drives the batches
+        statement: SQL using the named parameters :start and :end, e.g.
+                   "UPDATE t SET x = ... WHERE rowid > :start AND rowid <= :end"
+        batch_size: Rows per batch
+        pause: Seconds to sleep between batches to yield to other writers
+
+    Returns:
+        int: Total number of rows changed
+    """
+    if conn.in_transaction:
+        conn.commit()
+    max_rowid = conn.execute(f'SELECT MAX(rowid) FROM {table}').fetchone()[0] or 0
+    changed = 0
+    start = 0
+    while start < max_rowid:
+        end = start + batch_size
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            changed += conn.execute(statement, {'start': start, 'end': end}).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        start = end
+        if pause:
+            time.sleep(pause)
+    return changed
+
+
+def _ensure_version_table(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    ''')
+    conn.commit()
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Get the highest applied migration version (0 for a new database)."""
+    _ensure_version_table(conn)
+    return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+
+def get_applied_versions(conn: sqlite3.Connection) -> List[int]:
+    """Get every applied migration version in ascending order."""
+    _ensure_version_table(conn)
+    return [row[0] for row in conn.execute('SELECT version FROM schema_version ORDER BY version')]
+
+
+def _record(conn: sqlite3.Connection, entry: Dict):
+    conn.execute('INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)',
+                 (entry['version'], entry['description'], datetime.now().isoformat()))
+
+
+def run_migrations(conn: sqlite3.Connection, target: Optional[int] = None) -> List[int]:
+    """
+    Apply every pending migration up to `target` (default: latest).
+
+    Safe to call from several processes at once: each transactional migration
+    re-checks schema_version after taking the write lock.
+
+    Args:
+        conn: Database connection
+        target: Highest version to apply
+
+    Returns:
+        list: Versions applied by this call
+    """
+    applied = set(get_applied_versions(conn))
+    done = []
+    for entry in MIGRATIONS:
+        version = entry['version']
+        if version in applied or (target is not None and version > target):
+            continue
+
+        if entry['transactional']:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if conn.execute('SELECT 1 FROM schema_version WHERE version = ?', (version,)).fetchone():
+                    conn.rollback()
+                    continue
+                entry['apply'](conn)
+                _record(conn, entry)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        else:
+            entry['apply'](conn)
+            conn.execute('INSERT OR IGNORE INTO schema_version (version, description, applied_at) '
+                         'VALUES (?, ?, ?)',
+                         (version, entry['description'], datetime.now().isoformat()))
+            conn.commit()
+        done.append(version)
+    return done
+
+
+# ---------------------------------------------------------------------------
+# Migrations
+# ---------------------------------------------------------------------------
+
+@migration(1, 'Create books and borrow_records tables')
+def create_base_tables(conn):
+    # Create books table
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS books (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            author TEXT NOT NULL,
+            isbn TEXT UNIQUE NOT NULL,
+            total_copies INTEGER NOT NULL,
+            available_copies INTEGER NOT NULL
+        )
+    ''')
+
+    # Create borrow_records table
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS borrow_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            borrow_date TEXT NOT NULL,
+            due_date TEXT NOT NULL,
+            return_date TEXT,
+            FOREIGN KEY (book_id) REFERENCES books (id)
+        )
+    ''')
+
+
+@migration(2, 'Add secondary indexes for loan, history and catalog lookups')
+def add_secondary_indexes(conn):
+    # Patron borrow history ordered by borrow date; also serves the open-loan
+    # lookups by patron (currently borrowed books, borrow-limit count)
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_patron_borrow_date
+        ON borrow_records (patron_id, borrow_date)
+    ''')
+    # Loans of a given book, optionally narrowed to one patron
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_book_patron
+        ON borrow_records (book_id, patron_id)
+    ''')
+    # Catalog listing ordered by title and author lookups
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_books_title ON books (title)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_books_author ON books (author)')
+
+
+@migration(3, 'Add case-insensitive title/author indexes for prefix search')
+def add_search_indexes(conn):
+    # LIKE 'term%' can only use an index declared with the NOCASE collation
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_books_title_nocase ON books (title COLLATE NOCASE)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_books_author_nocase ON books (author COLLATE NOCASE)')
+
+
+def create_fulltext_index(conn):
+    """Create the FTS5 index over books(title, author) and the triggers that keep it in sync."""
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+            title, author,
+            content='books', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+        END
+    ''')
+    # Only title/author changes touch the index, not availability updates
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+    ''')
+
+
+def rebuild_fulltext_index(conn):
+    """
+    (Re)build the full-text index from the books table and merge its segments.
+    Creates the index first if it does not exist.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        create_fulltext_index(conn)
+        conn.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+        conn.execute("INSERT INTO books_fts (books_fts) VALUES ('optimize')")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+@migration(4, 'Add FTS5 full-text index on book title and author')
+def add_fulltext_index(conn):
+    create_fulltext_index(conn)
+    conn.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+
+
+@migration(5, 'Add catalog version counter bumped on every books change')
+def add_catalog_version(conn):
+    # A single-row counter lets clients revalidate (ETag / If-None-Match)
+    # with one primary-key lookup instead of re-reading the catalog
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 1)')
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS books_version_{event.lower()} AFTER {event} ON books BEGIN
+                UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+            END
+        ''')
+
+
+@migration(6, 'Add partial index on due dates of open loans for batch fee runs')
+def add_overdue_index(conn):
+    # Whole-library late-fee runs scan open loans past their due date
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_open_due_date
+        ON borrow_records (due_date) WHERE return_date IS NULL
+    ''')
+
+
+def reconcile_patrons_batch(conn, after: str, limit: int,
+                            late_fee: Callable[[datetime, datetime], float],
+                            fix: bool = True) -> Tuple[int, List[Dict], Optional[str]]:
+    """
+    Check (and optionally repair) the patrons counters for the next `limit`
+    patron ids after `after`, in one BEGIN IMMEDIATE transaction on `conn`.
+    See database.reconcile_patron_counters_batch().
+
+    Returns:
+        tuple: (patrons checked, mismatches, last patron id or None when done)
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Both queries walk an index in patron_id order and stop after `limit` rows
+        patron_ids = sorted(set(
+            [row[0] for row in conn.execute('''
+                SELECT DISTINCT patron_id FROM borrow_records WHERE patron_id > ? ORDER BY patron_id LIMIT ?
+            ''', (after, limit))] +
+            [row[0] for row in conn.execute('''
+                SELECT patron_id FROM patrons WHERE patron_id > ? ORDER BY patron_id LIMIT ?
+            ''', (after, limit))]
+        ))[:limit]
+        if not patron_ids:
+            conn.rollback()
+            return 0, [], None
+        bounds = (patron_ids[0], patron_ids[-1])
+
+        expected = {patron_id: [0, 0.00] for patron_id in patron_ids}
+        for patron_id, active_loans in conn.execute('''
+            SELECT patron_id, COUNT(*) AS active_loans FROM borrow_records
+            WHERE patron_id BETWEEN ? AND ? AND return_date IS NULL
+            GROUP BY patron_id
+        ''', bounds):
+            expected[patron_id][0] = active_loans
+        for patron_id, due_date, return_date in conn.execute('''
+            SELECT patron_id, due_date, return_date FROM borrow_records
+            WHERE patron_id BETWEEN ? AND ? AND return_date > due_date
+        ''', bounds):
+            expected[patron_id][1] += late_fee(datetime.fromisoformat(due_date), datetime.fromisoformat(return_date))
+
+        stored = {patron_id: (active_loans, fees_assessed) for patron_id, active_loans, fees_assessed
+                  in conn.execute('''
+            SELECT patron_id, active_loans, fees_assessed FROM patrons WHERE patron_id BETWEEN ? AND ?
+        ''', bounds)}
+
+        mismatches = []
+        for patron_id in patron_ids:
+            active_loans, fees_assessed = expected[patron_id]
+            fees_assessed = round(fees_assessed, 2)
+            stored_loans, stored_fees = stored.get(patron_id, (None, None))
+            if stored_loans != active_loans or stored_fees is None or round(stored_fees, 2) != fees_assessed:
+                mismatches.append({
+                    'patron_id': patron_id,
+                    'active_loans': stored_loans,
+                    'expected_active_loans': active_loans,
+                    'fees_assessed': stored_fees,
+                    'expected_fees_assessed': fees_assessed
+                })
+
+        if fix and mismatches:
+            conn.executemany('''
+                INSERT INTO patrons (patron_id, active_loans, fees_assessed) VALUES (?, ?, ?)
+                ON CONFLICT (patron_id) DO UPDATE
+                SET active_loans = excluded.active_loans, fees_assessed = excluded.fees_assessed
+            ''', [(m['patron_id'], m['expected_active_loans'], m['expected_fees_assessed'])
+                  for m in mismatches])
+        conn.commit()
+        return len(patron_ids), mismatches, patron_ids[-1]
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def create_patron_counter_triggers(conn):
+    """Keep patrons.active_loans in step with open borrow_records on every write path."""
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS borrow_records_patron_ai
+        AFTER INSERT ON borrow_records WHEN new.return_date IS NULL BEGIN
+            INSERT OR IGNORE INTO patrons (patron_id) VALUES (new.patron_id);
+            UPDATE patrons SET active_loans = active_loans + 1 WHERE patron_id = new.patron_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS borrow_records_patron_au
+        AFTER UPDATE OF patron_id, return_date ON borrow_records
+        WHEN old.patron_id IS NOT new.patron_id OR (old.return_date IS NULL) != (new.return_date IS NULL) BEGIN
+            UPDATE patrons SET active_loans = active_loans - 1
+            WHERE patron_id = old.patron_id AND old.return_date IS NULL;
+            INSERT OR IGNORE INTO patrons (patron_id) VALUES (new.patron_id);
+            UPDATE patrons SET active_loans = active_loans + 1
+            WHERE patron_id = new.patron_id AND new.return_date IS NULL;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS borrow_records_patron_ad
+        AFTER DELETE ON borrow_records WHEN old.return_date IS NULL BEGIN
+            UPDATE patrons SET active_loans = active_loans - 1 WHERE patron_id = old.patron_id;
+        END
+    ''')
+
+
+# Fee for 0, 1, 2, ... days overdue under the schedule in force when migration 7
+# was written ($0.50/day for a week, then $1.00/day, capped at $15.00). Frozen
+# here so the backfill's result never changes with later fee changes.
+_MIGRATION_7_FEE_BY_DAYS = (0.0, 0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.5, 5.5,
+                            6.5, 7.5, 8.5, 9.5, 10.5, 11.5, 12.5, 13.5, 14.5, 15.0)
+
+# Patrons recounted per transaction by the migration 7 backfill
+PATRON_BACKFILL_BATCH_SIZE = 500
+
+
+def _migration_7_late_fee(due_date: datetime, return_date: datetime) -> float:
+    days = (return_date - due_date).days
+    return _MIGRATION_7_FEE_BY_DAYS[min(days, len(_MIGRATION_7_FEE_BY_DAYS) - 1)]
+
+
+@migration(7, 'Add patrons table with active loan and assessed late fee counters', transactional=False)
+def add_patron_counters(conn):
+    # Materialised per-patron counters: the borrow limit check reads one row
+    # instead of counting borrow_records. fees_assessed is the total of late
+    # fees assessed on returns, whether or not they have been paid since;
+    # payments and refunds are recorded separately in the payments ledger.
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS patrons (
+                patron_id TEXT PRIMARY KEY,
+                active_loans INTEGER NOT NULL DEFAULT 0,
+                fees_assessed REAL NOT NULL DEFAULT 0
+            )
+        ''')
+        # Triggers first: patrons already backfilled stay in step with borrows
+        # and returns made while later batches are still being counted
+        create_patron_counter_triggers(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    # Backfill active_loans and the late fees already assessed on returned
+    # loans, one short transaction per batch of patrons. Re-running after an
+    # interruption just recounts.
+    after = ''
+    while after is not None:
+        _, _, after = reconcile_patrons_batch(conn, after, PATRON_BACKFILL_BATCH_SIZE, _migration_7_late_fee)
+
+
+@migration(8, 'Add partial index on open loans by patron and book for returns')
+def add_open_loan_index(conn):
+    # The return lookup (patron_id, book_id, open) otherwise walks every
+    # loan the patron ever had through idx_borrow_records_patron_borrow_date
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_open_patron_book
+        ON borrow_records (patron_id, book_id, borrow_date) WHERE return_date IS NULL
+    ''')
+
+
+@migration(9, 'Add payment_jobs table for queued gateway charges and refunds')
+def add_payment_jobs(conn):
+    # kind is 'charge' or 'refund'; reference is the original transaction of
+    # a refund. status moves queued -> processing -> succeeded / failed.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS payment_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            patron_id TEXT,
+            book_id INTEGER,
+            amount REAL NOT NULL,
+            description TEXT NOT NULL DEFAULT '',
+            reference TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            transaction_id TEXT,
+            message TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    ''')
+    # Workers resume unfinished jobs at startup
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_payment_jobs_unfinished
+        ON payment_jobs (id) WHERE status IN ('queued', 'processing')
+    ''')
+
+
+@migration(10, 'Add payments ledger and idempotency keys for payments and payment jobs')
+def add_payments_ledger(conn):
+    # One row per gateway charge or refund. status is pending while the
+    # gateway call is in flight, then succeeded or failed. reference is the
+    # original transaction of a refund.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            patron_id TEXT,
+            book_id INTEGER,
+            amount REAL NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            transaction_id TEXT,
+            reference TEXT,
+            idempotency_key TEXT,
+            message TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    ''')
+    # A retried request with the same key must find the first attempt
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_payments_idempotency_key
+        ON payments (idempotency_key) WHERE idempotency_key IS NOT NULL
+    ''')
+    # Patron payment history, newest first, keyset-paged on (created_at, id)
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_payments_patron_created
+        ON payments (patron_id, created_at, id)
+    ''')
+    # Queued payments take the same keys, so a retried POST finds its job
+    conn.execute('ALTER TABLE payment_jobs ADD COLUMN idempotency_key TEXT')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_payment_jobs_idempotency_key
+        ON payment_jobs (idempotency_key) WHERE idempotency_key IS NOT NULL
+    ''')
+    # Refunds look up the original charge by gateway transaction id
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_payments_transaction_id
+        ON payments (transaction_id) WHERE transaction_id IS NOT NULL
+    ''')
+
+
+def main():
+    import database
+    from config import load_storage_config
+
+    parser = argparse.ArgumentParser(description='Apply or inspect schema migrations.')
+    parser.add_argument('command', choices=['status', 'upgrade', 'rebuild-fts', 'reconcile-patrons'])
+    parser.add_argument('--db', help='Database path (default: LIBRARY_DB_PATH or library.db)')
+    parser.add_argument('--target', type=int, help='Highest version to apply')
+    parser.add_argument('--check', action='store_true', help='reconcile-patrons: report mismatches only')
+    args = parser.parse_args()
+
+    database.configure_database(load_storage_config({'LIBRARY_DB_PATH': args.db} if args.db else None))
+    conn = database.get_db_connection()
+    try:
+        if args.command == 'rebuild-fts':
+            rebuild_fulltext_index(conn)
+            count = conn.execute('SELECT COUNT(*) FROM books').fetchone()[0]
+            print(f"Rebuilt full-text index for {count} books.")
+            return
+        if args.command == 'reconcile-patrons':
+            from services.library_service import reconcile_patron_counters
+            result = reconcile_patron_counters(fix=not args.check)
+            for mismatch in result['mismatches']:
+                print(f"{mismatch['patron_id']}: active_loans {mismatch['active_loans']} -> "
+                      f"{mismatch['expected_active_loans']}, fees_assessed {mismatch['fees_assessed']} -> "
+                      f"{mismatch['expected_fees_assessed']}")
+            print(f"Checked {result['patrons_checked']} patrons, {len(result['mismatches'])} mismatched, "
+                  f"{result['fixed']} fixed.")
+            return
+        if args.command == 'upgrade':
+            applied = run_migrations(conn, args.target)
+            print(f"Applied migrations: {applied}" if applied else "Database is up to date.")
+        applied = set(get_applied_versions(conn))
+        for entry in MIGRATIONS:
+            state = 'applied' if entry['version'] in applied else 'pending'
+            print(f"{entry['version']:>4}  {state:<8} {entry['description']}")
+    finally:
+        conn.close()
+        database.close_pool()
+
+
+if __name__ == '__main__':
+    main()
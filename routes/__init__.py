@@ -7,6 +7,7 @@ from .borrowing_routes import borrowing_bp
 from .search_routes import search_bp
 from .api_routes import api_bp
 from .borrower_status_routes import borrower_status_bp
+from .metrics_routes import metrics_bp
 
 def register_blueprints(app):
     """Register all route blueprints with the Flask app."""
@@ -15,6 +16,7 @@ def register_blueprints(app):
     app.register_blueprint(search_bp)
     app.register_blueprint(api_bp)
     app.register_blueprint(borrower_status_bp)
+    app.register_blueprint(metrics_bp)
     #app.register_blueprint(borrower_status_bp, url_prefix='/borrower_status')   
     
     
@@ -2,12 +2,101 @@
 API Routes - JSON API endpoints
 """
 
-from flask import Blueprint, jsonify, request
+import base64
+import binascii
+import hashlib
+from datetime import datetime
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context, url_for
 #from library_service import calculate_late_fee_for_book, search_books_in_catalog
-from services.library_service import calculate_late_fee_for_book, search_books_in_catalog
+from services.library_service import (
+    calculate_late_fee_for_book, search_books_in_catalog, get_patron_history,
+    borrow_books_by_patron, return_books_by_patron,
+    enqueue_late_fee_payment, enqueue_late_fee_refund, get_payment_job_status,
+    get_patron_payment_history
+)
+from services.import_service import IMPORT_FORMATS, detect_format, import_books
+from services.export_service import CONTENT_TYPES, EXPORT_FORMATS, export_filename, export_table
+from database import EXPORT_TABLES, get_books_after_id, get_book_fields, get_catalog_version
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+# Search result paging
+DEFAULT_SEARCH_LIMIT = 100
+MAX_SEARCH_LIMIT = 500
+
+# Catalog listing paging
+DEFAULT_BOOKS_LIMIT = 100
+MAX_BOOKS_LIMIT = 1000
+
+# Raw request bodies accepted by /books/bulk, by Content-Type
+IMPORT_CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+    'application/marc': 'marc',
+}
+
+# Borrow history paging
+DEFAULT_HISTORY_LIMIT = 20
+MAX_HISTORY_LIMIT = 100
+
+
+def encode_cursor(book_id):
+    """Opaque cursor pointing after the given book id."""
+    return base64.urlsafe_b64encode(f'id:{book_id}'.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a cursor from encode_cursor(); raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+    prefix, _, value = raw.partition(':')
+    if prefix != 'id' or not value.isdigit():
+        raise ValueError('Invalid cursor')
+    return int(value)
+
+def encode_history_cursor(cursor, prefix='loan'):
+    """Opaque cursor for a (timestamp, row id) history keyset: loans, or payments with prefix='payment'."""
+    timestamp, row_id = cursor
+    return base64.urlsafe_b64encode(f'{prefix}:{row_id}:{timestamp}'.encode()).decode().rstrip('=')
+
+def decode_history_cursor(cursor, prefix='loan'):
+    """Decode a cursor from encode_history_cursor(); raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+    parts = raw.split(':', 2)
+    if len(parts) != 3 or parts[0] != prefix or not parts[1].isdigit():
+        raise ValueError('Invalid cursor')
+    try:
+        datetime.fromisoformat(parts[2])
+    except ValueError:
+        raise ValueError('Invalid cursor')
+    return parts[2], int(parts[1])
+
+def catalog_etag(version, *parts):
+    """Strong ETag for a representation derived from a catalog version."""
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+    return f'{version}-{digest}'
+
+def not_modified(etag):
+    """Return a 304 response if the client's If-None-Match already has this ETag."""
+    if request.if_none_match.contains(etag):
+        return with_etag(Response(status=304), etag)
+    return None
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def requested_fields():
+    fields = request.args.get('fields', '')
+    return [field.strip() for field in fields.split(',') if field.strip()] or None
+
 @api_bp.route('/late_fee/<patron_id>/<int:book_id>')
 def get_late_fee(patron_id, book_id):
     """
@@ -25,16 +114,290 @@ def search_books_api():
     """
     search_term = request.args.get('q', '').strip()
     search_type = request.args.get('type', 'title')
+    match = request.args.get('match', 'contains')
+    limit = request.args.get('limit', DEFAULT_SEARCH_LIMIT, type=int)
+    offset = request.args.get('offset', 0, type=int)
     
     if not search_term:
         return jsonify({'error': 'Search term is required'}), 400
     
+    if match not in ('contains', 'prefix'):
+        return jsonify({'error': 'match must be "contains" or "prefix"'}), 400
+    
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+    offset = max(0, offset)
+    
     # Use business logic function
-    books = search_books_in_catalog(search_term, search_type)
+    books = search_books_in_catalog(search_term, search_type, limit=limit, offset=offset, match=match)
     
     return jsonify({
         'search_term': search_term,
         'search_type': search_type,
+        'match': match,
+        'limit': limit,
+        'offset': offset,
         'results': books,
         'count': len(books)
     })
+
+@api_bp.route('/books')
+def list_books_api():
+    """
+    List the catalog as JSON, in id order, with cursor pagination.
+    
+    Query parameters:
+        cursor: value of next_cursor from the previous page
+        limit: page size (default 100, max 1000)
+        fields: comma-separated columns to return, e.g. fields=id,available_copies
+    
+    Responses carry a strong ETag derived from the catalog version counter;
+    a matching If-None-Match gets a 304 without reading the books table.
+    """
+    limit = max(1, min(request.args.get('limit', DEFAULT_BOOKS_LIMIT, type=int), MAX_BOOKS_LIMIT))
+    cursor = request.args.get('cursor', '')
+    fields = requested_fields()
+    
+    try:
+        after_id = decode_cursor(cursor) if cursor else 0
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = not_modified(catalog_etag(get_catalog_version(), cursor, limit, fields))
+    if response is not None:
+        return response
+    
+    try:
+        books, has_more, version = get_books_after_id(after_id, limit, fields)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = jsonify({
+        'books': books,
+        'count': len(books),
+        'next_cursor': encode_cursor(books[-1]['id']) if has_more else None,
+        'catalog_version': version
+    })
+    return with_etag(response, catalog_etag(version, cursor, limit, fields))
+
+@api_bp.route('/books/<int:book_id>')
+def get_book_api(book_id):
+    """
+    Get one book as JSON, with optional fields= projection and ETag support.
+    """
+    fields = requested_fields()
+    
+    response = not_modified(catalog_etag(get_catalog_version(), book_id, fields))
+    if response is not None:
+        return response
+    
+    try:
+        book, version = get_book_fields(book_id, fields)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if book is None:
+        return jsonify({'error': 'Book not found'}), 404
+    
+    return with_etag(jsonify(book), catalog_etag(version, book_id, fields))
+
+@api_bp.route('/books/bulk', methods=['POST'])
+def bulk_import_api():
+    """
+    Bulk import books from an uploaded CSV, JSON Lines or MARC 21 file.
+    
+    Send the file as multipart field 'file' or as the raw request body.
+    The format comes from ?format=, else the file extension, else the
+    Content-Type. Optional ?copies= sets copies for rows that do not say.
+    
+    Returns the import summary with per-row errors and throughput.
+    """
+    fmt = request.args.get('format')
+    upload = request.files.get('file')
+    if upload is not None:
+        stream = upload.stream
+        fmt = fmt or detect_format(upload.filename)
+    else:
+        stream = request.stream
+        fmt = fmt or IMPORT_CONTENT_TYPES.get(request.mimetype)
+    
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({'error': f"Unsupported import format. Use one of: {', '.join(IMPORT_FORMATS)}."}), 400
+    
+    copies = request.args.get('copies', 1, type=int)
+    if copies <= 0:
+        return jsonify({'error': 'copies must be a positive integer'}), 400
+    
+    return jsonify(import_books(stream, fmt, default_copies=copies))
+
+@api_bp.route('/export/<table>')
+def export_api(table):
+    """
+    Stream a whole table as a CSV or JSON Lines download.
+    
+    Query parameters:
+        format: 'csv' (default) or 'jsonl'
+        gzip: 1 to gzip-compress the download
+    
+    Rows are read and written one batch at a time, so memory use on the
+    server stays flat however large the table is.
+    """
+    fmt = request.args.get('format', 'csv')
+    compress = request.args.get('gzip', '0').lower() in ('1', 'true', 'yes')
+    
+    if table not in EXPORT_TABLES:
+        return jsonify({'error': 'Unknown table'}), 404
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    
+    response = Response(stream_with_context(export_table(table, fmt, compress)),
+                        mimetype='application/gzip' if compress else CONTENT_TYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{export_filename(table, fmt, compress)}"'
+    return response
+
+def batch_book_ids():
+    """book_ids from a JSON body like {"book_ids": [1, 2, 3]}, or None."""
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('book_ids'), list):
+        return None
+    return body['book_ids']
+
+@api_bp.route('/patrons/<patron_id>/borrow', methods=['POST'])
+def batch_borrow_api(patron_id):
+    """
+    Borrow a stack of books in one transaction.
+    Body: {"book_ids": [...]}; the response lists a result per book.
+    """
+    book_ids = batch_book_ids()
+    if book_ids is None:
+        return jsonify({'error': 'Request body must be JSON like {"book_ids": [1, 2]}'}), 400
+    
+    success, message, results = borrow_books_by_patron(patron_id, book_ids)
+    if not results:
+        return jsonify({'success': False, 'message': message}), 400
+    return jsonify({'success': success, 'message': message, 'results': results})
+
+@api_bp.route('/patrons/<patron_id>/return', methods=['POST'])
+def batch_return_api(patron_id):
+    """
+    Return a stack of books in one transaction.
+    Body: {"book_ids": [...]}; the response lists a result and late fee per book.
+    """
+    book_ids = batch_book_ids()
+    if book_ids is None:
+        return jsonify({'error': 'Request body must be JSON like {"book_ids": [1, 2]}'}), 400
+    
+    success, message, results = return_books_by_patron(patron_id, book_ids)
+    if not results:
+        return jsonify({'success': False, 'message': message}), 400
+    return jsonify({
+        'success': success,
+        'message': message,
+        'results': results,
+        'total_late_fees': round(sum(result['fee_amount'] for result in results), 2)
+    })
+
+@api_bp.route('/patrons/<patron_id>/history')
+def patron_history_api(patron_id):
+    """
+    One page of a patron's returned loans, newest first.
+    
+    Query parameters:
+        cursor: value of next_cursor from the previous page
+        limit: page size (default 20, max 100)
+    """
+    limit = max(1, min(request.args.get('limit', DEFAULT_HISTORY_LIMIT, type=int), MAX_HISTORY_LIMIT))
+    cursor = request.args.get('cursor', '')
+    
+    try:
+        before = decode_history_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    result = get_patron_history(patron_id, before, limit)
+    if 'error' in result:
+        return jsonify({'error': result['error']}), 400
+    
+    history = [dict(loan, borrow_date=loan['borrow_date'].isoformat(),
+                    due_date=loan['due_date'].isoformat(),
+                    return_date=loan['return_date'].isoformat())
+               for loan in result['history']]
+    return jsonify({
+        'patron_id': patron_id,
+        'history': history,
+        'count': len(history),
+        'next_cursor': encode_history_cursor(result['next_cursor']) if result['next_cursor'] else None
+    })
+
+def idempotency_key():
+    """The request's Idempotency-Key header, or None."""
+    return request.headers.get('Idempotency-Key', '').strip() or None
+
+def queued_job_response(success, message, job_id):
+    """202 with a status URL to poll, or 400 if nothing was queued."""
+    if not success:
+        return jsonify({'success': False, 'message': message}), 400
+    status_url = url_for('api.payment_job_api', job_id=job_id)
+    response = jsonify({'success': True, 'message': message, 'job_id': job_id,
+                        'status': 'queued', 'status_url': status_url})
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
+@api_bp.route('/payments/late_fee/<patron_id>/<int:book_id>', methods=['POST'])
+def pay_late_fee_api(patron_id, book_id):
+    """
+    Queue payment of a book's late fee.
+    Returns 202 with a job id at once; poll status_url for the result.
+    A retry with the same Idempotency-Key header returns the same job.
+    """
+    return queued_job_response(*enqueue_late_fee_payment(patron_id, book_id, idempotency_key()))
+
+@api_bp.route('/payments/refund', methods=['POST'])
+def refund_late_fee_api():
+    """
+    Queue a late fee refund.
+    Body: {"transaction_id": "txn_...", "amount": 5.0}
+    """
+    body = request.get_json(silent=True)
+    amount = body.get('amount') if isinstance(body, dict) else None
+    if not isinstance(amount, (int, float)) or isinstance(amount, bool):
+        return jsonify({'error': 'Request body must be JSON like {"transaction_id": "txn_...", "amount": 5.0}'}), 400
+    
+    return queued_job_response(*enqueue_late_fee_refund(str(body.get('transaction_id') or ''), amount,
+                                                         idempotency_key()))
+
+@api_bp.route('/payments/jobs/<int:job_id>')
+def payment_job_api(job_id):
+    """Status of a queued payment: queued, processing, succeeded or failed."""
+    job = get_payment_job_status(job_id)
+    if 'error' in job:
+        return jsonify(job), 404
+    return jsonify(job)
+
+@api_bp.route('/patrons/<patron_id>/payments')
+def patron_payments_api(patron_id):
+    """
+    One page of a patron's payments ledger (charges and refunds), newest first.
+    
+    Query parameters:
+        cursor: value of next_cursor from the previous page
+        limit: page size (default 20, max 100)
+    """
+    limit = max(1, min(request.args.get('limit', DEFAULT_HISTORY_LIMIT, type=int), MAX_HISTORY_LIMIT))
+    cursor = request.args.get('cursor', '')
+    
+    try:
+        before = decode_history_cursor(cursor, 'payment') if cursor else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    result = get_patron_payment_history(patron_id, before, limit)
+    if 'error' in result:
+        return jsonify({'error': result['error']}), 400
+    
+    return jsonify({
+        'patron_id': patron_id,
+        'payments': result['payments'],
+        'count': len(result['payments']),
+        'next_cursor': encode_history_cursor(result['next_cursor'], 'payment') if result['next_cursor'] else None
+    })
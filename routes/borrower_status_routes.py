@@ -2,9 +2,10 @@
 Borrower Status Routes
 """
 
-from flask import Blueprint, render_template, request
+from flask import Blueprint, render_template, request, url_for
 #from library_service import get_patron_status_report
 from services.library_service import get_patron_status_report
+from routes.api_routes import encode_history_cursor
 from jinja2 import TemplateNotFound, TemplateSyntaxError  # 添加这行导入
 
 # 创建蓝图并设置模板文件夹路径
@@ -43,8 +44,14 @@ def borrower_status():
         # 调用library_service获取借阅者状态
 		try:
 			status_report = get_patron_status_report(patron_id)
+			# Older history pages are fetched lazily from the JSON API
+			history_url = None
+			if status_report.get('history_cursor'):
+				history_url = url_for('api.patron_history_api', patron_id=patron_id,
+				                      cursor=encode_history_cursor(status_report['history_cursor']))
 			return render_template('borrower_status.html', 
                                  status_report=status_report, 
+                                 history_url=history_url,
                                  patron_id=patron_id)
 		except Exception as e:
 			return render_template('borrower_status.html', 
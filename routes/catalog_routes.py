@@ -2,13 +2,20 @@
 Catalog Routes - Book catalog related endpoints
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash
-from database import get_all_books
+from itertools import chain
+
+from flask import (Blueprint, Response, current_app, render_template, request, redirect,
+                   stream_template, url_for, flash)
+from database import get_books_page, iter_books
 #from library_service import add_book_to_catalog
 from services.library_service import add_book_to_catalog
 
 catalog_bp = Blueprint('catalog', __name__)
 
+# Catalog paging
+CATALOG_PAGE_SIZE = 50
+MAX_CATALOG_PAGE_SIZE = 200
+
 @catalog_bp.route('/')
 def index():
     """Home page redirects to catalog."""
@@ -17,11 +24,56 @@ def index():
 @catalog_bp.route('/catalog')
 def catalog():
     """
-    Display all books in the catalog.
+    Display the books in the catalog, one keyset-paginated page at a time.
     Implements R2: Book Catalog Display
+    
+    Query parameters:
+        after_title, after_id: cursor of the last book on the previous page (next page)
+        before_title, before_id: cursor of the first book on the current page (previous page)
+        limit: page size (default 50, max 200)
+        stream=1: stream the whole catalog instead (also enabled by the
+                  CATALOG_STREAMING app config flag)
+    """
+    if request.args.get('stream') == '1' or current_app.config.get('CATALOG_STREAMING'):
+        return stream_catalog()
+    
+    limit = request.args.get('limit', CATALOG_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_CATALOG_PAGE_SIZE))
+    after_id = request.args.get('after_id', type=int)
+    before_id = request.args.get('before_id', type=int)
+    
+    if before_id is not None:
+        books, has_prev = get_books_page(before=(request.args.get('before_title', ''), before_id), limit=limit)
+        has_next = True
+    elif after_id is not None:
+        books, has_next = get_books_page(after=(request.args.get('after_title', ''), after_id), limit=limit)
+        has_prev = True
+    else:
+        books, has_next = get_books_page(limit=limit)
+        has_prev = False
+    
+    next_url = prev_url = None
+    if books and has_next:
+        next_url = url_for('catalog.catalog', after_title=books[-1]['title'], after_id=books[-1]['id'], limit=limit)
+    if books and has_prev:
+        prev_url = url_for('catalog.catalog', before_title=books[0]['title'], before_id=books[0]['id'], limit=limit)
+    
+    return render_template('catalog.html', books=books, next_url=next_url, prev_url=prev_url)
+
+def stream_catalog():
+    """
+    Stream the full catalog page while rows are read from the database.
+    
+    The template is rendered with Jinja's generate() (via Flask's
+    stream_template, which wraps it in stream_with_context), so the first
+    bytes go out before the catalog has been read and memory stays flat.
+    Note that flashed messages shown on a streamed page are not removed
+    from the session, so redirects that flash should target the paged view.
     """
-    books = get_all_books()
-    return render_template('catalog.html', books=books)
+    books = iter_books()
+    first = next(books, None)
+    books = chain([first], books) if first is not None else []
+    return Response(stream_template('catalog.html', books=books), mimetype='text/html')
 
 @catalog_bp.route('/add_book', methods=['GET', 'POST'])
 def add_book():
@@ -0,0 +1,18 @@
+"""
+Metrics Routes - Prometheus scrape endpoint
+"""
+
+from flask import Blueprint, Response, abort, current_app
+from metrics import CONTENT_TYPE, render_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """
+    Request, SQL, payment gateway, cache and pool metrics in the
+    Prometheus text format. 404 when LIBRARY_METRICS_ENABLED is off.
+    """
+    if 'library_metrics' not in current_app.extensions:
+        abort(404)
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
@@ -8,6 +8,9 @@ from services.library_service import search_books_in_catalog
 
 search_bp = Blueprint('search', __name__)
 
+# Maximum number of results rendered on one search page
+SEARCH_PAGE_SIZE = 100
+
 @search_bp.route('/search')
 def search_books():
     """
@@ -20,10 +23,13 @@ def search_books():
     if not search_term:
         return render_template('search.html', books=[], search_term='', search_type=search_type)
     
+    offset = max(0, request.args.get('offset', 0, type=int))
+    
     # Use business logic function
-    books = search_books_in_catalog(search_term, search_type)
+    books = search_books_in_catalog(search_term, search_type, limit=SEARCH_PAGE_SIZE, offset=offset)
     
     if not books:
         flash('Search functionality is not yet implemented.', 'error')
     
-    return render_template('search.html', books=books, search_term=search_term, search_type=search_type)
+    return render_template('search.html', books=books, search_term=search_term, search_type=search_type,
+                           offset=offset, page_size=SEARCH_PAGE_SIZE)
@@ -0,0 +1,316 @@
+"""
+Async Payment Service Module - asyncio client for the payment gateway
+Same interface as PaymentGateway with async methods, plus a batch
+process_payments() for fee collection runs. Requests are fanned out under a
+semaphore, sent over reused keep-alive connections and retried with jittered
+exponential backoff.
+
+With no base_url the client simulates the gateway offline, like
+PaymentGateway. Point it at benchmarks/fake_gateway.py (or a real gateway)
+to go over HTTP.
+"""
+import sys
+import os
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from metrics import observe_gateway_call
+from .payment_service import simulate_charge, simulate_refund, simulate_status
+
+# Requests in flight at once per client
+DEFAULT_MAX_CONCURRENCY = 20
+
+# Extra attempts after a connection error, timeout, 429 or 5xx
+DEFAULT_RETRIES = 3
+
+# Backoff before retry n is uniform(0, min(MAX_BACKOFF, BACKOFF * 2**n)) seconds
+DEFAULT_BACKOFF = 0.1
+DEFAULT_MAX_BACKOFF = 2.0
+
+# Seconds allowed for one request/response exchange
+DEFAULT_TIMEOUT = 10.0
+
+# Offline mode delays, matching PaymentGateway's time.sleep() calls
+SIMULATED_LATENCY = {'charge': 0.5, 'refund': 0.5, 'status': 0.3}
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# One charge in a batch: (patron_id, amount, description)
+Charge = Tuple[str, float, str]
+
+
+class PaymentGatewayError(Exception):
+    """The gateway could not be reached or kept failing after every retry."""
+
+
+class _ConnectionPool:
+    """Idle keep-alive connections to one host, reused across requests."""
+
+    def __init__(self, host: str, port: int, ssl: bool):
+        self.host = host
+        self.port = port
+        self.ssl = ssl
+        self.opened = 0
+        self._idle = []
+
+    async def acquire(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+            writer.close()
+        self.opened += 1
+        return await asyncio.open_connection(self.host, self.port, ssl=self.ssl or None)
+
+    def release(self, connection, reusable: bool):
+        if reusable:
+            self._idle.append(connection)
+        else:
+            connection[1].close()
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+        for _, writer in idle:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+
+class AsyncPaymentGateway:
+    """
+    asyncio payment gateway client.
+
+    Use one instance per event loop (its semaphore and connections belong to
+    the loop), ideally as `async with AsyncPaymentGateway(...) as gateway:`.
+    """
+
+    def __init__(self, api_key: str = "test_key_12345", base_url: Optional[str] = None,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, retries: int = DEFAULT_RETRIES,
+                 backoff: float = DEFAULT_BACKOFF, max_backoff: float = DEFAULT_MAX_BACKOFF,
+                 timeout: float = DEFAULT_TIMEOUT, latency: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            api_key: API key for authentication (default is test key)
+            base_url: Gateway URL, e.g. http://127.0.0.1:8765; None simulates offline
+            max_concurrency: Requests in flight at once
+            retries: Extra attempts for retryable failures
+            backoff: Base backoff delay in seconds
+            max_backoff: Cap on a single backoff delay
+            timeout: Seconds allowed per attempt
+            latency: Offline mode delays by 'charge', 'refund' and 'status'
+        """
+        self.api_key = api_key
+        self.base_url = base_url
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.latency = dict(SIMULATED_LATENCY, **(latency or {}))
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._stats = {'requests': 0, 'retries': 0, 'errors': 0}
+        self._pool = None
+        if base_url:
+            url = urlsplit(base_url)
+            self._host = url.hostname
+            self._prefix = url.path.rstrip('/')
+            self._pool = _ConnectionPool(url.hostname, url.port or (443 if url.scheme == 'https' else 80),
+                                         url.scheme == 'https')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        """Close idle connections."""
+        if self._pool is not None:
+            await self._pool.close()
+
+    def stats(self) -> Dict:
+        """Return request, retry, error and connection counters."""
+        stats = dict(self._stats)
+        stats['connections_opened'] = self._pool.opened if self._pool else 0
+        return stats
+
+    async def process_payment(self, patron_id: str, amount: float, description: str = "") -> Tuple[bool, str, str]:
+        """
+        Charge a patron.
+
+        Returns:
+            tuple: (success: bool, transaction_id: str, message: str)
+
+        Raises:
+            PaymentGatewayError: If the gateway stayed unreachable after all retries
+        """
+        if self._pool is None:
+            await self._simulate('charge')
+            return simulate_charge(patron_id, amount)
+
+        status, data = await self._call('charge', 'POST', '/charges', {
+            'customer_id': patron_id,
+            'amount': amount,
+            'currency': 'usd',
+            'description': description
+        })
+        if 200 <= status < 300:
+            return True, data['id'], data.get('message', '')
+        return False, "", data.get('error', f"HTTP {status}")
+
+    async def refund_payment(self, transaction_id: str, amount: float) -> Tuple[bool, str]:
+        """
+        Refund a previous payment.
+
+        Returns:
+            tuple: (success: bool, message: str)
+        """
+        if self._pool is None:
+            await self._simulate('refund')
+            return simulate_refund(transaction_id, amount)
+
+        status, data = await self._call('refund', 'POST', '/refunds',
+                                        {'transaction_id': transaction_id, 'amount': amount})
+        if 200 <= status < 300:
+            return True, data.get('message', '')
+        return False, data.get('error', f"HTTP {status}")
+
+    async def verify_payment_status(self, transaction_id: str) -> Dict:
+        """Check the status of a payment transaction."""
+        if self._pool is None:
+            await self._simulate('status')
+            return simulate_status(transaction_id)
+
+        status, data = await self._call('status', 'GET', f'/charges/{transaction_id}')
+        if status == 404:
+            return {"status": "not_found", "message": data.get('message', "Transaction not found")}
+        return data
+
+    async def process_payments(self, charges: Iterable[Charge]) -> List[Tuple[bool, str, str]]:
+        """
+        Charge many patrons concurrently (at most max_concurrency at a time).
+
+        Args:
+            charges: (patron_id, amount, description) tuples
+
+        Returns:
+            list: One (success, transaction_id, message) per charge, in order.
+                  A charge that could not reach the gateway fails with a
+                  "Payment processing error" message instead of raising.
+        """
+        async def charge(patron_id, amount, description=""):
+            try:
+                return await self.process_payment(patron_id, amount, description)
+            except Exception as e:
+                return False, "", f"Payment processing error: {str(e)}"
+
+        return list(await asyncio.gather(*(charge(*item) for item in charges)))
+
+    async def _simulate(self, kind: str):
+        async with self._semaphore:
+            self._stats['requests'] += 1
+            await asyncio.sleep(self.latency[kind])
+
+    def _backoff_delay(self, attempt: int) -> float:
+        # "Full jitter": spreads retries out so failed requests do not return in lockstep
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def _call(self, operation: str, method: str, path: str,
+                    payload: Optional[Dict] = None) -> Tuple[int, Dict]:
+        """Send a request, retrying transient failures. Returns (status, JSON body)."""
+        started = time.perf_counter()
+        try:
+            status, data = await self._send(method, path, payload)
+        except PaymentGatewayError:
+            observe_gateway_call(operation, time.perf_counter() - started, 'error')
+            raise
+        observe_gateway_call(operation, time.perf_counter() - started,
+                             'success' if 200 <= status < 300 else 'declined')
+        return status, data
+
+    async def _send(self, method: str, path: str, payload: Optional[Dict]) -> Tuple[int, Dict]:
+        # Every attempt carries the same key, so a retried charge the
+        # gateway already processed is not charged again
+        headers = {'Idempotency-Key': uuid.uuid4().hex} if method == 'POST' else {}
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._stats['retries'] += 1
+                await asyncio.sleep(self._backoff_delay(attempt - 1))
+            async with self._semaphore:
+                self._stats['requests'] += 1
+                try:
+                    status, data = await asyncio.wait_for(self._request(method, path, payload, headers),
+                                                          self.timeout)
+                except (OSError, asyncio.TimeoutError, EOFError, ValueError) as e:
+                    # OSError covers refused/reset connections, asyncio.TimeoutError a
+                    # slow or hung gateway (only an OSError alias from Python 3.11);
+                    # EOFError and ValueError a truncated or garbled response
+                    error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+                    continue
+            if status not in RETRY_STATUSES:
+                return status, data
+            error = f"HTTP {status}"
+
+        self._stats['errors'] += 1
+        raise PaymentGatewayError(f"Gateway request failed after {self.retries + 1} attempts ({error})")
+
+    async def _request(self, method: str, path: str, payload: Optional[Dict],
+                       headers: Dict[str, str]) -> Tuple[int, Dict]:
+        body = json.dumps(payload).encode() if payload is not None else b''
+        lines = [f"{method} {self._prefix}{path} HTTP/1.1", f"Host: {self._host}",
+                 f"Authorization: Bearer {self.api_key}", "Content-Type: application/json",
+                 f"Content-Length: {len(body)}", "Connection: keep-alive"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        request = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+        reader, writer = await self._pool.acquire()
+        reusable = False
+        try:
+            writer.write(request)
+            await writer.drain()
+            status_line = (await reader.readline()).split()
+            if len(status_line) < 2 or not status_line[1].isdigit():
+                raise ValueError("Invalid HTTP response")
+            status = int(status_line[1])
+            response_headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                response_headers[name.strip().lower()] = value.strip()
+            data = await reader.readexactly(int(response_headers.get('content-length', 0)))
+            reusable = response_headers.get('connection', '').lower() != 'close'
+        finally:
+            self._pool.release((reader, writer), reusable)
+        return status, json.loads(data) if data else {}
+
+
+def process_payments_batch(charges: Iterable[Charge], **options) -> Tuple[List[Tuple[bool, str, str]], Dict]:
+    """
+    Run AsyncPaymentGateway.process_payments() from synchronous code.
+
+    Args:
+        charges: (patron_id, amount, description) tuples
+        options: AsyncPaymentGateway keyword arguments
+
+    Returns:
+        tuple: (results in charge order, gateway stats)
+    """
+    async def run():
+        async with AsyncPaymentGateway(**options) as gateway:
+            return await gateway.process_payments(charges), gateway.stats()
+
+    return asyncio.run(run())
@@ -0,0 +1,125 @@
+"""
+Export Service Module - Streaming table exports
+Writes books, borrow_records and patrons as CSV or JSON Lines, optionally
+gzip-compressed, one keyset batch at a time so memory use does not grow
+with the table
+
+Usage:
+    python -m services.export_service books [--format csv|jsonl] [--gzip] [-o FILE] [--db PATH]
+"""
+import sys
+import os
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import csv
+import io
+import json
+import zlib
+from typing import Iterator
+
+from database import EXPORT_TABLES, iter_table_rows
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+# Rows fetched from SQLite (and encoded) per chunk
+EXPORT_BATCH_SIZE = 1000
+
+CONTENT_TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+
+def _csv_chunks(table: str, batch_size: int) -> Iterator[str]:
+    columns, _ = EXPORT_TABLES[table]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in iter_table_rows(table, batch_size):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _jsonl_chunks(table: str, batch_size: int) -> Iterator[str]:
+    columns, _ = EXPORT_TABLES[table]
+    for rows in iter_table_rows(table, batch_size):
+        yield ''.join(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n' for row in rows)
+
+
+def export_table(table: str, fmt: str = 'csv', compress: bool = False,
+                 batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """
+    Stream a table as encoded CSV or JSON Lines chunks.
+
+    Nothing runs until the first chunk is requested; each chunk covers one
+    batch of rows, so memory use is bounded by `batch_size`.
+
+    Args:
+        table: Name in database.EXPORT_TABLES
+        fmt: 'csv' or 'jsonl'
+        compress: Wrap the output in a gzip stream
+        batch_size: Rows per chunk
+
+    Returns:
+        iterator: UTF-8 (or gzip) byte chunks
+
+    Raises:
+        ValueError: If the table or format is not supported
+    """
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown table. Use one of: {', '.join(EXPORT_TABLES)}.")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format. Use one of: {', '.join(EXPORT_FORMATS)}.")
+
+    chunks = (_csv_chunks if fmt == 'csv' else _jsonl_chunks)(table, batch_size)
+    if not compress:
+        return (chunk.encode('utf-8') for chunk in chunks)
+    return _gzip(chunk.encode('utf-8') for chunk in chunks)
+
+
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    # wbits=31 makes zlib write a gzip header and trailer
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_filename(table: str, fmt: str, compress: bool) -> str:
+    return f"{table}.{fmt}{'.gz' if compress else ''}"
+
+
+def main():
+    import database
+    from config import load_storage_config
+
+    parser = argparse.ArgumentParser(description='Export a table as CSV or JSON Lines.')
+    parser.add_argument('table', choices=list(EXPORT_TABLES))
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+    parser.add_argument('--gzip', action='store_true', help='gzip-compress the output')
+    parser.add_argument('-o', '--output', help='Output file (default: <table>.<format>[.gz])')
+    parser.add_argument('--batch-size', type=int, default=EXPORT_BATCH_SIZE)
+    parser.add_argument('--db', help='Database path (default: LIBRARY_DB_PATH or library.db)')
+    args = parser.parse_args()
+
+    database.configure_database(load_storage_config({'LIBRARY_DB_PATH': args.db} if args.db else None))
+    output = args.output or export_filename(args.table, args.format, args.gzip)
+    written = 0
+    try:
+        with open(output, 'wb') as f:
+            for chunk in export_table(args.table, args.format, args.gzip, args.batch_size):
+                f.write(chunk)
+                written += len(chunk)
+    finally:
+        database.close_pool()
+    print(f"Wrote {written} bytes to {output}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+"""
+Import Service Module - Bulk catalog import
+Streams books from CSV, JSON Lines or MARC 21 files, validates every row with
+the R1 rules and inserts them in large batched transactions
+
+Usage:
+    python -m services.import_service books.csv [--format csv|jsonl|marc] [--batch-size N] [--db PATH]
+"""
+import sys
+import os
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import csv
+import io
+import json
+import time
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from database import insert_books_batch
+from services.library_service import validate_book
+
+IMPORT_FORMATS = ('csv', 'jsonl', 'marc')
+
+# Rows inserted per transaction
+IMPORT_BATCH_SIZE = 5000
+
+# Per-row errors kept in the result; the total is always counted
+MAX_REPORTED_ERRORS = 1000
+
+# Copies given to rows that do not say (MARC records never do)
+DEFAULT_COPIES = 1
+
+_EXTENSIONS = {
+    '.csv': 'csv',
+    '.jsonl': 'jsonl', '.ndjson': 'jsonl',
+    '.mrc': 'marc', '.marc': 'marc',
+}
+
+# A reader yields (row number, book fields or None, parse error or None)
+Row = Tuple[int, Optional[Dict], Optional[str]]
+
+
+def detect_format(filename: Optional[str]) -> Optional[str]:
+    """Guess the import format from a file name's extension."""
+    if not filename:
+        return None
+    return _EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+
+
+def _normalize_isbn(isbn) -> str:
+    """Drop hyphens and spaces, which catalogs often include."""
+    return str(isbn or '').replace('-', '').replace(' ', '').strip()
+
+
+def _copies(value, default_copies: int):
+    """Convert a copies column to int; anything else is left for validate_book() to reject."""
+    if value is None or value == '':
+        return default_copies
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value.strip())
+    return value
+
+
+def read_csv(stream: BinaryIO, default_copies: int = DEFAULT_COPIES) -> Iterator[Row]:
+    """Rows from a CSV file with a title,author,isbn[,total_copies] header."""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    for row_number, row in enumerate(reader, start=1):
+        copies = row.get('total_copies', row.get('copies'))
+        yield row_number, {
+            'title': row.get('title') or '',
+            'author': row.get('author') or '',
+            'isbn': _normalize_isbn(row.get('isbn')),
+            'total_copies': _copies(copies, default_copies),
+        }, None
+
+
+def read_jsonl(stream: BinaryIO, default_copies: int = DEFAULT_COPIES) -> Iterator[Row]:
+    """Rows from a JSON Lines file, one {"title", "author", "isbn", "total_copies"} object per line."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    for row_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield row_number, None, "Each line must be a JSON object."
+            continue
+        copies = row.get('total_copies', row.get('copies'))
+        yield row_number, {
+            'title': str(row.get('title') or ''),
+            'author': str(row.get('author') or ''),
+            'isbn': _normalize_isbn(row.get('isbn')),
+            'total_copies': _copies(copies, default_copies),
+        }, None
+
+
+def _marc_fields(record: bytes) -> Dict[str, List]:
+    """Split an ISO 2709 record into {tag: [data, ...]}; data fields become {code: [values]}."""
+    encoding = 'utf-8' if record[9:10] == b'a' else 'latin-1'
+    base = int(record[12:17])
+    directory = record[24:base - 1]
+    fields = {}
+    for i in range(0, len(directory) - 11, 12):
+        tag = directory[i:i + 3].decode('ascii')
+        length = int(directory[i + 3:i + 7])
+        start = base + int(directory[i + 7:i + 12])
+        data = record[start:start + length].rstrip(b'\x1e').decode(encoding, errors='replace')
+        if tag < '010':
+            fields.setdefault(tag, []).append(data)
+            continue
+        subfields = {}
+        for chunk in data.split('\x1f')[1:]:
+            if chunk:
+                subfields.setdefault(chunk[0], []).append(chunk[1:])
+        fields.setdefault(tag, []).append(subfields)
+    return fields
+
+
+def _first_subfield(fields: Dict[str, List], tags: Tuple[str, ...], code: str = 'a') -> str:
+    for tag in tags:
+        for subfields in fields.get(tag, []):
+            if subfields.get(code):
+                return subfields[code][0]
+    return ''
+
+
+def read_marc(stream: BinaryIO, default_copies: int = DEFAULT_COPIES) -> Iterator[Row]:
+    """
+    Rows from binary MARC 21 (ISO 2709) records.
+
+    Uses 245 $a $b for the title, 100/110/700 $a for the author and the first
+    020 $a for the ISBN. MARC bibliographic records carry no copy counts, so
+    every book gets `default_copies`.
+    """
+    row_number = 0
+    while True:
+        leader = stream.read(24)
+        if not leader.strip():
+            return
+        row_number += 1
+        if (len(leader) < 24 or not leader[:5].isdigit() or not leader[12:17].isdigit()
+                or int(leader[:5]) < 24):
+            # Without a valid record length there is no way to find the next record
+            yield row_number, None, "Invalid MARC leader; import stopped."
+            return
+        record = leader + stream.read(int(leader[:5]) - 24)
+        try:
+            fields = _marc_fields(record)
+        except (ValueError, UnicodeDecodeError) as e:
+            yield row_number, None, f"Invalid MARC record: {e}"
+            continue
+        title = _first_subfield(fields, ('245',)).strip(' /:;,.')
+        subtitle = _first_subfield(fields, ('245',), 'b').strip(' /:;,.')
+        isbn = _first_subfield(fields, ('020',)).split(' ')[0]
+        yield row_number, {
+            'title': f"{title}: {subtitle}" if subtitle else title,
+            'author': _first_subfield(fields, ('100', '110', '700')).strip(' ,.'),
+            'isbn': _normalize_isbn(isbn),
+            'total_copies': default_copies,
+        }, None
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl, 'marc': read_marc}
+
+
+def import_books(stream: BinaryIO, fmt: str, batch_size: int = IMPORT_BATCH_SIZE,
+                 default_copies: int = DEFAULT_COPIES, max_errors: int = MAX_REPORTED_ERRORS) -> Dict:
+    """
+    Import books from a binary stream.
+
+    Every row is checked with the R1 rules (validate_book); rows repeating
+    an ISBN seen earlier in the file or already in the catalog are rejected.
+    Valid rows are inserted `batch_size` at a time, one transaction each.
+
+    Args:
+        stream: Binary file-like object
+        fmt: 'csv', 'jsonl' or 'marc'
+        batch_size: Rows per insert transaction
+        default_copies: Copies for rows without a total_copies value
+        max_errors: Per-row errors to include in the result
+
+    Returns:
+        dict: rows, inserted, failed, errors (row, isbn, error),
+        elapsed_seconds and rows_per_second
+    """
+    if fmt not in READERS:
+        return {'error': f"Unsupported import format. Use one of: {', '.join(IMPORT_FORMATS)}."}
+
+    start = time.perf_counter()
+    result = {'format': fmt, 'rows': 0, 'inserted': 0, 'failed': 0, 'errors': []}
+    seen = set()
+    batch = []
+
+    def fail(row_number, isbn, error):
+        result['failed'] += 1
+        if len(result['errors']) < max_errors:
+            result['errors'].append({'row': row_number, 'isbn': isbn, 'error': error})
+
+    def flush():
+        try:
+            inserted, existing = insert_books_batch([book for _, book in batch])
+        except Exception:
+            for row_number, book in batch:
+                fail(row_number, book[2], "Database error occurred while adding the book.")
+        else:
+            result['inserted'] += inserted
+            for row_number, book in batch:
+                if book[2] in existing:
+                    fail(row_number, book[2], "A book with this ISBN already exists.")
+        batch.clear()
+
+    for row_number, book, error in READERS[fmt](stream, default_copies):
+        result['rows'] += 1
+        isbn = book['isbn'] if book else None
+        if error is None:
+            error = validate_book(book['title'], book['author'], isbn, book['total_copies'])
+        if error is None and isbn in seen:
+            error = "Duplicate ISBN in import file."
+        if error:
+            fail(row_number, isbn, error)
+            continue
+
+        seen.add(isbn)
+        batch.append((row_number, (book['title'].strip(), book['author'].strip(), isbn, book['total_copies'])))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    elapsed = time.perf_counter() - start
+    result['elapsed_seconds'] = round(elapsed, 3)
+    result['rows_per_second'] = round(result['rows'] / elapsed) if elapsed > 0 else 0
+    return result
+
+
+def main():
+    import database
+    from config import load_storage_config
+
+    parser = argparse.ArgumentParser(description='Bulk import books into the catalog.')
+    parser.add_argument('path', help='CSV, JSON Lines or MARC 21 file')
+    parser.add_argument('--format', choices=IMPORT_FORMATS, help='Input format (default: from the file extension)')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument('--copies', type=int, default=DEFAULT_COPIES, help='Copies for rows that do not say')
+    parser.add_argument('--db', help='Database path (default: LIBRARY_DB_PATH or library.db)')
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.path)
+    if fmt is None:
+        parser.error('cannot tell the format from the file name; pass --format')
+
+    database.configure_database(load_storage_config({'LIBRARY_DB_PATH': args.db} if args.db else None))
+    database.init_database()
+    try:
+        with open(args.path, 'rb') as stream:
+            result = import_books(stream, fmt, args.batch_size, args.copies)
+    finally:
+        database.close_pool()
+
+    for error in result['errors']:
+        print(f"row {error['row']}: {error['error']} (ISBN {error['isbn']})")
+    print(f"Imported {result['inserted']} of {result['rows']} rows, {result['failed']} failed, "
+          f"in {result['elapsed_seconds']:.1f}s ({result['rows_per_second']} rows/s).")
+
+
+if __name__ == '__main__':
+    main()
@@ -9,48 +9,71 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 
+import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from database import (
     get_book_by_id, get_book_by_isbn, get_patron_borrow_count,
     insert_book, insert_borrow_record, update_book_availability,
-    update_borrow_record_return_date, get_all_books, get_patron_borrowed_books, get_db_connection
+    update_borrow_record_return_date, get_all_books, get_patron_borrowed_books,
+    get_patron_history_page, get_patron_loans_and_summary, iter_overdue_loans,
+    reconcile_patron_counters_batch,
+    borrow_book_transaction, return_book_transaction, search_books, search_books_fulltext,
+    borrow_books_transaction, return_books_transaction,
+    insert_payment_job, get_payment_job, get_payment_job_by_key,
+    insert_payment, complete_payment, get_payment_by_key, get_charge_by_transaction,
+    get_patron_payments_page
 )
 
+from metrics import observe_gateway_call
 from .payment_service import PaymentGateway
+from .payment_jobs import get_payment_queue
 
-def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
+def validate_book(title: str, author: str, isbn: str, total_copies: int) -> Optional[str]:
     """
-    Add a new book to the catalog.
-    Implements R1: Book Catalog Management
+    Apply the R1 field rules to a new book.
     
-    Args:
-        title: Book title (max 200 chars)
-        author: Book author (max 100 chars)
-        isbn: 13-digit ISBN
-        total_copies: Number of copies (positive integer)
-        
     Returns:
-        tuple: (success: bool, message: str)
+        str: The first validation error message, or None if the book is valid
     """
-    # Input validation
     if not title or not title.strip():
-        return False, "Title is required."
+        return "Title is required."
     
     if len(title.strip()) > 200:
-        return False, "Title must be less than 200 characters."
+        return "Title must be less than 200 characters."
     
     if not author or not author.strip():
-        return False, "Author is required."
+        return "Author is required."
     
     if len(author.strip()) > 100:
-        return False, "Author must be less than 100 characters."
+        return "Author must be less than 100 characters."
     
     if len(isbn) != 13:
-        return False, "ISBN must be exactly 13 digits."
+        return "ISBN must be exactly 13 digits."
     
     if not isinstance(total_copies, int) or total_copies <= 0:
-        return False, "Total copies must be a positive integer."
+        return "Total copies must be a positive integer."
+    
+    return None
+
+def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
+    """
+    Add a new book to the catalog.
+    Implements R1: Book Catalog Management
+    
+    Args:
+        title: Book title (max 200 chars)
+        author: Book author (max 100 chars)
+        isbn: 13-digit ISBN
+        total_copies: Number of copies (positive integer)
+        
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    # Input validation
+    error = validate_book(title, author, isbn, total_copies)
+    if error:
+        return False, error
     
     # Check for duplicate ISBN
     existing = get_book_by_isbn(isbn)
@@ -96,34 +119,76 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be exactly 6 digits."
     
-    # Check if book exists and is available
-    book = get_book_by_id(book_id)
-    if not book:
+    # Create borrow record
+    borrow_date = datetime.now()
+    due_date = borrow_date + timedelta(days=14)
+    
+    # Check availability and the patron's limit, then insert the borrow record
+    # and update availability, all in one transaction
+    status, book = borrow_book_transaction(patron_id, book_id, borrow_date, due_date, borrow_limit=5)
+    return _borrow_result(status, book, due_date)
+
+def _borrow_result(status: str, book: Optional[Dict], due_date: datetime) -> Tuple[bool, str]:
+    """Map a borrow transaction status to the R3 (success, message) pair."""
+    if status == 'not_found':
         return False, "Book not found."
     
-    if book['available_copies'] <= 0:
+    if status == 'unavailable':
         return False, "This book is currently not available."
     
-    # Check patron's current borrowed books count
-    current_borrowed = get_patron_borrow_count(patron_id)
-    
-    if current_borrowed > 5:
+    if status == 'limit_reached':
         return False, "You have reached the maximum borrowing limit of 5 books."
     
-    # Create borrow record
+    if status != 'borrowed':
+        return False, "Database error occurred while creating borrow record."
+    
+    return True, f'Successfully borrowed "{book["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}.'
+
+# Books accepted in one batch borrow or return
+MAX_BATCH_BOOKS = 50
+
+def _validate_batch(patron_id: str, book_ids: List[int]) -> Optional[str]:
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return "Invalid patron ID. Must be exactly 6 digits."
+    if not book_ids:
+        return "At least one book is required."
+    if len(book_ids) > MAX_BATCH_BOOKS:
+        return f"At most {MAX_BATCH_BOOKS} books can be processed at once."
+    if not all(isinstance(book_id, int) and not isinstance(book_id, bool) for book_id in book_ids):
+        return "Book IDs must be integers."
+    return None
+
+def borrow_books_by_patron(patron_id: str, book_ids: List[int]) -> Tuple[bool, str, List[Dict]]:
+    """
+    Borrow a stack of books for one patron in a single transaction.
+    Applies the R3 rules to each book in order.
+    
+    Args:
+        patron_id: 6-digit library card ID
+        book_ids: IDs of the books to borrow
+        
+    Returns:
+        tuple: (all succeeded: bool, summary message: str,
+                per-book results [{'book_id', 'success', 'message'}, ...])
+    """
+    error = _validate_batch(patron_id, book_ids)
+    if error:
+        return False, error, []
+    
     borrow_date = datetime.now()
     due_date = borrow_date + timedelta(days=14)
     
-    # Insert borrow record and update availability
-    borrow_success = insert_borrow_record(patron_id, book_id, borrow_date, due_date)
-    if not borrow_success:
-        return False, "Database error occurred while creating borrow record."
+    status, items = borrow_books_transaction(patron_id, book_ids, borrow_date, due_date, borrow_limit=5)
+    if status != 'ok':
+        return False, "Database error occurred while creating borrow records.", []
     
-    availability_success = update_book_availability(book_id, -1)
-    if not availability_success:
-        return False, "Database error occurred while updating book availability."
+    results = []
+    for book_id, item_status, book in items:
+        success, message = _borrow_result(item_status, book, due_date)
+        results.append({'book_id': book_id, 'success': success, 'message': message})
     
-    return True, f'Successfully borrowed "{book["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}.'
+    borrowed = sum(result['success'] for result in results)
+    return borrowed == len(results), f"Borrowed {borrowed} of {len(results)} books.", results
 
 def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:  
     """
@@ -142,41 +207,217 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
         return False, "Invalid patron ID. Must be exactly 6 digits."
     
     try:
-        # Check if book exists
-        book = get_book_by_id(book_id)
-        if book is None:
-            return False, "Book not found."
-        
-        book_title = book.get('title', 'Unknown Book') if isinstance(book, dict) else 'Unknown Book'
-        
-        # Update borrow record with return date
+        # Close the borrow record and update availability in one transaction
         return_date = datetime.now()
-        update_result = update_borrow_record_return_date(patron_id, book_id, return_date)
+        status, loan = return_book_transaction(patron_id, book_id, return_date, late_fee=late_fee_amount)
         
-        if update_result is None or not update_result:
-            return False, "No active borrow record found for this book and patron."
+        success, message, _ = _return_result(status, loan, return_date)
+        return success, message
+            
+    except Exception as e:
+        return False, f"Error processing return: {str(e)}"
+
+def _return_result(status: str, loan: Optional[Dict], return_date: datetime) -> Tuple[bool, str, float]:
+    """Map a return transaction status to the R4 (success, message, fee) triple."""
+    if status == 'not_found':
+        return False, "Book not found.", 0.00
+    
+    if status == 'no_record':
+        return False, "No active borrow record found for this book and patron.", 0.00
+    
+    if status != 'returned':
+        return False, "Database error occurred while updating book availability.", 0.00
+    
+    book_title = loan.get('title') or 'Unknown Book'
+    
+    # Calculate late fees from the loan that was just closed
+    fee_amount, days_overdue = compute_late_fee(loan['due_date'], return_date)
+    
+    if fee_amount > 0:
+        return True, f'Book "{book_title}" returned successfully. Late fee: ${fee_amount:.2f} for {days_overdue} days overdue.', fee_amount
+    else:
+        return True, f'Book "{book_title}" returned successfully. No late fees.', fee_amount
+
+def return_books_by_patron(patron_id: str, book_ids: List[int]) -> Tuple[bool, str, List[Dict]]:
+    """
+    Return a stack of books for one patron in a single transaction.
+    Applies the R4 rules to each book; late fees for the batch are assessed together.
+    
+    Args:
+        patron_id: 6-digit library card ID
+        book_ids: IDs of the books to return
         
-        # Update book availability
-        availability_result = update_book_availability(book_id, 1)
+    Returns:
+        tuple: (all succeeded: bool, summary message: str,
+                per-book results [{'book_id', 'success', 'message', 'fee_amount'}, ...])
+    """
+    error = _validate_batch(patron_id, book_ids)
+    if error:
+        return False, error, []
+    
+    return_date = datetime.now()
+    status, items = return_books_transaction(patron_id, book_ids, return_date, late_fee=late_fee_amount)
+    if status != 'ok':
+        return False, "Database error occurred while updating book availability.", []
+    
+    results = []
+    for book_id, item_status, loan in items:
+        success, message, fee_amount = _return_result(item_status, loan, return_date)
+        results.append({'book_id': book_id, 'success': success, 'message': message, 'fee_amount': fee_amount})
+    
+    returned = sum(result['success'] for result in results)
+    total_fee = round(sum(result['fee_amount'] for result in results), 2)
+    message = f"Returned {returned} of {len(results)} books."
+    if total_fee > 0:
+        message += f" Total late fees: ${total_fee:.2f}."
+    return returned == len(results), message, results
+
+    
+
+def compute_late_fee(due_date: datetime, as_of: datetime) -> Tuple[float, int]:
+    """
+    Apply the R5 fee schedule to a single loan.
+    
+    Args:
+        due_date: When the book was due
+        as_of: Date the fee is assessed at (now, or the return date)
         
-        if availability_result is None or not availability_result:
-            return False, "Database error occurred while updating book availability."
+    Returns:
+        tuple: (fee_amount: float, days_overdue: int)
+    """
+    if as_of <= due_date:
+        return 0.00, 0
+    
+    # Calculate the number of overdue days
+    days_overdue = (as_of - due_date).days
+    
+    # Calculate the late fee (two-stage rate)
+    fee_amount = 0.00
+    
+    if days_overdue > 0:
+        # First week：$0.50/Day
+        first_week_days = min(days_overdue, 7)
+        fee_amount += first_week_days * 0.50
         
-        # Calculate late fees if applicable
-        late_fee_info = calculate_late_fee_for_book(patron_id, book_id)
+        # After first week：$1.00/Day
+        if days_overdue > 7:
+            additional_days = days_overdue - 7
+            fee_amount += additional_days * 1.00
         
-        fee_amount = late_fee_info.get('fee_amount', 0) if isinstance(late_fee_info, dict) else 0
-        days_overdue = late_fee_info.get('days_overdue', 0) if isinstance(late_fee_info, dict) else 0
+        # The upper limit of late fees：$15.00
+        fee_amount = min(fee_amount, 15.00)
+    
+    return round(fee_amount, 2), days_overdue
+
+def late_fee_amount(due_date: datetime, as_of: datetime) -> float:
+    """Fee part of compute_late_fee(), for callers that only need the amount."""
+    return compute_late_fee(due_date, as_of)[0]
+
+def _late_fee_table() -> List[float]:
+    """
+    Fee for 0, 1, 2, ... days overdue, up to the first day the cap is reached.
+    Any longer delay costs the last entry.
+    """
+    due_date = datetime(2000, 1, 1)
+    table = [0.00]
+    while True:
+        fee_amount, _ = compute_late_fee(due_date, due_date + timedelta(days=len(table)))
+        table.append(fee_amount)
+        if fee_amount == table[-2] and len(table) > 2:
+            return table[:-1]
+
+LATE_FEE_BY_DAYS = _late_fee_table()
+
+# Open loans fetched per chunk by calculate_late_fees_batch()
+LATE_FEE_BATCH_SIZE = 5000
+
+def calculate_late_fees_batch(as_of: Optional[datetime] = None,
+                              batch_size: int = LATE_FEE_BATCH_SIZE) -> Dict:
+    """
+    Calculate late fees for every overdue open loan in the library.
+    
+    Loans are streamed from one query in chunks; each chunk's fees are looked
+    up in LATE_FEE_BY_DAYS by days overdue and summed per patron, so memory
+    is bounded by the number of patrons rather than the number of loans.
+    
+    Args:
+        as_of: Date fees are assessed at (default: now)
+        batch_size: Loans fetched per chunk
         
-        if fee_amount > 0:
-            return False, f'Book "{book_title}" returned failed. Late fee: ${fee_amount:.2f} for {days_overdue} days overdue.'
-        else:
-            return True, f'Book "{book_title}" returned successfully. No late fees.'
-            
+    Returns:
+        dict: total_loans, total_fees and a per-patron map of
+        {'fee_amount', 'overdue_books', 'max_days_overdue'}, or 'error'
+    """
+    as_of = as_of or datetime.now()
+    last_day = len(LATE_FEE_BY_DAYS) - 1
+    patrons = {}
+    total_loans = 0
+    total_fees = 0.00
+    
+    try:
+        for chunk in iter_overdue_loans(as_of, batch_size):
+            days = [(as_of - datetime.fromisoformat(row[2])).days for row in chunk]
+            fees = [LATE_FEE_BY_DAYS[min(d, last_day)] for d in days]
+            for row, days_overdue, fee_amount in zip(chunk, days, fees):
+                patron = patrons.get(row[0])
+                if patron is None:
+                    patron = patrons[row[0]] = {'fee_amount': 0.00, 'overdue_books': 0, 'max_days_overdue': 0}
+                patron['fee_amount'] += fee_amount
+                patron['overdue_books'] += 1
+                if days_overdue > patron['max_days_overdue']:
+                    patron['max_days_overdue'] = days_overdue
+            total_loans += len(chunk)
+            total_fees += sum(fees)
     except Exception as e:
-        return False, f"Error processing return: {str(e)}"
+        return {'as_of': as_of, 'error': f'Error calculating late fees: {str(e)}'}
+    
+    for patron in patrons.values():
+        patron['fee_amount'] = round(patron['fee_amount'], 2)
+    
+    return {
+        'as_of': as_of,
+        'total_loans': total_loans,
+        'total_fees': round(total_fees, 2),
+        'patrons': patrons
+    }
 
+# Patrons checked per transaction by reconcile_patron_counters()
+RECONCILE_BATCH_SIZE = 500
+
+def reconcile_patron_counters(fix: bool = True, batch_size: int = RECONCILE_BATCH_SIZE,
+                              pause: float = 0.0) -> Dict:
+    """
+    Verify the patrons counters (active_loans, fees_assessed) against
+    borrow_records, one short transaction per batch of patrons.
     
+    Args:
+        fix: Overwrite counters that do not match
+        batch_size: Patrons per batch
+        pause: Seconds to sleep between batches to yield to other writers
+        
+    Returns:
+        dict: patrons_checked, batches, and the list of mismatches found
+    """
+    checked = 0
+    batches = 0
+    mismatches = []
+    after = ''
+    while True:
+        count, found, after = reconcile_patron_counters_batch(after, batch_size, late_fee_amount, fix)
+        if after is None:
+            break
+        checked += count
+        batches += 1
+        mismatches += found
+        if pause:
+            time.sleep(pause)
+    
+    return {
+        'patrons_checked': checked,
+        'batches': batches,
+        'mismatches': mismatches,
+        'fixed': len(mismatches) if fix else 0
+    }
 
 def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
     """
@@ -220,27 +461,11 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
                 'status': 'No late fees - not yet due'
             }
         
-        # Calculate the number of overdue days
-        days_overdue = (current_date - due_date).days
-        
-        # Calculate the late fee (two-stage rate)
-        fee_amount = 0.00
-        
-        if days_overdue > 0:
-            # First week：$0.50/Day
-            first_week_days = min(days_overdue, 7)
-            fee_amount += first_week_days * 0.50
-            
-            # After first week：$1.00/Day
-            if days_overdue > 7:
-                additional_days = days_overdue - 7
-                fee_amount += additional_days * 1.00
-            
-            # The upper limit of late fees：$15.00
-            fee_amount = min(fee_amount, 15.00)
+        # Calculate the number of overdue days and the late fee
+        fee_amount, days_overdue = compute_late_fee(due_date, current_date)
         
         return {
-            'fee_amount': round(fee_amount, 2),
+            'fee_amount': fee_amount,
             'days_overdue': days_overdue,
             'status': f'Current late fee: ${fee_amount:.2f} for {days_overdue} days overdue'
         }
@@ -252,14 +477,22 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
             'status': f'Error calculating late fee: {str(e)}'
         }
 
-def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
+def search_books_in_catalog(search_term: str, search_type: str, limit: Optional[int] = None,
+                            offset: int = 0, match: str = 'contains') -> List[Dict]:
     """
     Search for books in the catalog.
     Implements R6: Book Search Functionality
     
+    The filtering runs in SQLite (see database.search_books), so only the
+    matching rows are loaded.
+    
     Args:
         search_term: The term to search for
-        search_type: Type of search ('title', 'author', 'isbn')
+        search_type: Type of search ('title', 'author', 'isbn', or 'any'/'fulltext'
+                     for ranked full-text search over title and author)
+        limit: Maximum number of results (None = all matches, 20 for full-text)
+        offset: Number of matches to skip (for paging)
+        match: 'contains' (partial match) or 'prefix' for title/author
         
     Returns:
         list: List of matching book dictionaries
@@ -267,28 +500,40 @@ def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
     if not search_term or not search_term.strip():
         return []
     
-    search_term = search_term.strip().lower()
-    all_books = get_all_books()
-    results = []
+    if search_type in ('any', 'fulltext'):
+        return search_books_fulltext(search_term.strip(), limit=limit or 20, offset=offset)
     
-    for book in all_books:
-        if search_type == 'title' and search_term in book['title'].lower():
-            results.append(book)
-        elif search_type == 'author' and search_term in book['author'].lower():
-            results.append(book)
-        elif search_type == 'isbn' and search_term == book['isbn']:
-            results.append(book)
+    if search_type not in ('title', 'author', 'isbn'):
+        return []
     
-    return results
+    return search_books(search_term.strip(), search_type, match=match, limit=limit, offset=offset)
 
 
-def get_patron_status_report(patron_id: str) -> Dict:
+# Returned loans shown per history page in the status report
+HISTORY_PAGE_SIZE = 20
+
+def _format_history(loans: List[Dict]) -> List[Dict]:
+    for loan in loans:
+        loan['was_overdue'] = loan['return_date'] > loan['due_date']
+    return loans
+
+def _history_cursor(loans: List[Dict], has_more: bool) -> Optional[Tuple[str, int]]:
+    """Keyset (borrow_date, id) of the last loan on a page, or None on the last page."""
+    if not has_more or not loans:
+        return None
+    return loans[-1]['borrow_date'].isoformat(), loans[-1]['id']
+
+def get_patron_status_report(patron_id: str, history_limit: int = HISTORY_PAGE_SIZE) -> Dict:
     """
     Get status report for a patron.
     Implements R7: Patron Status Report
     
+    Only the first page of borrow history is included; older pages are
+    loaded with get_patron_history() using 'history_cursor'.
+    
     Args:
         patron_id: 6-digit library card ID
+        history_limit: Returned loans to include in 'borrow_history'
         
     Returns:
         dict: Patron status information with all required fields
@@ -298,49 +543,28 @@ def get_patron_status_report(patron_id: str) -> Dict:
         return {'error': 'Invalid patron ID. Must be exactly 6 digits.'}
     
     try:
-        # Retrieve Currently Borrowed Books (Including due_date)
-        currently_borrowed = get_patron_borrowed_books(patron_id)
+        now = datetime.now()
         
-        # Calculate Total Overdue fee
+        # Two queries: current loans with the totals counted in SQL, then the
+        # first page of the lending history. Current loans are bounded by the
+        # borrow limit; fees are computed from these rows instead of
+        # re-querying per overdue book
+        currently_borrowed, summary = get_patron_loans_and_summary(patron_id, now)
         total_late_fees = 0.00
         for book in currently_borrowed:
-            if book['is_overdue']:
-                late_fee_info = calculate_late_fee_for_book(patron_id, book['book_id'])
-                total_late_fees += late_fee_info['fee_amount']
-        
-        # Retrieve Lending History (Returned Books)
-        conn = get_db_connection()
-        borrow_history_records = conn.execute('''
-            SELECT br.*, b.title, b.author 
-            FROM borrow_records br 
-            JOIN books b ON br.book_id = b.id 
-            WHERE br.patron_id = ? AND br.return_date IS NOT NULL
-            ORDER BY br.borrow_date DESC
-        ''', (patron_id,)).fetchall()
-        conn.close()
-        
-        borrow_history = []
-        for record in borrow_history_records:
-            borrow_date = datetime.fromisoformat(record['borrow_date'])
-            due_date = datetime.fromisoformat(record['due_date'])
-            return_date = datetime.fromisoformat(record['return_date'])
-            
-            borrow_history.append({
-                'book_id': record['book_id'],
-                'title': record['title'],
-                'author': record['author'],
-                'borrow_date': borrow_date,
-                'due_date': due_date,
-                'return_date': return_date,
-                'was_overdue': return_date > due_date
-            })
+            book['fee_amount'], book['days_overdue'] = compute_late_fee(book['due_date'], now)
+            total_late_fees += book['fee_amount']
+        
+        history, has_more = get_patron_history_page(patron_id, limit=history_limit)
         
         return {
             'patron_id': patron_id,
             'currently_borrowed': currently_borrowed,
             'total_books_borrowed': len(currently_borrowed),
             'total_late_fees_owed': round(total_late_fees, 2),
-            'borrow_history': borrow_history,
+            'borrow_history': _format_history(history),
+            'history_cursor': _history_cursor(history, has_more),
+            'summary': summary,
             'status': 'Patron status report generated successfully'
         }
         
@@ -350,47 +574,125 @@ def get_patron_status_report(patron_id: str) -> Dict:
             'error': f'Error generating status report: {str(e)}'
         }
 
-def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway = None) -> Tuple[bool, str, Optional[str]]:
+def get_patron_history(patron_id: str, before: Optional[Tuple[str, int]] = None,
+                       limit: int = HISTORY_PAGE_SIZE) -> Dict:
     """
-    Process payment for late fees using external payment gateway.
-    
-    NEW FEATURE FOR ASSIGNMENT 3: Demonstrates need for mocking/stubbing
-    This function depends on an external payment service that should be mocked in tests.
+    Get one page of a patron's borrow history (returned loans, newest first).
     
     Args:
         patron_id: 6-digit library card ID
-        book_id: ID of the book with late fees
-        payment_gateway: Payment gateway instance (injectable for testing)
+        before: 'history_cursor' / 'next_cursor' from the previous page
+        limit: Maximum number of loans to return
         
     Returns:
-        tuple: (success: bool, message: str, transaction_id: Optional[str])
-        
-    Example for you to mock:
-        # In tests, mock the payment gateway:
-        mock_gateway = Mock(spec=PaymentGateway)
-        mock_gateway.process_payment.return_value = (True, "txn_123", "Success")
-        success, msg, txn = pay_late_fees("123456", 1, mock_gateway)
+        dict: 'history' and 'next_cursor' (None on the last page), or 'error'
+    """
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return {'error': 'Invalid patron ID. Must be exactly 6 digits.'}
+    
+    try:
+        history, has_more = get_patron_history_page(patron_id, before, limit)
+    except Exception as e:
+        return {'patron_id': patron_id, 'error': f'Error retrieving borrow history: {str(e)}'}
+    
+    return {
+        'patron_id': patron_id,
+        'history': _format_history(history),
+        'next_cursor': _history_cursor(history, has_more)
+    }
+
+def _late_fee_charge(patron_id: str, book_id: int) -> Tuple[Optional[str], float, Optional[Dict]]:
+    """
+    Work out what pay_late_fees() would charge.
+    
+    Returns:
+        tuple: (error message or None, fee amount, book)
     """
     # Validate patron ID
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
-        return False, "Invalid patron ID. Must be exactly 6 digits.", None
+        return "Invalid patron ID. Must be exactly 6 digits.", 0.0, None
     
     # Calculate late fee first
     fee_info = calculate_late_fee_for_book(patron_id, book_id)
     
     # Check if there's a fee to pay
     if not fee_info or 'fee_amount' not in fee_info:
-        return False, "Unable to calculate late fees.", None
+        return "Unable to calculate late fees.", 0.0, None
     
     fee_amount = fee_info.get('fee_amount', 0.0)
     
     if fee_amount <= 0:
-        return False, "No late fees to pay for this book.", None
+        return "No late fees to pay for this book.", 0.0, None
     
     # Get book details for payment description
     book = get_book_by_id(book_id)
     if not book:
-        return False, "Book not found.", None
+        return "Book not found.", 0.0, None
+    
+    return None, fee_amount, book
+
+def _replay_payment(payment: Dict, kind: str, **expected) -> Tuple[bool, str, Optional[str]]:
+    """
+    Answer a repeated idempotency key from the ledger instead of calling the gateway.
+    
+    Returns:
+        tuple: (success, message, transaction_id) of the first attempt
+    """
+    if payment['kind'] != kind or any(payment[field] != value for field, value in expected.items()):
+        return False, "This idempotency key was already used for a different payment.", None
+    if payment['status'] == 'pending':
+        return False, "A payment with this idempotency key is still being processed.", None
+    return payment['status'] == 'succeeded', payment['message'], payment['transaction_id']
+
+def _record_outcome(payment_id: int, success: bool, transaction_id: Optional[str], message: str):
+    try:
+        complete_payment(payment_id, 'succeeded' if success else 'failed', transaction_id, message)
+    except Exception:
+        # The gateway call has already happened; the entry stays 'pending',
+        # which still stops a retry with the same key from charging again
+        pass
+
+def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway = None,
+                  idempotency_key: Optional[str] = None) -> Tuple[bool, str, Optional[str]]:
+    """
+    Process payment for late fees using external payment gateway.
+    
+    NEW FEATURE FOR ASSIGNMENT 3: Demonstrates need for mocking/stubbing
+    This function depends on an external payment service that should be mocked in tests.
+    
+    Args:
+        patron_id: 6-digit library card ID
+        book_id: ID of the book with late fees
+        payment_gateway: Payment gateway instance (injectable for testing)
+        idempotency_key: Client-chosen key; a retry with the same key returns
+                         the first attempt's result without charging again
+        
+    Returns:
+        tuple: (success: bool, message: str, transaction_id: Optional[str])
+        
+    Example for you to mock:
+        # In tests, mock the payment gateway:
+        mock_gateway = Mock(spec=PaymentGateway)
+        mock_gateway.process_payment.return_value = (True, "txn_123", "Success")
+        success, msg, txn = pay_late_fees("123456", 1, mock_gateway)
+    """
+    if idempotency_key:
+        previous = get_payment_by_key(idempotency_key)
+        if previous:
+            return _replay_payment(previous, 'charge', patron_id=patron_id, book_id=book_id)
+    
+    error, fee_amount, book = _late_fee_charge(patron_id, book_id)
+    if error:
+        return False, error, None
+    
+    # Record the charge before making it
+    try:
+        payment_id = insert_payment('charge', fee_amount, patron_id, book_id, idempotency_key=idempotency_key)
+    except Exception:
+        return False, "Database error occurred while recording the payment.", None
+    if payment_id is None:
+        # A concurrent request with the same key got in first
+        return _replay_payment(get_payment_by_key(idempotency_key), 'charge', patron_id=patron_id, book_id=book_id)
     
     # Use provided gateway or create new one
     if payment_gateway is None:
@@ -398,24 +700,45 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
     
     # Process payment through external gateway
     # THIS IS WHAT YOU SHOULD MOCK IN THEIR TESTS!
+    started = time.perf_counter()
     try:
         success, transaction_id, message = payment_gateway.process_payment(
             patron_id=patron_id,
             amount=fee_amount,
             description=f"Late fees for '{book['title']}'"
         )
+        outcome = 'success' if success else 'declined'
         
         if success:
-            return True, f"Payment successful! {message}", transaction_id
+            message = f"Payment successful! {message}"
         else:
-            return False, f"Payment failed: {message}", None
+            transaction_id, message = None, f"Payment failed: {message}"
             
     except Exception as e:
         # Handle payment gateway errors
-        return False, f"Payment processing error: {str(e)}", None
+        success, transaction_id, message = False, None, f"Payment processing error: {str(e)}"
+        outcome = 'error'
+    observe_gateway_call('charge', time.perf_counter() - started, outcome)
+    
+    _record_outcome(payment_id, success, transaction_id, message)
+    return success, message, transaction_id
 
 
-def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway: PaymentGateway = None) -> Tuple[bool, str]:
+def _refund_error(transaction_id: str, amount: float) -> Optional[str]:
+    """Validate a refund request; returns the error message or None."""
+    if not transaction_id or not transaction_id.startswith("txn_"):
+        return "Invalid transaction ID."
+    
+    if amount <= 0:
+        return "Refund amount must be greater than 0."
+    
+    if amount > 15.00:  # Maximum late fee per book
+        return "Refund amount exceeds maximum late fee."
+    
+    return None
+
+def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway: PaymentGateway = None,
+                            idempotency_key: Optional[str] = None) -> Tuple[bool, str]:
     """
     Refund a late fee payment (e.g., if book was returned on time but fees were charged in error).
     
@@ -425,19 +748,32 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
         transaction_id: Original transaction ID to refund
         amount: Amount to refund
         payment_gateway: Payment gateway instance (injectable for testing)
+        idempotency_key: Client-chosen key; a retry with the same key returns
+                         the first attempt's result without refunding again
         
     Returns:
         tuple: (success: bool, message: str)
     """
-    # Validate inputs
-    if not transaction_id or not transaction_id.startswith("txn_"):
-        return False, "Invalid transaction ID."
+    if idempotency_key:
+        previous = get_payment_by_key(idempotency_key)
+        if previous:
+            return _replay_payment(previous, 'refund', reference=transaction_id, amount=amount)[:2]
     
-    if amount <= 0:
-        return False, "Refund amount must be greater than 0."
+    error = _refund_error(transaction_id, amount)
+    if error:
+        return False, error
     
-    if amount > 15.00:  # Maximum late fee per book
-        return False, "Refund amount exceeds maximum late fee."
+    try:
+        # File the refund under the patron of the original charge, if it is in the ledger
+        charge = get_charge_by_transaction(transaction_id)
+        payment_id = insert_payment('refund', amount, charge['patron_id'] if charge else None,
+                                    charge['book_id'] if charge else None, reference=transaction_id,
+                                    idempotency_key=idempotency_key)
+    except Exception:
+        return False, "Database error occurred while recording the refund."
+    if payment_id is None:
+        return _replay_payment(get_payment_by_key(idempotency_key), 'refund',
+                               reference=transaction_id, amount=amount)[:2]
     
     # Use provided gateway or create new one
     if payment_gateway is None:
@@ -445,14 +781,142 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
     
     # Process refund through external gateway
     # THIS IS WHAT YOU SHOULD MOCK IN YOUR TESTS!
+    started = time.perf_counter()
     try:
         success, message = payment_gateway.refund_payment(transaction_id, amount)
+        outcome = 'success' if success else 'declined'
         
-        if success:
-            return True, message
-        else:
-            return False, f"Refund failed: {message}"
+        if not success:
+            message = f"Refund failed: {message}"
             
     except Exception as e:
-        return False, f"Refund processing error: {str(e)}"
+        success, message = False, f"Refund processing error: {str(e)}"
+        outcome = 'error'
+    observe_gateway_call('refund', time.perf_counter() - started, outcome)
+    
+    _record_outcome(payment_id, success, None, message)
+    return success, message
+
+def _replay_job(job: Dict, kind: str, **expected) -> Tuple[bool, str, Optional[int]]:
+    """Answer a repeated idempotency key with the job it first queued."""
+    if job['kind'] != kind or any(job[field] != value for field, value in expected.items()):
+        return False, "This idempotency key was already used for a different payment.", None
+    return True, f"{'Refund' if kind == 'refund' else 'Payment'} of ${job['amount']:.2f} already queued.", job['id']
+
+def enqueue_late_fee_payment(patron_id: str, book_id: int,
+                             idempotency_key: Optional[str] = None) -> Tuple[bool, str, Optional[int]]:
+    """
+    Queue a late fee payment instead of waiting on the gateway.
+    
+    Runs the same checks as pay_late_fees(), stores a 'charge' job and hands
+    it to the payment worker pool. Poll get_payment_job_status() for the
+    outcome.
+    
+    Args:
+        patron_id: 6-digit library card ID
+        book_id: ID of the book with late fees
+        idempotency_key: Client-chosen key; a retry with the same key
+                         returns the job it first queued
+        
+    Returns:
+        tuple: (success: bool, message: str, job_id: Optional[int])
+    """
+    if idempotency_key:
+        previous = get_payment_job_by_key(idempotency_key)
+        if previous:
+            return _replay_job(previous, 'charge', patron_id=patron_id, book_id=book_id)
+    
+    error, fee_amount, book = _late_fee_charge(patron_id, book_id)
+    if error:
+        return False, error, None
+    
+    try:
+        job_id = insert_payment_job('charge', fee_amount, f"Late fees for '{book['title']}'",
+                                    patron_id=patron_id, book_id=book_id, idempotency_key=idempotency_key)
+        if job_id is None:
+            return _replay_job(get_payment_job_by_key(idempotency_key), 'charge',
+                               patron_id=patron_id, book_id=book_id)
+    except Exception:
+        return False, "Database error occurred while queuing the payment.", None
+    
+    get_payment_queue().submit(job_id)
+    return True, f"Payment of ${fee_amount:.2f} queued.", job_id
 
+def enqueue_late_fee_refund(transaction_id: str, amount: float,
+                            idempotency_key: Optional[str] = None) -> Tuple[bool, str, Optional[int]]:
+    """
+    Queue a refund of a late fee payment (see refund_late_fee_payment()).
+    
+    Args:
+        transaction_id: Original transaction ID to refund
+        amount: Amount to refund
+        idempotency_key: Client-chosen key; a retry with the same key
+                         returns the job it first queued
+        
+    Returns:
+        tuple: (success: bool, message: str, job_id: Optional[int])
+    """
+    if idempotency_key:
+        previous = get_payment_job_by_key(idempotency_key)
+        if previous:
+            return _replay_job(previous, 'refund', reference=transaction_id, amount=amount)
+    
+    error = _refund_error(transaction_id, amount)
+    if error:
+        return False, error, None
+    
+    try:
+        charge = get_charge_by_transaction(transaction_id)
+        job_id = insert_payment_job('refund', amount, f"Refund of {transaction_id}",
+                                    patron_id=charge['patron_id'] if charge else None,
+                                    book_id=charge['book_id'] if charge else None,
+                                    reference=transaction_id, idempotency_key=idempotency_key)
+        if job_id is None:
+            return _replay_job(get_payment_job_by_key(idempotency_key), 'refund',
+                               reference=transaction_id, amount=amount)
+    except Exception:
+        return False, "Database error occurred while queuing the refund.", None
+    
+    get_payment_queue().submit(job_id)
+    return True, f"Refund of ${amount:.2f} queued.", job_id
+
+def get_payment_job_status(job_id: int) -> Dict:
+    """
+    Get the state of a queued payment or refund.
+    
+    Returns:
+        dict: The payment_jobs row (status is queued, processing, succeeded
+              or failed), or {'error': ...} if there is no such job
+    """
+    job = get_payment_job(job_id)
+    if job is None:
+        return {'error': 'Payment job not found.'}
+    return job
+
+def get_patron_payment_history(patron_id: str, before: Optional[Tuple[str, int]] = None,
+                               limit: int = HISTORY_PAGE_SIZE) -> Dict:
+    """
+    One page of a patron's payments ledger, newest first.
+    
+    Args:
+        patron_id: 6-digit library card ID
+        before: Cursor from the previous page's next_cursor
+        limit: Maximum number of entries to return
+        
+    Returns:
+        dict: patron_id, payments and next_cursor ((created_at ISO string,
+              payment id) or None on the last page), or 'error'
+    """
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return {'error': 'Invalid patron ID. Must be exactly 6 digits.'}
+    
+    try:
+        payments, has_more = get_patron_payments_page(patron_id, before, limit)
+    except Exception as e:
+        return {'patron_id': patron_id, 'error': f'Error retrieving payment history: {str(e)}'}
+    
+    return {
+        'patron_id': patron_id,
+        'payments': payments,
+        'next_cursor': (payments[-1]['created_at'], payments[-1]['id']) if has_more else None
+    }
@@ -0,0 +1,192 @@
+"""
+Payment Jobs Module - Background payment processing
+Runs queued late-fee charges and refunds against the payment gateway on a
+worker thread pool. Job state lives in the payment_jobs table, so a request
+can enqueue a charge, return straight away and let the client poll
+"""
+import sys
+import os
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import threading
+import time
+from concurrent import futures
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+
+from database import (
+    finish_payment_job, get_unfinished_payment_job_ids, start_payment_job,
+    insert_payment, complete_payment
+)
+from metrics import observe_gateway_call
+from .payment_service import PaymentGateway
+
+# Gateway calls in flight at once. Each worker spends most of its time
+# waiting on the gateway, so this can be well above the CPU count.
+DEFAULT_PAYMENT_WORKERS = 8
+
+JOB_KINDS = ('charge', 'refund')
+JOB_STATUSES = ('queued', 'processing', 'succeeded', 'failed')
+
+
+class PaymentJobQueue:
+    """
+    Thread pool that sends queued payment jobs to a PaymentGateway.
+
+    Jobs are inserted with database.insert_payment_job() and handed over by
+    id; the worker claims the row (queued -> processing), calls the gateway
+    and stores the result.
+    """
+
+    def __init__(self, workers: int = DEFAULT_PAYMENT_WORKERS, gateway: PaymentGateway = None):
+        self.workers = workers
+        self.gateway = gateway if gateway is not None else PaymentGateway()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='payment')
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._stats = {'submitted': 0, 'succeeded': 0, 'failed': 0}
+
+    def submit(self, job_id: int) -> Future:
+        """Schedule a queued job on the worker pool."""
+        future = self._executor.submit(self.run_job, job_id)
+        with self._lock:
+            self._pending.add(future)
+            self._stats['submitted'] += 1
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future: Future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def run_job(self, job_id: int) -> Optional[Dict]:
+        """
+        Process one job in the calling thread.
+
+        Returns:
+            dict: The job as claimed plus its final status, transaction_id
+                  and message, or None if the job was not queued
+        """
+        job = start_payment_job(job_id)
+        if job is None:
+            return None
+
+        try:
+            return self._process(job)
+        except Exception as e:
+            # Never leave a claimed job 'processing': resume() would report it
+            # as interrupted mid-call whether or not the gateway was reached
+            finish_payment_job(job_id, 'failed', None,
+                               f"Payment job error: {str(e)}; check the payment before retrying.")
+            with self._lock:
+                self._stats['failed'] += 1
+            raise
+
+    def _process(self, job: Dict) -> Dict:
+        job_id = job['id']
+        # Every gateway call is also entered in the payments ledger
+        payment_id = insert_payment(job['kind'], job['amount'], job['patron_id'], job['book_id'],
+                                    reference=job['reference'], idempotency_key=f"job-{job_id}")
+        if payment_id is None:
+            finish_payment_job(job_id, 'failed', None, "Payment job was already sent to the gateway.")
+            job.update({'status': 'failed', 'transaction_id': None})
+            return job
+
+        started, outcome = time.perf_counter(), 'error'
+        try:
+            if job['kind'] == 'refund':
+                success, message = self.gateway.refund_payment(job['reference'], job['amount'])
+                transaction_id = job['reference'] if success else None
+                message = message if success else f"Refund failed: {message}"
+            else:
+                success, transaction_id, message = self.gateway.process_payment(
+                    patron_id=job['patron_id'],
+                    amount=job['amount'],
+                    description=job['description']
+                )
+                message = f"Payment successful! {message}" if success else f"Payment failed: {message}"
+                transaction_id = transaction_id if success else None
+            outcome = 'success' if success else 'declined'
+        except Exception as e:
+            success, transaction_id = False, None
+            message = f"{'Refund' if job['kind'] == 'refund' else 'Payment'} processing error: {str(e)}"
+        observe_gateway_call(job['kind'], time.perf_counter() - started, outcome)
+
+        status = 'succeeded' if success else 'failed'
+        complete_payment(payment_id, status, None if job['kind'] == 'refund' else transaction_id, message)
+        finish_payment_job(job_id, status, transaction_id, message)
+        with self._lock:
+            self._stats[status] += 1
+        job.update({'status': status, 'transaction_id': transaction_id, 'message': message})
+        return job
+
+    def resume(self) -> int:
+        """
+        Pick up jobs left unfinished by a previous process.
+
+        Queued jobs are submitted again. Jobs that were 'processing' may or
+        may not have reached the gateway, so they are marked failed rather
+        than charged twice.
+
+        Returns:
+            int: Number of jobs resubmitted
+        """
+        queued, interrupted = get_unfinished_payment_job_ids()
+        for job_id in interrupted:
+            finish_payment_job(job_id, 'failed', None,
+                               "Interrupted before the gateway replied; check the payment before retrying.")
+        for job_id in queued:
+            self.submit(job_id)
+        return len(queued)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for every submitted job to finish. Returns False on timeout."""
+        with self._lock:
+            pending = list(self._pending)
+        _, not_done = futures.wait(pending, timeout)
+        return not not_done
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting jobs; with wait=True, let running ones finish."""
+        self._executor.shutdown(wait=wait)
+
+    def stats(self) -> Dict:
+        """Return a snapshot of the queue counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        stats['workers'] = self.workers
+        return stats
+
+
+_queue = None
+_queue_lock = threading.Lock()
+_workers = DEFAULT_PAYMENT_WORKERS
+_gateway = None
+
+def get_payment_queue() -> PaymentJobQueue:
+    """Return the process-wide payment queue, creating it on first use."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = PaymentJobQueue(_workers, _gateway)
+        return _queue
+
+def configure_payment_queue(workers: int = DEFAULT_PAYMENT_WORKERS, gateway: PaymentGateway = None):
+    """
+    Replace the process-wide queue settings. Jobs already running on the
+    old queue finish first; the new queue is created on next use.
+    """
+    global _workers, _gateway
+    _workers, _gateway = workers, gateway
+    shutdown_payment_queue()
+
+def shutdown_payment_queue(wait: bool = True):
+    """Shut down the process-wide queue (e.g. at exit or between tests)."""
+    global _queue
+    with _queue_lock:
+        queue, _queue = _queue, None
+    if queue is not None:
+        queue.shutdown(wait)
@@ -0,0 +1,358 @@
+"""
+Synthetic Data Service Module - Large generated library datasets
+Fills an empty database with a seeded, reproducible library: books with valid
+ISBN-13s, patrons, and a loan history in which book popularity follows a Zipf
+distribution, with on-time, late and never-returned loans. Rows are written
+with bulk inserts while the secondary indexes and triggers are set aside, so
+tens of millions of loans take minutes rather than hours
+
+Usage:
+    python -m services.synthetic_data_service --db big.db [--books 1000000] [--patrons 200000] [--loans 20000000]
+                                              [--history-days 730] [--as-of 2026-01-01] [--seed 1]
+"""
+import sys
+import os
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate, islice
+from typing import Callable, Dict, List, Optional
+
+import database
+from migrations import rebuild_fulltext_index
+from services.library_service import LATE_FEE_BY_DAYS
+
+DEFAULT_BOOKS = 10000
+DEFAULT_PATRONS = 2000
+DEFAULT_LOANS = 50000
+DEFAULT_HISTORY_DAYS = 730
+
+# Zipf exponents: book popularity is steep (a few titles take most loans),
+# patron activity much flatter
+BOOK_SKEW = 1.0
+PATRON_SKEW = 0.5
+
+# Share of loans returned late, and never returned at all
+LATE_RATE = 0.12
+LOST_RATE = 0.001
+
+# Loans generated and inserted per transaction
+GENERATE_BATCH_SIZE = 100000
+
+# Library rules the generated open loans respect (see library_service)
+LOAN_DAYS = 14
+BORROW_LIMIT = 5
+
+# Patron IDs are 6 digits: 100000, 100001, ...
+FIRST_PATRON_ID = 100000
+MAX_PATRONS = 900000
+
+_DAY = 86400
+# Loans are made while the library is open, 09:00 to 20:00
+_OPENING = 9 * 3600
+_OPEN_SECONDS = 11 * 3600
+# Late returns come a mean of 6 days after the due date, at most 120 days
+_LATE_MEAN = 6 * _DAY
+_LATE_MAX = 120 * _DAY
+
+TITLE_WORDS = (
+    'river', 'shadow', 'garden', 'winter', 'empire', 'silent', 'golden', 'stone', 'ocean', 'forest',
+    'memory', 'night', 'glass', 'fire', 'crown', 'island', 'letter', 'storm', 'light', 'mountain',
+    'secret', 'journey', 'house', 'iron', 'summer', 'paper', 'moon', 'desert', 'bridge', 'city',
+    'broken', 'hidden', 'last', 'lost', 'red', 'silver', 'northern', 'quiet', 'wild', 'ancient',
+    'song', 'autumn', 'harbor', 'kingdom', 'machine', 'mirror', 'orchard', 'library', 'voyage', 'tide',
+    'lantern', 'velvet', 'sparrow', 'compass', 'thunder', 'meadow', 'tower', 'cathedral', 'engine', 'atlas',
+)
+TITLE_PATTERNS = ('{a} {b}', 'The {a} {b}', '{a} of the {b}', 'The {a}', '{a} and {b}', '{a} {b} {c}')
+FIRST_NAMES = (
+    'Ada', 'Ben', 'Chloe', 'David', 'Elena', 'Farid', 'Grace', 'Hiro', 'Ines', 'Jonas', 'Kemi', 'Liam',
+    'Maya', 'Nikhil', 'Olga', 'Pablo', 'Qi', 'Rosa', 'Sven', 'Tara', 'Umar', 'Vera', 'Wen', 'Yusuf', 'Zoe',
+)
+LAST_NAMES = (
+    'Adams', 'Brown', 'Costa', 'Dubois', 'Evans', 'Fischer', 'Garcia', 'Hughes', 'Ito', 'Jensen',
+    'Kowalski', 'Larsen', 'Moreau', 'Nakamura', 'Okafor', 'Petrov', 'Quinn', 'Rossi', 'Silva', 'Tanaka',
+    'Ueda', 'Varga', 'Walsh', 'Xu', 'Yilmaz', 'Zhang',
+)
+
+
+def isbn13(prefix: str) -> str:
+    """Complete a 12-digit ISBN prefix with its check digit."""
+    total = sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(prefix))
+    return prefix + str((10 - total % 10) % 10)
+
+
+def zipf_weights(n: int, exponent: float) -> List[float]:
+    """Cumulative weights 1/1^s, 1/2^s, ... for random.choices(cum_weights=...)."""
+    return list(accumulate(1.0 / rank ** exponent for rank in range(1, n + 1)))
+
+
+def _book_rows(rng: random.Random, books: int, copies: List[int]):
+    authors = [f'{rng.choice(FIRST_NAMES)} {chr(65 + rng.randrange(26))}. {rng.choice(LAST_NAMES)}'
+               for _ in range(max(100, books // 20))]
+    for book_id in range(1, books + 1):
+        a, b, c = (rng.choice(TITLE_WORDS).title() for _ in range(3))
+        yield (book_id, rng.choice(TITLE_PATTERNS).format(a=a, b=b, c=c), rng.choice(authors),
+               isbn13(f'978{book_id:09d}'), copies[book_id], copies[book_id])
+
+
+def _set_aside_indexes(conn, tables) -> List[str]:
+    """
+    Drop the secondary indexes and the triggers on `tables` and return the
+    statements that recreate them. Building an index once after a bulk load
+    is far cheaper than maintaining it row by row.
+    """
+    placeholders = ', '.join('?' * len(tables))
+    saved = conn.execute(f'''
+        SELECT type, name, sql FROM sqlite_master
+        WHERE tbl_name IN ({placeholders}) AND type IN ('index', 'trigger') AND sql IS NOT NULL
+        ORDER BY type, name
+    ''', tables).fetchall()
+    conn.execute('BEGIN IMMEDIATE')
+    for kind, name, _ in saved:
+        conn.execute(f'DROP {kind.upper()} {name}')
+    conn.commit()
+    return [sql for _, _, sql in saved]
+
+
+def _restore_indexes(conn, statements: List[str]):
+    conn.execute('BEGIN IMMEDIATE')
+    for sql in statements:
+        conn.execute(sql)
+    conn.commit()
+
+
+def generate_library(books: int = DEFAULT_BOOKS, patrons: int = DEFAULT_PATRONS, loans: int = DEFAULT_LOANS,
+                     history_days: int = DEFAULT_HISTORY_DAYS, seed: int = 1, as_of: Optional[datetime] = None,
+                     book_skew: float = BOOK_SKEW, patron_skew: float = PATRON_SKEW,
+                     late_rate: float = LATE_RATE, lost_rate: float = LOST_RATE,
+                     batch_size: int = GENERATE_BATCH_SIZE,
+                     progress: Optional[Callable[[int, int], None]] = None) -> Dict:
+    """
+    Generate a library into the configured database, which must have no
+    books or loans yet.
+
+    Loans are borrowed during opening hours over the `history_days` days
+    before `as_of` and written in borrow order. Each is returned within the
+    loan period, late (`late_rate`) or never (`lost_rate`); one still out at
+    `as_of` stays open if the patron is under the borrow limit, a copy is on
+    the shelf and the patron does not already have that book, and is
+    otherwise returned before `as_of`. available_copies, active_loans and
+    fees_assessed (late fees on returned loans) match the generated loans,
+    so reconcile_patron_counters() finds nothing to fix.
+
+    The same arguments always produce the same database.
+
+    Args:
+        books: Books in the catalog (IDs 1..books)
+        patrons: Patrons (IDs 100000, 100001, ...)
+        loans: Borrow records
+        history_days: Days of loan history before as_of
+        seed: Random seed
+        as_of: End of the history (default: today at midnight)
+        book_skew: Zipf exponent of book popularity
+        patron_skew: Zipf exponent of patron activity
+        late_rate: Share of loans returned after the due date
+        lost_rate: Share of loans never returned
+        batch_size: Loans per insert transaction
+        progress: Called as progress(loans_written, loans) after each batch
+
+    Returns:
+        dict: books, patrons, loans, active_loans, overdue_loans,
+        elapsed_seconds and rows_per_second
+    """
+    if books < 1 or patrons < 1 or loans < 0 or history_days < 1 or batch_size < 1:
+        raise ValueError("books, patrons, history_days and batch_size must be positive; loans non-negative.")
+    if patrons > MAX_PATRONS:
+        raise ValueError(f"At most {MAX_PATRONS} patrons fit in 6-digit patron IDs.")
+    if late_rate < 0 or lost_rate < 0 or late_rate + lost_rate > 1:
+        raise ValueError("late_rate and lost_rate must be non-negative and add up to at most 1.")
+
+    start = time.perf_counter()
+    rng = random.Random(seed)
+    as_of = as_of or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    origin = datetime.combine(as_of.date() - timedelta(days=history_days), datetime.min.time())
+    end = int((as_of - origin).total_seconds())
+
+    # Timestamps are whole seconds since `origin`; their ISO strings are
+    # assembled from per-day and per-second lookup tables
+    day_strings = [(origin + timedelta(days=day)).strftime('%Y-%m-%d')
+                   for day in range(end // _DAY + LOAN_DAYS + 2)]
+    time_strings = [f'T{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}' for s in range(_DAY)]
+
+    def iso(ts):
+        return day_strings[ts // _DAY] + time_strings[ts % _DAY]
+
+    # Popularity rank -> book ID and patron; popular books get more copies
+    book_by_rank = list(range(1, books + 1))
+    rng.shuffle(book_by_rank)
+    copies = [0] * (books + 1)
+    for rank, book_id in enumerate(book_by_rank):
+        copies[book_id] = rng.choice((1, 1, 2, 2, 3)) + (4 if rank < books // 100 else 0)
+    patron_ids = [str(FIRST_PATRON_ID + i) for i in range(patrons)]
+    patron_by_rank = patron_ids[:]
+    rng.shuffle(patron_by_rank)
+    book_weights = zipf_weights(books, book_skew)
+    patron_weights = zipf_weights(patrons, patron_skew)
+
+    conn = database.get_db_connection()
+    try:
+        if conn.execute('SELECT EXISTS (SELECT 1 FROM books) OR EXISTS (SELECT 1 FROM borrow_records)').fetchone()[0]:
+            raise ValueError("The database already has books or loans; generate into an empty one.")
+
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute('PRAGMA cache_size = -262144')
+        deferred = _set_aside_indexes(conn, ('books', 'borrow_records'))
+        try:
+            book_rows = _book_rows(rng, books, copies)
+            for _ in range(0, books, batch_size):
+                conn.execute('BEGIN IMMEDIATE')
+                conn.executemany('''
+                    INSERT INTO books (id, title, author, isbn, total_copies, available_copies)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', islice(book_rows, batch_size))
+                conn.commit()
+
+            active = {}       # patron -> open loans
+            on_loan = {}      # book -> copies out
+            open_pairs = set()
+            fees = {}
+            last_day = len(LATE_FEE_BY_DAYS) - 1
+            active_loans = overdue_loans = 0
+            late_cutoff = lost_rate + late_rate
+            span = history_days * _OPEN_SECONDS
+            random_ = rng.random
+
+            batches = max(1, -(-loans // batch_size))
+            for batch in range(batches):
+                count = min(batch_size, loans - batch * batch_size)
+                if count <= 0:
+                    break
+                # This batch covers its own slice of the history, so rows go in borrow order
+                low, width = span * batch // batches, span // batches
+                positions = sorted([low + int(width * random_()) for _ in range(count)])
+                batch_books = rng.choices(book_by_rank, cum_weights=book_weights, k=count)
+                batch_patrons = rng.choices(patron_by_rank, cum_weights=patron_weights, k=count)
+                rows = []
+                for position, book_id, patron_id in zip(positions, batch_books, batch_patrons):
+                    day, second = divmod(position, _OPEN_SECONDS)
+                    borrowed = min(day * _DAY + _OPENING + second, end - 1)
+                    due = borrowed + LOAN_DAYS * _DAY
+                    outcome = random_()
+                    if outcome < lost_rate:
+                        returned = None
+                    elif outcome < late_cutoff:
+                        returned = due + 1 + min(int(rng.expovariate(1 / _LATE_MEAN)), _LATE_MAX)
+                    else:
+                        returned = borrowed + 3600 + int((LOAN_DAYS * _DAY - 3600) * random_())
+
+                    if returned is None or returned > end:
+                        if (active.get(patron_id, 0) < BORROW_LIMIT and on_loan.get(book_id, 0) < copies[book_id]
+                                and (patron_id, book_id) not in open_pairs):
+                            active[patron_id] = active.get(patron_id, 0) + 1
+                            on_loan[book_id] = on_loan.get(book_id, 0) + 1
+                            open_pairs.add((patron_id, book_id))
+                            active_loans += 1
+                            overdue_loans += due < end
+                            rows.append((patron_id, book_id, iso(borrowed), iso(due), None))
+                            continue
+                        returned = borrowed + int((end - borrowed) * random_())
+
+                    if returned > due:
+                        fees[patron_id] = fees.get(patron_id, 0.0) + LATE_FEE_BY_DAYS[
+                            min((returned - due) // _DAY, last_day)]
+                    rows.append((patron_id, book_id, iso(borrowed), iso(due), iso(returned)))
+
+                conn.execute('BEGIN IMMEDIATE')
+                conn.executemany('''
+                    INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', rows)
+                conn.commit()
+                if progress:
+                    progress(batch * batch_size + count, loans)
+
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany('UPDATE books SET available_copies = total_copies - ? WHERE id = ?',
+                             ((count, book_id) for book_id, count in sorted(on_loan.items())))
+            conn.executemany('''
+                INSERT INTO patrons (patron_id, active_loans, fees_assessed) VALUES (?, ?, ?)
+                ON CONFLICT (patron_id) DO UPDATE
+                SET active_loans = excluded.active_loans, fees_assessed = excluded.fees_assessed
+            ''', ((patron_id, active.get(patron_id, 0), round(fees.get(patron_id, 0.0), 2))
+                  for patron_id in patron_ids))
+            # The catalog_version triggers were set aside too; one bump covers the load
+            conn.execute('UPDATE catalog_version SET version = version + 1 WHERE id = 1')
+            conn.commit()
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            _restore_indexes(conn, deferred)
+        rebuild_fulltext_index(conn)
+        conn.execute('PRAGMA analysis_limit = 1000')
+        conn.execute('ANALYZE')
+    finally:
+        conn.execute(f"PRAGMA synchronous = {database.CONNECTION_PRAGMAS['synchronous']}")
+        conn.execute(f"PRAGMA cache_size = {database.CONNECTION_PRAGMAS['cache_size']}")
+        conn.close()
+    database.invalidate_book_cache()
+
+    elapsed = time.perf_counter() - start
+    rows = books + patrons + loans
+    return {
+        'books': books,
+        'patrons': patrons,
+        'loans': loans,
+        'active_loans': active_loans,
+        'overdue_loans': overdue_loans,
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_second': round(rows / elapsed) if elapsed > 0 else 0,
+    }
+
+
+def main():
+    from config import load_storage_config
+
+    parser = argparse.ArgumentParser(description='Generate a large synthetic library dataset.')
+    parser.add_argument('--db', help='Database path (default: LIBRARY_DB_PATH or library.db)')
+    parser.add_argument('--books', type=int, default=DEFAULT_BOOKS)
+    parser.add_argument('--patrons', type=int, default=DEFAULT_PATRONS)
+    parser.add_argument('--loans', type=int, default=DEFAULT_LOANS)
+    parser.add_argument('--history-days', type=int, default=DEFAULT_HISTORY_DAYS, help='Days of loan history')
+    parser.add_argument('--as-of', type=datetime.fromisoformat, help='End of the history (default: today)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--book-skew', type=float, default=BOOK_SKEW, help='Zipf exponent of book popularity')
+    parser.add_argument('--patron-skew', type=float, default=PATRON_SKEW, help='Zipf exponent of patron activity')
+    parser.add_argument('--late-rate', type=float, default=LATE_RATE, help='Share of loans returned late')
+    parser.add_argument('--lost-rate', type=float, default=LOST_RATE, help='Share of loans never returned')
+    parser.add_argument('--batch-size', type=int, default=GENERATE_BATCH_SIZE, help='Loans per transaction')
+    parser.add_argument('--quiet', action='store_true', help='No progress output')
+    args = parser.parse_args()
+
+    def progress(written, total):
+        print(f"\r{written}/{total} loans", end='', file=sys.stderr, flush=True)
+
+    database.configure_database(load_storage_config({'LIBRARY_DB_PATH': args.db} if args.db else None))
+    database.init_database()
+    try:
+        result = generate_library(args.books, args.patrons, args.loans, args.history_days, args.seed, args.as_of,
+                                  args.book_skew, args.patron_skew, args.late_rate, args.lost_rate,
+                                  args.batch_size, None if args.quiet else progress)
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        database.close_pool()
+
+    if not args.quiet:
+        print(file=sys.stderr)
+    print(f"Generated {result['books']} books, {result['patrons']} patrons and {result['loans']} loans "
+          f"({result['active_loans']} open, {result['overdue_loans']} overdue) "
+          f"in {result['elapsed_seconds']:.1f}s ({result['rows_per_second']} rows/s).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+"""
+Slow query log for Library Management System
+Logs every statement run on a pooled connection that takes longer than a
+threshold, with the shape of its bound parameters and its EXPLAIN QUERY PLAN,
+as JSON Lines in a size-rotated file. The command line summarizes the log by
+normalized query.
+
+Usage:
+    python slow_query_log.py summary slow_queries.log [--sort total|count|avg|max] [--top 20] [--plans] [--json]
+"""
+
+import argparse
+import glob
+import json
+import logging
+import logging.handlers
+import re
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from flask import has_request_context, request
+
+import database
+from cache import LRUCache
+
+DEFAULT_THRESHOLD_MS = 100.0
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUPS = 5
+
+# Only these statements have a query plan worth capturing
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+# Plans are looked up once per statement text, then reused
+PLAN_CACHE_SIZE = 512
+PLAN_CACHE_TTL = 300.0
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Reduce a statement to its shape: whitespace collapsed, literals replaced
+    by ? and placeholder lists of any length written as (?, ...), so that the
+    same query issued with different values or batch sizes groups together.
+    """
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _PLACEHOLDER_LIST.sub('(?, ...)', sql)
+
+
+def _value_shape(value) -> str:
+    if value is None:
+        return 'null'
+    if isinstance(value, (str, bytes)):
+        return f'{type(value).__name__}[{len(value)}]'
+    return type(value).__name__
+
+
+def parameter_shape(parameters):
+    """
+    Describe bound parameters without their values (which may be patron IDs):
+    ['str[6]', 'int'] for positional, {'name': 'str[6]'} for named parameters,
+    'executemany' when the statement ran once per parameter set.
+    """
+    if parameters is None:
+        return 'executemany'
+    if isinstance(parameters, dict):
+        return {name: _value_shape(value) for name, value in parameters.items()}
+    return [_value_shape(value) for value in parameters]
+
+
+class SlowQueryLog:
+    """
+    Statement observer (see database.add_statement_observer) that writes
+    statements slower than `threshold_ms` to a rotating JSON Lines file.
+
+    Query plans are read on a separate, plain sqlite3 connection to the
+    current database, so capturing one never waits for a pooled connection.
+    """
+
+    def __init__(self, path: str, threshold_ms: float = DEFAULT_THRESHOLD_MS,
+                 max_bytes: int = DEFAULT_MAX_BYTES, backups: int = DEFAULT_BACKUPS,
+                 explain: bool = True):
+        self.path = path
+        self.threshold = threshold_ms / 1000
+        self.explain = explain
+        self._handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                             encoding='utf-8')
+        self._handler.setFormatter(logging.Formatter('%(message)s'))
+        # Private logger: entries go to this file only, not to the root logger
+        self._logger = logging.Logger('library.slow_queries', logging.INFO)
+        self._logger.propagate = False
+        self._logger.addHandler(self._handler)
+        self._plans = LRUCache(PLAN_CACHE_SIZE, PLAN_CACHE_TTL)
+        self._plan_conn = None
+        self._plan_database = None
+        self._lock = threading.Lock()
+
+    def __call__(self, sql: str, parameters, seconds: float):
+        if seconds < self.threshold:
+            return
+        entry = {
+            'ts': datetime.now().isoformat(timespec='milliseconds'),
+            'duration_ms': round(seconds * 1000, 3),
+            'query': normalize_sql(sql),
+            'params': parameter_shape(parameters),
+            'plan': self.query_plan(sql, parameters) if self.explain else None,
+            'request': None,
+            'thread': threading.current_thread().name,
+        }
+        if has_request_context():
+            rule = request.url_rule.rule if request.url_rule is not None else request.path
+            entry['request'] = f"{request.method} {rule}"
+        self._logger.info(json.dumps(entry))
+
+    def query_plan(self, sql: str, parameters) -> Optional[List[str]]:
+        """
+        EXPLAIN QUERY PLAN for a statement, one line per plan step indented
+        by depth. None for statements without a plan (BEGIN, PRAGMA, ...) or
+        executemany() batches; ['error: ...'] if the plan could not be read.
+        """
+        keyword = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ''
+        if keyword not in EXPLAINABLE or parameters is None:
+            return None
+        hit, plan = self._plans.get(sql)
+        if hit:
+            return plan
+
+        with self._lock:
+            try:
+                if self._plan_conn is None or self._plan_database != database.DATABASE:
+                    self._close_plan_conn()
+                    self._plan_database = database.DATABASE
+                    self._plan_conn = sqlite3.connect(database.DATABASE, check_same_thread=False,
+                                                      uri=database.DATABASE.startswith('file:'))
+                rows = self._plan_conn.execute(f'EXPLAIN QUERY PLAN {sql}', parameters).fetchall()
+            except sqlite3.Error as e:
+                return [f'error: {e}']
+
+        depth = {0: -1}
+        plan = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            plan.append('  ' * depth[node_id] + detail)
+        self._plans.set(sql, plan)
+        return plan
+
+    def _close_plan_conn(self):
+        if self._plan_conn is not None:
+            self._plan_conn.close()
+            self._plan_conn = None
+
+    def close(self):
+        """Flush and close the log file and the plan connection."""
+        with self._lock:
+            self._close_plan_conn()
+        self._handler.close()
+
+
+_slow_query_log: Optional[SlowQueryLog] = None
+
+def get_slow_query_log() -> Optional[SlowQueryLog]:
+    """Get the active slow query log, or None if logging is off."""
+    return _slow_query_log
+
+def configure_slow_query_log(path: str, threshold_ms: float = DEFAULT_THRESHOLD_MS,
+                             max_bytes: int = DEFAULT_MAX_BYTES,
+                             backups: int = DEFAULT_BACKUPS) -> Optional[SlowQueryLog]:
+    """
+    Replace the process-wide slow query log.
+
+    Args:
+        path: Log file ('' turns slow query logging off)
+        threshold_ms: Log statements taking at least this long
+        max_bytes: Rotate the file at this size (0 never rotates)
+        backups: Rotated files to keep (slow_queries.log.1, .2, ...)
+
+    Returns:
+        SlowQueryLog: The new log, or None if logging is off
+    """
+    global _slow_query_log
+    if _slow_query_log is not None:
+        database.remove_statement_observer(_slow_query_log)
+        _slow_query_log.close()
+        _slow_query_log = None
+    if path:
+        _slow_query_log = SlowQueryLog(path, threshold_ms, max_bytes, backups)
+        database.add_statement_observer(_slow_query_log)
+    return _slow_query_log
+
+
+def read_log(path: str) -> Iterator[Dict]:
+    """Yield the entries of a log and its rotated backups, oldest file first. Bad lines are skipped."""
+    backups = sorted((name for name in glob.glob(glob.escape(path) + '.*') if name.rsplit('.', 1)[1].isdigit()),
+                     key=lambda name: -int(name.rsplit('.', 1)[1]))
+    for name in backups + [path]:
+        try:
+            with open(name, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(entry, dict) and 'query' in entry and 'duration_ms' in entry:
+                        yield entry
+        except FileNotFoundError:
+            continue
+
+
+def summarize(entries) -> List[Dict]:
+    """
+    Aggregate log entries by normalized query.
+
+    Returns:
+        list: One dict per query with count, total_ms, avg_ms, p95_ms,
+              max_ms, the requests that issued it, and the latest plan,
+              sorted by total_ms descending
+    """
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(entry['query'], {'query': entry['query'], 'durations': [],
+                                                   'requests': {}, 'plan': None, 'last_seen': None})
+        group['durations'].append(entry['duration_ms'])
+        if entry.get('request'):
+            group['requests'][entry['request']] = group['requests'].get(entry['request'], 0) + 1
+        if entry.get('plan'):
+            group['plan'] = entry['plan']
+        group['last_seen'] = entry.get('ts')
+
+    summary = []
+    for group in groups.values():
+        durations = sorted(group.pop('durations'))
+        group.update({
+            'count': len(durations),
+            'total_ms': round(sum(durations), 3),
+            'avg_ms': round(sum(durations) / len(durations), 3),
+            'p95_ms': durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+            'max_ms': durations[-1],
+        })
+        summary.append(group)
+    summary.sort(key=lambda group: -group['total_ms'])
+    return summary
+
+
+def main():
+    """Command-line entry point: summarize a slow query log."""
+    parser = argparse.ArgumentParser(description='Summarize a slow query log by normalized query.')
+    parser.add_argument('command', choices=['summary'])
+    parser.add_argument('log', help='Log file (rotated backups next to it are read too)')
+    parser.add_argument('--sort', choices=['total', 'count', 'avg', 'max'], default='total')
+    parser.add_argument('--top', type=int, default=20, help='Queries to show (0 = all)')
+    parser.add_argument('--plans', action='store_true', help='Print the query plan under each query')
+    parser.add_argument('--json', action='store_true', help='Print the summary as JSON')
+    args = parser.parse_args()
+
+    summary = summarize(read_log(args.log))
+    summary.sort(key=lambda group: -group[f'{args.sort}_ms' if args.sort != 'count' else 'count'])
+    if args.top:
+        summary = summary[:args.top]
+
+    if args.json:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+        return
+    if not summary:
+        print(f"No slow queries logged in {args.log}")
+        return
+
+    print(f"{'count':>7} {'total ms':>10} {'avg ms':>9} {'p95 ms':>9} {'max ms':>9}  query")
+    for group in summary:
+        print(f"{group['count']:>7} {group['total_ms']:>10.1f} {group['avg_ms']:>9.1f} {group['p95_ms']:>9.1f} "
+              f"{group['max_ms']:>9.1f}  {group['query']}")
+        if args.plans:
+            for request_name, count in sorted(group['requests'].items(), key=lambda item: -item[1]):
+                print(f"{'':>48}  from {request_name} ({count})")
+            for step in group['plan'] or ['(no plan)']:
+                print(f"{'':>48}    {step}")
+
+
+if __name__ == '__main__':
+    main()
@@ -32,10 +32,7 @@ def test_borrow_book_with_valid_data():
         'available_copies': 3
     }
     
-    with patch('services.library_service.get_book_by_id', return_value=mock_book), \
-         patch('services.library_service.get_patron_borrow_count', return_value=2), \
-         patch('services.library_service.insert_borrow_record', return_value=True), \
-         patch('services.library_service.update_book_availability', return_value=True), \
+    with patch('services.library_service.borrow_book_transaction', return_value=('borrowed', mock_book)), \
          patch('services.library_service.datetime') as mock_datetime:
         
         # Mock current time
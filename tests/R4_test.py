@@ -2,6 +2,7 @@ import pytest
 import sys
 import os
 import sqlite3
+from datetime import datetime, timedelta
 
 from unittest.mock import patch, Mock
 
@@ -30,17 +31,14 @@ def test_return_book_with_valid_data():
     }
     
     # Simulate all required functions
-    with patch('services.library_service.get_book_by_id', return_value=mock_book), \
-         patch('services.library_service.update_borrow_record_return_date', return_value=True), \
-         patch('services.library_service.update_book_availability', return_value=True), \
-         patch('services.library_service.calculate_late_fee_for_book') as mock_late_fee:
-        
-        # Simulate no late fee
-        mock_late_fee.return_value = {
-            'fee_amount': 0.00,
-            'days_overdue': 0,
-            'status': 'No late fees'
-        }
+    # Simulate a loan that is not yet due (no late fee)
+    mock_loan = {
+        'book_id': 4,
+        'title': mock_book['title'],
+        'due_date': datetime.now() + timedelta(days=3)
+    }
+    
+    with patch('services.library_service.return_book_transaction', return_value=('returned', mock_loan)):
         
         success, message = return_book_by_patron("123456", 4)
         
@@ -77,24 +75,16 @@ def test_return_book_with_different_borrower():
         'available_copies': 2
     }
     
-    # First call get_book_by_id()- return available book
-    # Secod call get_book_by_id()- return the same book
-    mock_get_book = Mock()
-    mock_get_book.side_effect = [mock_book, mock_book]
-    
     # Simulated borrowing success
-    with patch('services.library_service.get_book_by_id', mock_get_book), \
-         patch('services.library_service.get_patron_borrow_count', return_value=2), \
-         patch('services.library_service.insert_borrow_record', return_value=True), \
-         patch('services.library_service.update_book_availability', return_value=True):
+    with patch('services.library_service.borrow_book_transaction', return_value=('borrowed', mock_book)):
         
         # patron id 111111 borrow book
         borrow_success, borrow_message = borrow_book_by_patron("111111", 2)
         assert borrow_success == True
     
     # Simulated book return failure (different borrowers)
-    with patch('services.library_service.get_book_by_id', return_value=mock_book), \
-         patch('services.library_service.update_borrow_record_return_date', return_value=False):
+    with patch('services.library_service.return_book_transaction',
+               return_value=('no_record', {'book_id': 2, 'title': mock_book['title']})):
         
         return_success, return_message = return_book_by_patron("123456", 2)
         
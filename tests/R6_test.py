@@ -10,63 +10,72 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from database import  (
     get_db_connection
 )
+from db_utils import temp_database, add_book
 
 from services.library_service import (
     search_books_in_catalog
 )
 
+CATALOG = [
+    ('The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565'),
+    ('To Kill a Mockingbird', 'Harper Lee', '9780061120084'),
+    ('The Catcher in the Rye', 'J.D. Salinger', '9780316769488'),
+]
+
+@pytest.fixture
+def catalog(tmp_path):
+    # Search runs in SQL now, so use a real database seeded with the test books
+    with temp_database(tmp_path / 'search.db'):
+        for title, author, isbn in CATALOG:
+            add_book(title, author, isbn)
+        yield
+
 # Test case 1: Positive test case - Search by title with exact match
-def test_search_books_by_title_exact_match():
-    with patch('services.library_service.get_all_books') as mock_get_all:
-        mock_get_all.return_value = [
-            {'id': 1, 'title': 'The Great Gatsby', 'author': 'F. Scott Fitzgerald', 'isbn': '9780743273565'},
-            {'id': 2, 'title': 'To Kill a Mockingbird', 'author': 'Harper Lee', 'isbn': '9780061120084'}
-        ]
-        results = search_books_in_catalog("The Great Gatsby", "title")
-        assert len(results) == 1
-        assert results[0]['title'] == 'The Great Gatsby'
+def test_search_books_by_title_exact_match(catalog):
+    results = search_books_in_catalog("The Great Gatsby", "title")
+    assert len(results) == 1
+    assert results[0]['title'] == 'The Great Gatsby'
 
 # Test case 2: Positive test case - Search by author with partial match (case-insensitive)
-def test_search_books_by_author_partial_match():
-    with patch('services.library_service.get_all_books') as mock_get_all:
-        mock_get_all.return_value = [
-            {'id': 1, 'title': 'The Great Gatsby', 'author': 'F. Scott Fitzgerald', 'isbn': '9780743273565'},
-            {'id': 2, 'title': 'To Kill a Mockingbird', 'author': 'Harper Lee', 'isbn': '9780061120084'},
-            {'id': 3, 'title': 'The Catcher in the Rye', 'author': 'J.D. Salinger', 'isbn': '9780316769488'}
-        ]
-        
-        results = search_books_in_catalog("fitzgerald", "author")
-        assert len(results) == 1
-        assert "Fitzgerald" in results[0]['author']
+def test_search_books_by_author_partial_match(catalog):
+    results = search_books_in_catalog("fitzgerald", "author")
+    assert len(results) == 1
+    assert "Fitzgerald" in results[0]['author']
 
 # Test case 3: Positive test case - Search by ISBN with exact match
-def test_search_books_by_isbn_exact_match():
-    with patch('services.library_service.get_all_books') as mock_get_all:
-        mock_get_all.return_value = [
-            {'id': 1, 'title': 'The Great Gatsby', 'author': 'F. Scott Fitzgerald', 'isbn': '9780743273565'},
-            {'id': 2, 'title': 'To Kill a Mockingbird', 'author': 'Harper Lee', 'isbn': '9780061120084'}
-        ]
-        
-        results = search_books_in_catalog("9780061120084", "isbn")
-        assert len(results) == 1
-        assert results[0]['isbn'] == '9780061120084'
+def test_search_books_by_isbn_exact_match(catalog):
+    results = search_books_in_catalog("9780061120084", "isbn")
+    assert len(results) == 1
+    assert results[0]['isbn'] == '9780061120084'
 
 # Test case 4: Negative test case - Empty search term
-def test_search_books_empty_search_term():
-    with patch('services.library_service.get_all_books') as mock_get_all:
-        mock_get_all.return_value = [
-            {'id': 1, 'title': 'The Great Gatsby', 'author': 'F. Scott Fitzgerald', 'isbn': '9780743273565'}
-        ]
-        
-        results = search_books_in_catalog("", "title")
-        assert len(results) == 0
+def test_search_books_empty_search_term(catalog):
+    results = search_books_in_catalog("", "title")
+    assert len(results) == 0
 
 # Test case 5: Negative test case - Invalid search type
-def test_search_books_invalid_search_type():
-    with patch('services.library_service.get_all_books') as mock_get_all:
-        mock_get_all.return_value = [
-            {'id': 1, 'title': 'The Great Gatsby', 'author': 'F. Scott Fitzgerald', 'isbn': '9780743273565'}
-        ]
-        
-        results = search_books_in_catalog("Gatsby", "invalid_type")
-        assert len(results) == 0
+def test_search_books_invalid_search_type(catalog):
+    results = search_books_in_catalog("Gatsby", "invalid_type")
+    assert len(results) == 0
+
+# Test case 6: Positive test case - Partial ISBN does not match (exact only)
+def test_search_books_by_partial_isbn(catalog):
+    results = search_books_in_catalog("978006112", "isbn")
+    assert results == []
+
+# Test case 7: Boundary test case - LIKE wildcards in the term are matched literally
+def test_search_books_wildcards_are_literal(catalog):
+    assert search_books_in_catalog("%", "title") == []
+    assert search_books_in_catalog("_", "author") == []
+
+# Test case 8: Positive test case - Limit/offset page through results ordered by title
+def test_search_books_limit_and_offset(catalog):
+    first = search_books_in_catalog("the", "title", limit=1)
+    second = search_books_in_catalog("the", "title", limit=1, offset=1)
+    assert [b['title'] for b in first + second] == ['The Catcher in the Rye', 'The Great Gatsby']
+
+# Test case 9: Positive test case - Prefix matching is case-insensitive and anchored
+def test_search_books_prefix_match(catalog):
+    results = search_books_in_catalog("to kill", "title", match='prefix')
+    assert [b['title'] for b in results] == ['To Kill a Mockingbird']
+    assert search_books_in_catalog("kill", "title", match='prefix') == []
@@ -18,7 +18,8 @@ def test_get_patron_status_report_valid_patron():
             'book_id': 1,
             'title': 'Test Book 1',
             'author': 'Author 1',
-            'due_date': (datetime.now() + timedelta(days=7)).isoformat(),
+            'borrow_date': datetime.now() - timedelta(days=7),
+            'due_date': datetime.now() + timedelta(days=7),
             'is_overdue': False
         }
     ]
@@ -26,35 +27,29 @@ def test_get_patron_status_report_valid_patron():
     # Simulated borrow History
     mock_borrow_history = [
         {
+            'id': 5,
             'book_id': 2,
             'title': 'History Book',
             'author': 'History Author',
-            'borrow_date': (datetime.now() - timedelta(days=30)).isoformat(),
-            'due_date': (datetime.now() - timedelta(days=16)).isoformat(),
-            'return_date': (datetime.now() - timedelta(days=15)).isoformat()
+            'borrow_date': datetime.now() - timedelta(days=30),
+            'due_date': datetime.now() - timedelta(days=16),
+            'return_date': datetime.now() - timedelta(days=15)
         }
     ]
+    mock_summary = {'total_loans': 2, 'active_loans': 1, 'returned_loans': 1, 'overdue_loans': 1}
 
-    with patch('services.library_service.get_patron_borrowed_books', return_value=mock_currently_borrowed), \
-         patch('services.library_service.get_db_connection') as mock_db_conn, \
-         patch('services.library_service.calculate_late_fee_for_book', return_value={'fee_amount': 0.0}), \
-         patch('services.library_service.get_patron_status_report') as mock_report:
-        
-        mock_report.return_value = {
-            'patron_id': "123456",
-            'currently_borrowed': mock_currently_borrowed,
-            'total_books_borrowed': len(mock_currently_borrowed),
-            'total_late_fees_owed': 0.0,
-            'borrow_history': mock_borrow_history,
-            'status': 'Patron status report generated successfully'
-        }
-        
+    with patch('services.library_service.get_patron_loans_and_summary',
+               return_value=(mock_currently_borrowed, mock_summary)), \
+         patch('services.library_service.get_patron_history_page', return_value=(mock_borrow_history, True)):
         result = get_patron_status_report("123456")
         
         assert result['patron_id'] == "123456"
         assert len(result['currently_borrowed']) == 1
         assert result['total_books_borrowed'] == 1
-        assert result['total_late_fees_owed'] == 0.0   
+        assert result['total_late_fees_owed'] == 0.0
+        assert result['borrow_history'][0]['was_overdue'] == True
+        assert result['history_cursor'] == (mock_borrow_history[0]['borrow_date'].isoformat(), 5)
+        assert result['summary'] == mock_summary
 
 
 def test_get_patron_status_report_invalid_patron_id():
@@ -74,21 +69,15 @@ def test_get_patron_status_report_invalid_patron_id():
 
 def test_get_patron_status_report_no_borrowed_books():
     """Testing Readers with No borrowing Records"""
-    with patch('services.library_service.get_patron_borrowed_books', return_value=[]), \
-         patch('services.library_service.get_db_connection') as mock_db_conn:
-        
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_db_conn.return_value = mock_conn
-        mock_conn.execute.return_value = mock_cursor
-        mock_cursor.fetchall.return_value = []  
-        
+    with patch('services.library_service.get_patron_loans_and_summary', return_value=([], {})), \
+         patch('services.library_service.get_patron_history_page', return_value=([], False)):
         result = get_patron_status_report("123456")
         
         assert result['patron_id'] == "123456"
         assert result['currently_borrowed'] == []
         assert result['total_books_borrowed'] == 0
         assert result['borrow_history'] == []
+        assert result['history_cursor'] is None
         assert result['total_late_fees_owed'] == 0.0
 
 def test_get_patron_status_report_with_late_fees():
@@ -103,29 +92,19 @@ def test_get_patron_status_report_with_late_fees():
         }
     ]
     
-    with patch('services.library_service.get_patron_borrowed_books', return_value=mock_currently_borrowed), \
-         patch('services.library_service.get_db_connection') as mock_db_conn, \
-         patch('services.library_service.calculate_late_fee_for_book') as mock_late_fee:
-        
-        mock_late_fee.return_value = {'fee_amount': 2.50}
-        
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_db_conn.return_value = mock_conn
-        mock_conn.execute.return_value = mock_cursor
-        mock_cursor.fetchall.return_value = []
-        
+    with patch('services.library_service.get_patron_loans_and_summary', return_value=(mock_currently_borrowed, {})), \
+         patch('services.library_service.get_patron_history_page', return_value=([], False)):
         result = get_patron_status_report("123456")
         
         assert result['total_late_fees_owed'] == 2.50
         assert result['currently_borrowed'][0]['is_overdue'] == True
+        assert result['currently_borrowed'][0]['fee_amount'] == 2.50
 
 def test_get_patron_status_report_database_error():
     """Testing Database Error Handling"""
-    with patch('services.library_service.get_patron_borrowed_books', side_effect=Exception("Database connection failed")):
+    with patch('services.library_service.get_patron_loans_and_summary', side_effect=Exception("Database connection failed")):
         result = get_patron_status_report("123456")
         
         assert 'error' in result
         assert 'Database connection failed' in result['error']
         assert result['patron_id'] == "123456"
-
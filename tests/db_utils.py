@@ -0,0 +1,45 @@
+"""
+Helpers for tests that need a real, throw-away SQLite database
+"""
+import sys
+import os
+from contextlib import contextmanager
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+from config import load_storage_config
+
+
+@contextmanager
+def temp_database(path, **overrides):
+    """
+    Point database.py at a fresh file for the duration of the block.
+
+    Extra keyword arguments override LIBRARY_DB_* settings, e.g.
+    temp_database(tmp_path / 'x.db', LIBRARY_DB_POOL_SIZE=1).
+    """
+    original = load_storage_config({'LIBRARY_DB_PATH': database.DATABASE})
+    settings = {'LIBRARY_DB_PATH': str(path)}
+    settings.update(overrides)
+    database.configure_database(load_storage_config(settings))
+    try:
+        database.init_database()
+        yield database
+    finally:
+        database.configure_database(original)
+
+
+def add_book(title='Test Book', author='Test Author', isbn='1234567890123', copies=1) -> int:
+    """Insert a book directly and return its id."""
+    conn = database.get_db_connection()
+    try:
+        cursor = conn.execute('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (title, author, isbn, copies, copies))
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        conn.close()
@@ -0,0 +1,124 @@
+import pytest
+import sys
+import os
+import asyncio
+import time
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.async_payment_service import AsyncPaymentGateway, PaymentGatewayError, process_payments_batch
+from benchmarks.fake_gateway import FakeGatewayServer
+
+FAST = {'charge': 0.05, 'refund': 0.05, 'status': 0.05}
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def with_server(test, **server_options):
+    async with FakeGatewayServer(**dict({'latency': 0.01}, **server_options)) as server:
+        return await test(server)
+
+# Test case 1: offline mode fans a batch out under the concurrency limit, results in order
+def test_simulated_batch_is_concurrent():
+    charges = [(f'{100000 + i}', 5.0, 'Late fees') for i in range(20)] + [('123456', 0, 'Late fees')]
+
+    start = time.perf_counter()
+    results, stats = process_payments_batch(charges, max_concurrency=10, latency=FAST)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.5    # 21 charges, 10 at a time: ~3 rounds of 0.05s, not 21
+    assert all(result[0] and result[1].startswith(f'txn_{100000 + i}_') for i, result in enumerate(results[:20]))
+    assert results[20] == (False, '', 'Invalid amount: must be greater than 0')
+    assert stats['requests'] == 21
+
+# Test case 2: over HTTP, charges reuse at most max_concurrency connections
+def test_http_batch_reuses_connections():
+    async def test(server):
+        async with AsyncPaymentGateway(base_url=server.base_url, max_concurrency=4) as gateway:
+            results = await gateway.process_payments([(f'{100000 + i}', 2.5) for i in range(40)])
+            return results, gateway.stats(), dict(server.stats)
+
+    results, stats, server_stats = run(with_server(test))
+
+    assert all(success for success, _, _ in results)
+    assert results[0][2] == 'Payment of $2.50 processed successfully'
+    assert stats['connections_opened'] <= 4
+    assert server_stats['connections'] <= 4
+    assert server_stats['requests'] == 40
+
+# Test case 3: 503s are retried until the charge goes through
+def test_retries_transient_failures():
+    async def test(server):
+        async with AsyncPaymentGateway(base_url=server.base_url, backoff=0.01) as gateway:
+            return await gateway.process_payment('123456', 5.0), gateway.stats()
+
+    (success, transaction_id, _), stats = run(with_server(test, fail_first=2))
+
+    assert success and transaction_id.startswith('txn_123456_')
+    assert stats['retries'] == 2 and stats['errors'] == 0
+
+# Test case 4: declines are not retried; exhausted retries raise, or fail the item in a batch
+def test_declines_and_exhausted_retries():
+    async def decline(server):
+        async with AsyncPaymentGateway(base_url=server.base_url) as gateway:
+            return await gateway.process_payment('123456', 5000.0), gateway.stats()
+
+    async def unavailable(server):
+        async with AsyncPaymentGateway(base_url=server.base_url, retries=1, backoff=0.01) as gateway:
+            with pytest.raises(PaymentGatewayError):
+                await gateway.process_payment('123456', 5.0)
+            return await gateway.process_payments([('123456', 5.0)])
+
+    declined, stats = run(with_server(decline))
+    (success, _, message), = run(with_server(unavailable, failure_rate=1.0))
+
+    assert declined == (False, '', 'Payment declined: amount exceeds limit')
+    assert stats['requests'] == 1 and stats['retries'] == 0
+    assert not success
+    assert message == 'Payment processing error: Gateway request failed after 2 attempts (HTTP 503)'
+
+# Test case 5: refunds and status checks over HTTP match PaymentGateway's answers
+def test_refund_and_status_over_http():
+    async def test(server):
+        async with AsyncPaymentGateway(base_url=server.base_url) as gateway:
+            return (await gateway.refund_payment('txn_123456_1', 5.0),
+                    await gateway.refund_payment('bad', 5.0),
+                    await gateway.verify_payment_status('txn_123456_1'),
+                    await gateway.verify_payment_status('bad'))
+
+    refund, bad_refund, status, missing = run(with_server(test))
+
+    assert refund[0] and refund[1].startswith('Refund of $5.00 processed successfully.')
+    assert bad_refund == (False, 'Invalid transaction ID')
+    assert status['status'] == 'completed'
+    assert missing == {'status': 'not_found', 'message': 'Transaction not found'}
+
+# Test case 6: an unreachable gateway is reported, not hung on
+def test_unreachable_gateway():
+    async def test():
+        async with AsyncPaymentGateway(base_url='http://127.0.0.1:9', retries=1, backoff=0.01) as gateway:
+            return await gateway.process_payments([('123456', 5.0)])
+
+    (success, _, message), = run(test())
+
+    assert not success
+    assert 'Gateway request failed after 2 attempts' in message
+
+# Test case 7: a gateway that never answers times out on every attempt and is retried
+def test_hung_gateway_times_out():
+    async def test(server):
+        async with AsyncPaymentGateway(base_url=server.base_url, retries=2, backoff=0.01,
+                                       timeout=0.05) as gateway:
+            started = time.perf_counter()
+            with pytest.raises(PaymentGatewayError) as error:
+                await gateway.process_payment('123456', 5.0)
+            return error.value, time.perf_counter() - started, gateway.stats()
+
+    error, elapsed, stats = run(with_server(test, latency=1.0))
+
+    assert 'failed after 3 attempts (TimeoutError)' in str(error)
+    assert stats['requests'] == 3 and stats['retries'] == 2 and stats['errors'] == 1
+    assert elapsed < 1.0
@@ -0,0 +1,95 @@
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db_utils import temp_database, add_book
+from services.library_service import borrow_books_by_patron, return_books_by_patron
+from app import create_app
+
+
+@pytest.fixture
+def db(tmp_path):
+    # A single pooled connection so the trace callback sees every statement
+    with temp_database(tmp_path / 'batch.db', LIBRARY_DB_POOL_SIZE=1) as db:
+        yield db
+
+
+def availability(db, book_id):
+    return db.get_book_by_id(book_id)['available_copies']
+
+# Test case 1: a stack is borrowed with per-book results and one commit
+def test_batch_borrow(db):
+    first = add_book('First', 'Author', '9780000000001', copies=2)
+    second = add_book('Second', 'Author', '9780000000002', copies=1)
+    statements = []
+    conn = db.get_db_connection()
+    conn.set_trace_callback(statements.append)
+    conn.close()
+
+    success, message, results = borrow_books_by_patron('123456', [first, second, second, 999])
+
+    assert not success
+    assert message == 'Borrowed 2 of 4 books.'
+    assert [r['success'] for r in results] == [True, True, False, False]
+    assert results[2]['message'] == 'This book is currently not available.'
+    assert results[3]['message'] == 'Book not found.'
+    assert statements.count('COMMIT') == 1
+    assert availability(db, first) == 1 and availability(db, second) == 0
+    assert db.get_patron_borrow_count('123456') == 2
+
+# Test case 2: the borrow limit is applied across the stack
+def test_batch_borrow_limit(db):
+    book_id = add_book(copies=10)
+
+    success, message, results = borrow_books_by_patron('123456', [book_id] * 8)
+
+    assert [r['success'] for r in results] == [True] * 6 + [False] * 2
+    assert results[-1]['message'] == 'You have reached the maximum borrowing limit of 5 books.'
+    assert availability(db, book_id) == 4
+
+# Test case 3: a stack is returned, oldest loans first, with fees assessed together
+def test_batch_return(db):
+    late = add_book('Late', 'Author', '9780000000001', copies=2)
+    on_time = add_book('On Time', 'Author', '9780000000002', copies=1)
+    now = datetime.now()
+    db.insert_borrow_record('123456', late, now - timedelta(days=24), now - timedelta(days=10))
+    db.insert_borrow_record('123456', on_time, now - timedelta(days=2), now + timedelta(days=12))
+
+    success, message, results = return_books_by_patron('123456', [late, on_time, late])
+
+    assert message == 'Returned 2 of 3 books. Total late fees: $6.50.'
+    assert [r['fee_amount'] for r in results] == [6.5, 0.0, 0.0]
+    assert results[2]['message'] == 'No active borrow record found for this book and patron.'
+    assert db.get_patron_borrow_count('123456') == 0
+    assert availability(db, late) == 3
+    conn = db.get_db_connection()
+    try:
+        assert conn.execute("SELECT fees_assessed FROM patrons WHERE patron_id = '123456'").fetchone()[0] == 6.5
+    finally:
+        conn.close()
+
+# Test case 4: the request is validated once, before any database work
+def test_batch_validation(db):
+    assert borrow_books_by_patron('12', [1])[1] == 'Invalid patron ID. Must be exactly 6 digits.'
+    assert borrow_books_by_patron('123456', [])[1] == 'At least one book is required.'
+    assert return_books_by_patron('123456', list(range(51)))[1] == 'At most 50 books can be processed at once.'
+    assert return_books_by_patron('123456', ['1'])[1] == 'Book IDs must be integers.'
+
+# Test case 5: JSON endpoints for checkout desks
+def test_batch_api(tmp_path):
+    path = tmp_path / 'api.db'
+    with temp_database(path):
+        client = create_app({'LIBRARY_DB_PATH': str(path)}).test_client()
+        book_id = add_book('Desk Book', 'Author', '9780000000099', copies=3)
+
+        borrowed = client.post('/api/patrons/222222/borrow', json={'book_ids': [book_id, book_id]}).get_json()
+        returned = client.post('/api/patrons/222222/return', json={'book_ids': [book_id]}).get_json()
+
+        assert borrowed['success'] and len(borrowed['results']) == 2
+        assert returned['success'] and returned['total_late_fees'] == 0.0
+        assert client.post('/api/patrons/222222/borrow', json={'ids': [1]}).status_code == 400
+        assert client.post('/api/patrons/22/return', json={'book_ids': [1]}).status_code == 400
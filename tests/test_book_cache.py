@@ -0,0 +1,138 @@
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cache import LRUCache
+from db_utils import temp_database, add_book
+from services.library_service import add_book_to_catalog, borrow_book_by_patron, return_book_by_patron
+
+
+@pytest.fixture
+def db(tmp_path):
+    # A single pooled connection so the trace callback sees every query
+    with temp_database(tmp_path / 'cache.db', LIBRARY_DB_POOL_SIZE=1) as db:
+        yield db
+
+
+def count_queries(db):
+    """Record book queries on the pooled connection (pool pings are skipped)."""
+    statements = []
+    conn = db.get_db_connection()
+    conn.set_trace_callback(lambda s: s != 'SELECT 1' and statements.append(s))
+    conn.close()
+    return statements
+
+# Test case 1: least recently used entries are evicted first and counted
+def test_lru_eviction():
+    cache = LRUCache(max_entries=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, 1)
+    assert cache.stats()['evictions'] == 1
+
+# Test case 2: entries expire after the TTL
+def test_ttl_expiry():
+    cache = LRUCache(max_entries=10, ttl=0)
+    cache.set('a', 1)
+
+    assert cache.get('a') == (False, None)
+    assert cache.stats()['expirations'] == 1
+
+# Test case 3: set() with a generation taken before an invalidation stores nothing
+def test_set_skipped_after_invalidation():
+    cache = LRUCache(max_entries=10, ttl=60)
+    generation = cache.generation()
+    cache.delete('a')
+    cache.set('a', 'stale', generation)
+    cache.set('b', 'fresh', cache.generation())
+
+    assert cache.get('a') == (False, None)
+    assert cache.get('b') == (True, 'fresh')
+
+# Test case 4: repeated lookups by id and ISBN are served without SQL
+def test_repeated_lookups_hit_cache(db):
+    book_id = add_book(copies=2)
+    db.get_book_by_id(book_id)
+    statements = count_queries(db)
+
+    assert db.get_book_by_id(book_id)['id'] == book_id
+    assert db.get_book_by_isbn('1234567890123')['id'] == book_id
+    assert statements == []
+    assert db.get_book_cache_stats()['hits'] >= 2
+
+# Test case 5: callers cannot corrupt the cached copy
+def test_cached_book_is_copied(db):
+    book_id = add_book()
+    db.get_book_by_id(book_id)['title'] = 'Changed'
+
+    assert db.get_book_by_id(book_id)['title'] == 'Test Book'
+
+# Test case 6: borrow and return invalidate the cached availability
+def test_borrow_return_invalidate(db):
+    book_id = add_book(copies=2)
+    assert db.get_book_by_id(book_id)['available_copies'] == 2
+
+    borrow_book_by_patron('123456', book_id)
+    assert db.get_book_by_id(book_id)['available_copies'] == 1
+
+    return_book_by_patron('123456', book_id)
+    assert db.get_book_by_id(book_id)['available_copies'] == 2
+
+    db.update_book_availability(book_id, -1)
+    assert db.get_book_by_id(book_id)['available_copies'] == 1
+
+# Test case 7: a cached "no such ISBN" is dropped when the book is inserted
+def test_insert_clears_negative_entry(db):
+    assert db.get_book_by_isbn('9780000000001') is None
+
+    success, _ = add_book_to_catalog('New Book', 'Author', '9780000000001', 1)
+
+    assert success
+    assert db.get_book_by_isbn('9780000000001')['title'] == 'New Book'
+
+# Test case 8: the cache can be switched off
+def test_cache_disabled(tmp_path):
+    with temp_database(tmp_path / 'off.db', LIBRARY_DB_POOL_SIZE=1, LIBRARY_BOOK_CACHE_ENABLED='false') as db:
+        book_id = add_book()
+        db.get_book_by_id(book_id)
+        statements = count_queries(db)
+
+        db.get_book_by_id(book_id)
+
+        assert len(statements) == 1
+        assert db.get_book_cache_stats()['enabled'] is False
+
+# Test case 9: a row read before a concurrent write commits is not cached after its invalidation
+def test_stale_read_is_not_cached(tmp_path):
+    with temp_database(tmp_path / 'race.db') as db:
+        book_id = add_book()
+        writes = []
+
+        def concurrent_rename(sql, parameters, elapsed):
+            # Runs right after the lookup's SELECT, before its result is cached
+            if sql.lstrip().startswith('SELECT * FROM books') and not writes:
+                writes.append(sql)
+                conn = db.get_db_connection()
+                try:
+                    conn.execute("UPDATE books SET title = 'Renamed' WHERE id = ?", (book_id,))
+                    conn.commit()
+                finally:
+                    conn.close()
+                db.invalidate_book_cache(book_id, '1234567890123')
+
+        db.add_statement_observer(concurrent_rename)
+        try:
+            assert db.get_book_by_id(book_id)['title'] == 'Test Book'
+        finally:
+            db.remove_statement_observer(concurrent_rename)
+
+        assert db.get_book_by_id(book_id)['title'] == 'Renamed'
+        assert db.get_book_by_isbn('1234567890123')['title'] == 'Renamed'
@@ -0,0 +1,74 @@
+import pytest
+import sys
+import os
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db_utils import temp_database, add_book
+from app import create_app
+from services.library_service import borrow_book_by_patron
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / 'api.db'
+    with temp_database(path):
+        app = create_app({'LIBRARY_DB_PATH': str(path)})
+        for i in range(4):
+            add_book(f'API Book {i}', 'Author', f'97822222222{i:02d}', copies=2)
+        yield app.test_client()
+
+# Test case 1: following next_cursor walks the catalog in id order without repeats
+def test_list_books_cursor_pagination(client):
+    ids = []
+    url = '/api/books?limit=3'
+    while url:
+        data = client.get(url).get_json()
+        ids += [book['id'] for book in data['books']]
+        url = f"/api/books?limit=3&cursor={data['next_cursor']}" if data['next_cursor'] else None
+
+    assert ids == sorted(ids)
+    assert len(ids) == len(set(ids)) == 7  # 3 sample books + 4 added
+
+# Test case 2: fields= projects columns (id is always included as the cursor key)
+def test_list_books_field_projection(client):
+    data = client.get('/api/books?fields=available_copies').get_json()
+
+    assert set(data['books'][0]) == {'id', 'available_copies'}
+
+# Test case 3: unknown fields and malformed cursors are rejected
+def test_list_books_bad_parameters(client):
+    assert client.get('/api/books?fields=id,password').status_code == 400
+    assert client.get('/api/books?cursor=not-a-cursor').status_code == 400
+
+# Test case 4: an unchanged catalog revalidates with 304, a borrow changes the ETag
+def test_list_books_etag(client):
+    first = client.get('/api/books?fields=id,available_copies')
+    etag = first.headers['ETag']
+
+    unchanged = client.get('/api/books?fields=id,available_copies', headers={'If-None-Match': etag})
+    assert unchanged.status_code == 304
+    assert unchanged.data == b''
+
+    assert borrow_book_by_patron('123456', 1)[0]
+    changed = client.get('/api/books?fields=id,available_copies', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+# Test case 5: different projections of the same catalog version get different ETags
+def test_etag_depends_on_representation(client):
+    full = client.get('/api/books').headers['ETag']
+    projected = client.get('/api/books?fields=id').headers['ETag']
+
+    assert full != projected
+
+# Test case 6: single book lookup, projection, 404 and 304
+def test_get_single_book(client):
+    response = client.get('/api/books/1?fields=title')
+    assert response.get_json() == {'id': 1, 'title': 'The Great Gatsby'}
+
+    revalidated = client.get('/api/books/1?fields=title', headers={'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+
+    assert client.get('/api/books/99999').status_code == 404
@@ -0,0 +1,128 @@
+import pytest
+import io
+import json
+import sys
+import os
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db_utils import temp_database, add_book
+from services.import_service import import_books, detect_format
+from app import create_app
+
+
+@pytest.fixture
+def db(tmp_path):
+    with temp_database(tmp_path / 'import.db') as db:
+        yield db
+
+
+def marc_record(title, author, isbn):
+    """Build a minimal UTF-8 MARC 21 record with 020, 100 and 245 fields."""
+    fields = [
+        ('020', f'  \x1fa{isbn} (pbk.)'),
+        ('100', f'1 \x1fa{author},'),
+        ('245', f'10\x1fa{title} /\x1fcby {author}.'),
+    ]
+    directory = b''
+    data = b''
+    for tag, value in fields:
+        encoded = value.encode() + b'\x1e'
+        directory += f'{tag}{len(encoded):04d}{len(data):05d}'.encode()
+        data += encoded
+    base = 24 + len(directory) + 1
+    length = base + len(data) + 1
+    leader = f'{length:05d}nam a22{base:05d} a 4500'.encode()
+    return leader + directory + b'\x1e' + data + b'\x1d'
+
+
+def csv_file(*rows):
+    return io.BytesIO(('title,author,isbn,total_copies\n' + ''.join(f'{r}\n' for r in rows)).encode())
+
+# Test case 1: valid CSV rows are inserted across several batches
+def test_import_csv(db):
+    rows = [f'Book {i},Author {i},97800000001{i:02d},{i % 3 + 1}' for i in range(25)]
+
+    result = import_books(csv_file(*rows), 'csv', batch_size=10)
+
+    assert result['rows'] == result['inserted'] == 25
+    assert result['failed'] == 0
+    assert db.get_book_by_isbn('9780000000107')['total_copies'] == 2
+    assert result['rows_per_second'] > 0
+
+# Test case 2: each bad row is reported with its row number and R1 message
+def test_import_reports_row_errors(db):
+    add_book('Existing', 'Author', '9780000000999')
+
+    result = import_books(csv_file(
+        'Good Book,Author,978-0-00-000000-1,2',
+        ',Author,9780000000002,1',
+        'Short ISBN,Author,12345,1',
+        'Bad Copies,Author,9780000000003,zero',
+        'Repeat,Author,9780000000001,1',
+        'Existing Again,Author,9780000000999,1',
+    ), 'csv')
+
+    assert result['inserted'] == 1
+    assert [(e['row'], e['error']) for e in result['errors']] == [
+        (2, 'Title is required.'),
+        (3, 'ISBN must be exactly 13 digits.'),
+        (4, 'Total copies must be a positive integer.'),
+        (5, 'Duplicate ISBN in import file.'),
+        (6, 'A book with this ISBN already exists.'),
+    ]
+    assert db.get_book_by_isbn('9780000000001')['title'] == 'Good Book'
+
+# Test case 3: JSON Lines, including a malformed line
+def test_import_jsonl(db):
+    lines = [json.dumps({'title': 'Json Book', 'author': 'Author', 'isbn': '9780000000011', 'total_copies': 4}),
+             '{not json',
+             json.dumps({'title': 'No Copies', 'author': 'Author', 'isbn': '9780000000012'})]
+
+    result = import_books(io.BytesIO('\n'.join(lines).encode()), 'jsonl', default_copies=2)
+
+    assert result['inserted'] == 2
+    assert result['errors'][0]['row'] == 2
+    assert db.get_book_by_isbn('9780000000012')['total_copies'] == 2
+
+# Test case 4: MARC 21 records map 245/100/020 to title/author/ISBN
+def test_import_marc(db):
+    data = marc_record('The Great Gatsby', 'Fitzgerald, F. Scott', '9780743273565') + \
+        marc_record('Café Society', 'Émile Zola', '978-0-14-044-1')
+
+    result = import_books(io.BytesIO(data), 'marc')
+
+    assert result['inserted'] == 1
+    book = db.get_book_by_isbn('9780743273565')
+    assert (book['title'], book['author']) == ('The Great Gatsby', 'Fitzgerald, F. Scott')
+    assert result['errors'][0]['error'] == 'ISBN must be exactly 13 digits.'
+
+    # A record length shorter than the leader itself cannot be read past
+    short = marc_record('Short', 'Author', '9780000000036')
+    result = import_books(io.BytesIO(b'00010' + short[5:] + marc_record('Next', 'Author', '9780000000043')), 'marc')
+    assert (result['rows'], result['inserted']) == (1, 0)
+    assert result['errors'][0]['error'] == 'Invalid MARC leader; import stopped.'
+
+# Test case 5: /api/books/bulk accepts uploads and raw bodies
+def test_bulk_import_api(tmp_path):
+    path = tmp_path / 'api.db'
+    with temp_database(path):
+        client = create_app({'LIBRARY_DB_PATH': str(path)}).test_client()
+
+        response = client.post('/api/books/bulk', data={'file': (csv_file('Api Book,Author,9780000000021,1'), 'books.csv')})
+        assert response.status_code == 200
+        assert response.get_json()['inserted'] == 1
+
+        body = json.dumps({'title': 'Raw Book', 'author': 'Author', 'isbn': '9780000000022'})
+        response = client.post('/api/books/bulk', data=body, content_type='application/x-ndjson')
+        assert response.get_json()['inserted'] == 1
+
+        assert client.post('/api/books/bulk', data='x', content_type='text/plain').status_code == 400
+
+# Test case 6: formats are detected from file extensions
+def test_detect_format():
+    assert detect_format('books.CSV') == 'csv'
+    assert detect_format('books.ndjson') == 'jsonl'
+    assert detect_format('records.mrc') == 'marc'
+    assert detect_format('books.xlsx') is None
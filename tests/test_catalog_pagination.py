@@ -0,0 +1,91 @@
+import pytest
+import sys
+import os
+import re
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db_utils import temp_database, add_book
+from database import get_books_page, get_pool, iter_books
+from app import create_app
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    with temp_database(tmp_path / 'catalog.db'):
+        # Duplicate titles make sure the id tie-breaker is part of the cursor
+        for i in range(7):
+            add_book(f'Book {i // 2}', 'Author', f'97800000000{i:02d}')
+        yield
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / 'app.db'
+    with temp_database(path):
+        app = create_app({'LIBRARY_DB_PATH': str(path)})
+        for i in range(5):
+            add_book(f'Paged Book {i}', 'Author', f'97811111111{i:02d}')
+        yield app.test_client()
+
+
+def keys(books):
+    return [(book['title'], book['id']) for book in books]
+
+# Test case 1: walking forward with the cursor visits every book once, in order
+def test_keyset_pages_cover_catalog(catalog):
+    seen = []
+    books, has_more = get_books_page(limit=3)
+    seen += keys(books)
+    while has_more:
+        books, has_more = get_books_page(after=seen[-1], limit=3)
+        seen += keys(books)
+
+    assert seen == sorted(seen)
+    assert len(seen) == len(set(seen)) == 7
+
+# Test case 2: the before-cursor returns the previous page in ascending order
+def test_keyset_previous_page(catalog):
+    first, _ = get_books_page(limit=3)
+    second, _ = get_books_page(after=keys(first)[-1], limit=3)
+
+    previous, has_more = get_books_page(before=keys(second)[0], limit=3)
+
+    assert keys(previous) == keys(first)
+    assert has_more is False
+
+# Test case 3: iter_books streams the same rows in the same order in small batches
+def test_iter_books_matches_pages(catalog):
+    streamed = keys(iter_books(batch_size=2))
+    paged, _ = get_books_page(limit=100)
+
+    assert streamed == keys(paged)
+
+    # Between batches the generator holds no pooled connection
+    stream = iter_books(batch_size=2)
+    next(stream)
+    assert get_pool().stats()['in_use'] == 0
+    stream.close()
+
+# Test case 4: /catalog renders one page with a working next link
+def test_catalog_route_paginates(client):
+    response = client.get('/catalog?limit=4')
+    html = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert html.count('name="book_id"') <= 4
+    next_url = re.search(r'href="([^"]*after_id=[^"]*)"', html).group(1).replace('&amp;', '&')
+
+    html = client.get(next_url).get_data(as_text=True)
+    assert 'Previous' in html
+    assert 'Next' not in html
+
+# Test case 5: /catalog?stream=1 streams the whole catalog
+def test_catalog_route_streams(client):
+    response = client.get('/catalog?stream=1')
+
+    assert response.is_streamed
+    html = response.get_data(as_text=True)
+    assert all(f'Paged Book {i}' in html for i in range(5))
+    assert 'Next' not in html
@@ -0,0 +1,88 @@
+import pytest
+import sys
+import os
+import threading
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db_utils import temp_database, add_book
+from database import get_db_connection
+from services.library_service import borrow_book_by_patron, return_book_by_patron
+
+
+@pytest.fixture
+def db(tmp_path):
+    with temp_database(tmp_path / 'stress.db', LIBRARY_DB_POOL_SIZE=8) as db:
+        yield db
+
+
+def run_concurrently(target, args_list):
+    """Start one thread per argument tuple behind a barrier and collect results."""
+    barrier = threading.Barrier(len(args_list))
+    results = [None] * len(args_list)
+
+    def worker(index, args):
+        barrier.wait()
+        results[index] = target(*args)
+
+    threads = [threading.Thread(target=worker, args=(i, args)) for i, args in enumerate(args_list)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def book_state(book_id):
+    conn = get_db_connection()
+    try:
+        available = conn.execute('SELECT available_copies FROM books WHERE id = ?',
+                                 (book_id,)).fetchone()[0]
+        active = conn.execute('SELECT COUNT(*) FROM borrow_records WHERE book_id = ? AND return_date IS NULL',
+                              (book_id,)).fetchone()[0]
+    finally:
+        conn.close()
+    return available, active
+
+# Test case 1: many patrons racing for the last copies - exactly `copies` borrows succeed
+def test_concurrent_borrows_never_oversell(db):
+    book_id = add_book(copies=3)
+    patrons = [(f'{100000 + i}', book_id) for i in range(24)]
+
+    results = run_concurrently(borrow_book_by_patron, patrons)
+
+    assert sum(1 for success, _ in results if success) == 3
+    assert book_state(book_id) == (0, 3)
+
+# Test case 2: interleaved borrows and returns keep availability and open loans consistent
+def test_concurrent_borrow_and_return_stay_consistent(db):
+    book_id = add_book(copies=5)
+    patrons = [f'{200000 + i}' for i in range(5)]
+    for patron_id in patrons:
+        assert borrow_book_by_patron(patron_id, book_id)[0]
+
+    returners = [(patron_id, book_id) for patron_id in patrons]
+    borrowers = [(f'{300000 + i}', book_id) for i in range(10)]
+    results = run_concurrently(
+        lambda action, patron_id, book_id: action(patron_id, book_id),
+        [(return_book_by_patron, p, b) for p, b in returners] +
+        [(borrow_book_by_patron, p, b) for p, b in borrowers])
+
+    returned = sum(1 for success, _ in results[:5] if success)
+    borrowed = sum(1 for success, _ in results[5:] if success)
+    assert returned == 5
+    available, active = book_state(book_id)
+    assert available >= 0
+    assert available + active == 5
+    assert active == borrowed
+
+# Test case 3: the same loan cannot be returned twice by racing requests
+def test_concurrent_double_return(db):
+    book_id = add_book(copies=1)
+    assert borrow_book_by_patron('123456', book_id)[0]
+
+    results = run_concurrently(return_book_by_patron, [('123456', book_id)] * 6)
+
+    assert sum(1 for success, _ in results if success) == 1
+    assert book_state(book_id) == (1, 0)
@@ -0,0 +1,55 @@
+import pytest
+import sys
+import os
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+from db_utils import temp_database
+from config import load_storage_config, DEFAULT_STORAGE_CONFIG
+
+# Test case 1: defaults are used when nothing is overridden
+def test_load_storage_config_defaults(monkeypatch):
+    for key in DEFAULT_STORAGE_CONFIG:
+        monkeypatch.delenv(key, raising=False)
+
+    config = load_storage_config()
+
+    assert config == DEFAULT_STORAGE_CONFIG
+
+# Test case 2: environment variables override defaults, app config overrides both
+def test_load_storage_config_precedence(monkeypatch):
+    monkeypatch.setenv('LIBRARY_DB_PATH', '/tmp/env.db')
+    monkeypatch.setenv('LIBRARY_DB_POOL_SIZE', '8')
+    monkeypatch.setenv('LIBRARY_DB_SYNCHRONOUS', 'full')
+
+    config = load_storage_config({'LIBRARY_DB_PATH': '/tmp/app.db', 'SECRET_KEY': 'x'})
+
+    assert config['LIBRARY_DB_PATH'] == '/tmp/app.db'
+    assert config['LIBRARY_DB_POOL_SIZE'] == 8
+    assert config['LIBRARY_DB_SYNCHRONOUS'] == 'FULL'
+    assert 'SECRET_KEY' not in config
+
+# Test case 3: invalid PRAGMA values are rejected
+@pytest.mark.parametrize('key, value', [
+    ('LIBRARY_DB_JOURNAL_MODE', 'WAL; DROP TABLE books'),
+    ('LIBRARY_DB_SYNCHRONOUS', 'sometimes'),
+    ('LIBRARY_DB_CACHE_SIZE', 'lots'),
+    ('LIBRARY_DB_POOL_SIZE', 0),
+])
+def test_load_storage_config_invalid_values(key, value):
+    with pytest.raises(ValueError):
+        load_storage_config({key: value})
+
+# Test case 4: init_database() switches the file to WAL and connections get the tuned PRAGMAs
+def test_init_database_applies_wal_and_pragmas(tmp_path):
+    with temp_database(tmp_path / 'wal.db', LIBRARY_DB_BUSY_TIMEOUT=1234):
+        conn = database.get_db_connection()
+        try:
+            assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+            assert conn.execute('PRAGMA busy_timeout').fetchone()[0] == 1234
+            assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+            assert conn.execute('PRAGMA temp_store').fetchone()[0] == 2   # MEMORY
+        finally:
+            conn.close()
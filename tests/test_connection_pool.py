@@ -0,0 +1,93 @@
+import pytest
+import sys
+import os
+import sqlite3
+import threading
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from database import ConnectionPool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), max_size=2, timeout=0.2)
+    yield pool
+    pool.close()
+
+# Test case 1: close() returns the connection to the pool and it is reused
+def test_closed_connection_is_reused(pool):
+    conn = pool.acquire()
+    conn.close()
+    again = pool.acquire()
+
+    assert again is conn
+    stats = pool.stats()
+    assert stats['created'] == 1
+    assert stats['checkouts'] == 2
+    assert stats['in_use'] == 1
+
+# Test case 2: the pool never opens more than max_size connections
+def test_pool_is_bounded(pool):
+    first = pool.acquire()
+    second = pool.acquire()
+
+    with pytest.raises(sqlite3.OperationalError):
+        pool.acquire()
+
+    assert pool.stats()['timeouts'] == 1
+    assert pool.stats()['size'] == 2
+    first.close()
+    second.close()
+
+# Test case 3: a waiting thread gets the connection as soon as it is checked in
+def test_waiter_receives_released_connection(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), max_size=1, timeout=5)
+    conn = pool.acquire()
+    acquired = []
+
+    worker = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+    worker.start()
+    conn.close()
+    worker.join(timeout=5)
+
+    assert acquired == [conn]
+    assert pool.stats()['wait_time_max'] > 0
+    pool.close()
+
+# Test case 4: uncommitted work is rolled back on checkin
+def test_release_rolls_back_open_transaction(pool):
+    conn = pool.acquire()
+    conn.execute('CREATE TABLE t (x INTEGER)')
+    conn.commit()
+    conn.execute('INSERT INTO t VALUES (1)')
+    conn.close()
+
+    conn = pool.acquire()
+    assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0
+    conn.close()
+
+# Test case 5: a broken idle connection fails the health check and is replaced
+def test_unhealthy_connection_is_discarded(pool):
+    conn = pool.acquire()
+    conn.close()
+    sqlite3.Connection.close(conn)
+
+    fresh = pool.acquire()
+
+    assert fresh is not conn
+    assert fresh.execute('SELECT 1').fetchone()[0] == 1
+    assert pool.stats()['discarded'] == 1
+    fresh.close()
+
+# Test case 6: closing a connection twice does not check it in twice
+def test_double_close_is_ignored(pool):
+    conn = pool.acquire()
+    conn.close()
+    conn.close()
+
+    stats = pool.stats()
+    assert stats['checkins'] == 1
+    assert stats['idle'] == 1
+    assert stats['in_use'] == 0
@@ -0,0 +1,87 @@
+import pytest
+import csv
+import gzip
+import io
+import json
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db_utils import temp_database, add_book
+from database import get_pool
+from services.export_service import export_table
+from app import create_app
+
+
+@pytest.fixture
+def db(tmp_path):
+    with temp_database(tmp_path / 'export.db') as db:
+        for i in range(7):
+            add_book(f'Book {i}, "quoted"', 'Author', f'97800000000{i:02d}', copies=2)
+        db.insert_borrow_record('123456', 1, datetime(2024, 1, 1), datetime(2024, 1, 15))
+        yield db
+
+
+def read(chunks):
+    return b''.join(chunks).decode()
+
+# Test case 1: CSV export in small batches has a header and every row, in id order
+def test_export_csv(db):
+    rows = list(csv.reader(io.StringIO(read(export_table('books', 'csv', batch_size=3)))))
+
+    assert rows[0] == ['id', 'title', 'author', 'isbn', 'total_copies', 'available_copies']
+    assert [row[0] for row in rows[1:]] == [str(i) for i in range(1, 8)]
+    assert rows[1][1] == 'Book 0, "quoted"'
+
+# Test case 2: JSON Lines export keeps column names and NULLs
+def test_export_jsonl(db):
+    lines = read(export_table('borrow_records', 'jsonl')).splitlines()
+
+    record = json.loads(lines[0])
+    assert len(lines) == 1
+    assert record['patron_id'] == '123456'
+    assert record['return_date'] is None
+
+# Test case 3: gzip output decompresses to the plain export
+def test_export_gzip(db):
+    plain = read(export_table('patrons', 'csv'))
+    compressed = b''.join(export_table('patrons', 'csv', compress=True, batch_size=1))
+
+    assert gzip.decompress(compressed).decode() == plain
+    assert plain.splitlines()[1] == '123456,1,0.0'
+
+# Test case 4: unsupported tables and formats are rejected before any query
+def test_export_rejects_unknown_table(db):
+    with pytest.raises(ValueError):
+        export_table('sqlite_master')
+    with pytest.raises(ValueError):
+        export_table('books', 'xml')
+
+# Test case 5: no pooled connection is held between batches; each row is exported once
+def test_export_releases_connection_between_batches(db):
+    chunks = export_table('books', 'csv', batch_size=7)
+    first = next(chunks)
+    assert get_pool().stats()['in_use'] == 0
+    add_book('Added mid-export', 'Author', '9780000000099')
+    rows = list(csv.reader(io.StringIO(read([first, *chunks]))))
+
+    assert [row[0] for row in rows[1:]] == [str(i) for i in range(1, 9)]
+
+# Test case 6: /api/export/<table> streams a download
+def test_export_api(tmp_path):
+    path = tmp_path / 'api.db'
+    with temp_database(path):
+        client = create_app({'LIBRARY_DB_PATH': str(path)}).test_client()
+        add_book('Streamed', 'Author', '9780000000001')
+
+        response = client.get('/api/export/books?format=jsonl&gzip=1')
+        assert response.is_streamed
+        assert response.headers['Content-Disposition'] == 'attachment; filename="books.jsonl.gz"'
+        titles = [json.loads(line)['title'] for line in gzip.decompress(response.get_data()).splitlines()]
+        assert 'Streamed' in titles
+
+        assert client.get('/api/export/schema_version').status_code == 404
+        assert client.get('/api/export/books?format=xml').status_code == 400
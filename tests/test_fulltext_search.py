@@ -0,0 +1,95 @@
+import pytest
+import sys
+import os
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db_utils import temp_database, add_book
+from database import get_db_connection, search_books_fulltext
+from migrations import rebuild_fulltext_index
+from services.library_service import search_books_in_catalog
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    with temp_database(tmp_path / 'fts.db'):
+        add_book('The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565')
+        add_book('Tender Is the Night', 'F. Scott Fitzgerald', '9780684801544')
+        add_book('Great Expectations', 'Charles Dickens', '9780141439563')
+        add_book('Scott Pilgrim', 'Bryan Lee O\'Malley', '9781932664089')
+        yield
+
+
+def titles(results):
+    return [book['title'] for book in results]
+
+# Test case 1: partial words match as prefixes, all words must match
+def test_fulltext_prefix_and_all_terms(catalog):
+    assert titles(search_books_fulltext('gats')) == ['The Great Gatsby']
+    assert set(titles(search_books_fulltext('great fitz'))) == {'The Great Gatsby'}
+
+# Test case 2: title matches rank above author-only matches
+def test_fulltext_ranks_title_above_author(catalog):
+    results = search_books_fulltext('scott')
+
+    assert results[0]['title'] == 'Scott Pilgrim'
+    assert len(results) == 3
+
+# Test case 3: when no book has every word, books with any of the words are returned
+def test_fulltext_falls_back_to_any_term(catalog):
+    results = search_books_fulltext('dickens gatsby')
+
+    assert set(titles(results)) == {'The Great Gatsby', 'Great Expectations'}
+
+# Test case 4: highlights wrap matches in <mark> and escape the stored text
+def test_fulltext_highlight_is_escaped(catalog):
+    add_book('<b>Great</b> & Bold', 'Anon', '9780000000001')
+
+    results = search_books_fulltext('bold')
+
+    assert results[0]['title_highlight'] == '&lt;b&gt;Great&lt;/b&gt; &amp; <mark>Bold</mark>'
+
+# Test case 5: FTS query syntax typed by a user is treated as plain words
+def test_fulltext_ignores_query_syntax(catalog):
+    assert titles(search_books_fulltext('"great" OR NEAR(')) != []
+    assert search_books_fulltext('*** ---') == []
+
+# Test case 6: triggers keep the index in sync with title changes and deletes
+def test_fulltext_triggers_follow_books_table(catalog):
+    conn = get_db_connection()
+    try:
+        conn.execute("UPDATE books SET title = 'The Lost Gatsby' WHERE isbn = '9780743273565'")
+        conn.execute("DELETE FROM books WHERE isbn = '9780141439563'")
+        conn.commit()
+    finally:
+        conn.close()
+
+    assert titles(search_books_fulltext('lost')) == ['The Lost Gatsby']
+    assert titles(search_books_fulltext('expectations')) == []
+
+# Test case 7: rebuild restores an index that was dropped or drifted
+def test_rebuild_fulltext_index(catalog):
+    conn = get_db_connection()
+    try:
+        conn.execute('DROP TABLE books_fts')
+        conn.commit()
+        rebuild_fulltext_index(conn)
+    finally:
+        conn.close()
+
+    assert titles(search_books_fulltext('tender')) == ['Tender Is the Night']
+
+# Test case 8: the service exposes full-text search as the 'any' / 'fulltext' types
+def test_search_books_in_catalog_any_type(catalog):
+    assert titles(search_books_in_catalog('night', 'any')) == ['Tender Is the Night']
+    assert titles(search_books_in_catalog('night', 'fulltext')) == ['Tender Is the Night']
+
+# Test case 9: pages past the last all-words match stay empty instead of switching to any-word results
+def test_fulltext_pages_come_from_one_query(catalog):
+    assert titles(search_books_fulltext('great fitz', limit=1, offset=0)) == ['The Great Gatsby']
+    assert search_books_fulltext('great fitz', limit=1, offset=1) == []
+
+    any_word = titles(search_books_fulltext('gatsby dickens', limit=10))
+    assert set(any_word) == {'The Great Gatsby', 'Great Expectations'}
+    assert titles(search_books_fulltext('gatsby dickens', limit=1, offset=1)) == any_word[1:]
@@ -0,0 +1,75 @@
+import pytest
+import random
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db_utils import temp_database, add_book
+from services.library_service import (
+    LATE_FEE_BY_DAYS, calculate_late_fees_batch, calculate_late_fee_for_book, compute_late_fee
+)
+
+
+@pytest.fixture
+def loans(tmp_path):
+    """Open loans for 20 patrons, due anywhere from 10 days ahead to 40 days ago."""
+    with temp_database(tmp_path / 'fees.db') as db:
+        rng = random.Random(7)
+        now = datetime.now()
+        book_ids = [add_book(f'Book {i}', 'Author', f'97800000000{i:02d}', copies=50) for i in range(10)]
+        loans = []
+        for patron in range(20):
+            patron_id = f'{100000 + patron}'
+            for book_id in rng.sample(book_ids, rng.randint(1, 5)):
+                due_date = now - timedelta(days=rng.randint(-10, 40), hours=rng.randint(0, 23))
+                db.insert_borrow_record(patron_id, book_id, due_date - timedelta(days=14), due_date)
+                loans.append((patron_id, book_id, due_date))
+        # A returned overdue loan is not billed
+        db.insert_borrow_record('999999', book_ids[0], now - timedelta(days=60), now - timedelta(days=46))
+        db.update_borrow_record_return_date('999999', book_ids[0], now - timedelta(days=40))
+        yield loans
+
+# Test case 1: the fee table agrees with the per-loan schedule, including the cap
+def test_fee_table_matches_schedule():
+    due_date = datetime(2024, 1, 1)
+    for days in range(60):
+        expected, _ = compute_late_fee(due_date, due_date + timedelta(days=days))
+        assert LATE_FEE_BY_DAYS[min(days, len(LATE_FEE_BY_DAYS) - 1)] == expected
+    assert LATE_FEE_BY_DAYS[-1] == 15.00
+
+# Test case 2: batch totals equal the looped per-loan computation, in small chunks too
+def test_batch_matches_looped_fees(loans):
+    as_of = datetime.now()
+    expected = {}
+    for patron_id, book_id, due_date in loans:
+        fee_amount, days_overdue = compute_late_fee(due_date, as_of)
+        if as_of > due_date:
+            expected[patron_id] = expected.get(patron_id, 0.0) + fee_amount
+
+    result = calculate_late_fees_batch(as_of, batch_size=7)
+
+    assert {p: info['fee_amount'] for p, info in result['patrons'].items()} == expected
+    assert result['total_fees'] == round(sum(expected.values()), 2)
+    assert result['total_loans'] == sum(1 for _, _, due in loans if as_of > due)
+    assert '999999' not in result['patrons']
+
+# Test case 3: batch totals equal what the per-book API reports
+def test_batch_matches_per_book_api(loans):
+    result = calculate_late_fees_batch()
+
+    for patron_id, info in result['patrons'].items():
+        books = [book_id for p, book_id, _ in loans if p == patron_id]
+        looped = sum(calculate_late_fee_for_book(patron_id, book_id)['fee_amount'] for book_id in books)
+        assert info['fee_amount'] == round(looped, 2)
+
+# Test case 4: an empty library produces an empty run
+def test_batch_with_no_loans(tmp_path):
+    with temp_database(tmp_path / 'empty.db'):
+        result = calculate_late_fees_batch()
+
+    assert result['total_loans'] == 0
+    assert result['total_fees'] == 0.0
+    assert result['patrons'] == {}
@@ -0,0 +1,55 @@
+import pytest
+import sys
+import os
+import sqlite3
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.loadtest import (
+    ENDPOINTS, compare, load_targets, parse_mix, percentile, run_load, seed_database, start_server, summarize
+)
+
+# Test case 1: the seeded database respects copies and the borrow limit, and has overdue loans
+def test_seed_database(tmp_path):
+    path = str(tmp_path / 'seed.db')
+    seed_database(path, books=200, patrons=50, loans=2000, seed=7)
+
+    conn = sqlite3.connect(path)
+    assert conn.execute('SELECT COUNT(*) FROM books').fetchone()[0] == 200
+    assert conn.execute('SELECT COUNT(*) FROM borrow_records').fetchone()[0] == 2000
+    assert conn.execute('SELECT MIN(available_copies) FROM books').fetchone()[0] >= 0
+    assert conn.execute('SELECT MAX(active_loans) FROM patrons').fetchone()[0] <= 5
+    assert conn.execute('''SELECT COUNT(*) FROM borrow_records
+                           WHERE return_date IS NULL AND due_date < datetime('now')''').fetchone()[0] > 0
+    conn.close()
+    assert load_targets(path, seed=7) == load_targets(path, seed=7)
+
+# Test case 2: a short run against a served app exercises every endpoint without server errors
+def test_run_load(tmp_path):
+    path = str(tmp_path / 'load.db')
+    seed_database(path, books=200, patrons=50, loans=500)
+    base_url, process = start_server(path, pool_size=4)
+    try:
+        samples = run_load(base_url, load_targets(path), concurrency=2, duration=1.0)
+    finally:
+        process.terminate()
+        process.join()
+
+    report = summarize(samples, 1.0)
+    assert set(report['endpoints']) == set(ENDPOINTS)
+    assert report['total']['errors'] == 0
+    assert report['endpoints']['borrow']['status_codes'] == {'302': report['endpoints']['borrow']['requests']}
+    assert report['total']['p50_ms'] <= report['total']['p95_ms'] <= report['total']['p99_ms']
+
+# Test case 3: percentiles, mix parsing and regression flags in compare
+def test_report_helpers():
+    assert percentile([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 0.5) == 5
+    assert percentile([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 0.95) == 10
+    assert parse_mix('catalog=2, late_fee') == {'catalog': 2, 'late_fee': 1}
+    with pytest.raises(ValueError):
+        parse_mix('admin=1')
+
+    base = {'total': {'p50_ms': 10, 'p95_ms': 20, 'p99_ms': 30, 'throughput_rps': 100}, 'endpoints': {}}
+    head = {'total': {'p50_ms': 10, 'p95_ms': 25, 'p99_ms': 30, 'throughput_rps': 80}, 'endpoints': {}}
+    assert compare(base, head, tolerance=10) == ['total p95_ms', 'total throughput_rps']
@@ -0,0 +1,113 @@
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import metrics
+from db_utils import temp_database, add_book
+from services.library_service import pay_late_fees
+from services.payment_service import PaymentGateway
+from services.payment_jobs import shutdown_payment_queue
+from app import create_app
+
+
+@pytest.fixture
+def app_db(tmp_path):
+    path = tmp_path / 'metrics.db'
+    with temp_database(path) as db:
+        yield path, db
+    shutdown_payment_queue()
+
+
+def make_client(path, **config):
+    return create_app({'LIBRARY_DB_PATH': str(path), **config}).test_client()
+
+
+def sample(text, line_prefix):
+    """Value of the first exposition line starting with `line_prefix`."""
+    for line in text.splitlines():
+        if line.startswith(line_prefix):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+# Test case 1: histograms render cumulative buckets, +Inf, _sum and _count with escaped labels
+def test_histogram_exposition():
+    registry = metrics.MetricsRegistry()
+    latency = registry.histogram('test_latency_seconds', 'Test latency.', ('path',), (0.1, 1.0))
+    hits = registry.counter('test_hits_total', 'Test hits.', ('path',))
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value, '/a"b')
+    hits.inc('/x', amount=2)
+
+    assert registry.render().splitlines() == [
+        '# HELP test_latency_seconds Test latency.',
+        '# TYPE test_latency_seconds histogram',
+        'test_latency_seconds_bucket{path="/a\\"b",le="0.1"} 1',
+        'test_latency_seconds_bucket{path="/a\\"b",le="1.0"} 2',
+        'test_latency_seconds_bucket{path="/a\\"b",le="+Inf"} 3',
+        'test_latency_seconds_sum{path="/a\\"b"} 5.55',
+        'test_latency_seconds_count{path="/a\\"b"} 3',
+        '# HELP test_hits_total Test hits.',
+        '# TYPE test_hits_total counter',
+        'test_hits_total{path="/x"} 2',
+    ]
+
+# Test case 2: requests are timed per route, with their SQL statements counted
+def test_request_and_sql_metrics(app_db):
+    path, db = app_db
+    client = make_client(path)
+    before = metrics.REQUEST_DURATION.count('/api/books/<int:book_id>', 'GET')
+
+    response = client.get('/api/books/1')
+    client.get('/api/books/1')
+    client.get('/no/such/page')
+
+    assert 'sql;dur=' in response.headers['Server-Timing']
+    assert metrics.REQUEST_DURATION.count('/api/books/<int:book_id>', 'GET') == before + 2
+    text = client.get('/metrics').get_data(as_text=True)
+    assert sample(text, 'library_http_requests_total{endpoint="unmatched",method="GET",status="404"}') >= 1
+    assert sample(text, 'library_http_request_sql_statements_count{endpoint="/api/books/<int:book_id>"}') >= 2
+    assert sample(text, 'library_sql_statements_total{operation="SELECT"}') >= 1
+    assert sample(text, 'library_book_cache_hit_ratio') is not None
+    assert sample(text, 'library_db_pool_checkouts_total') >= 1
+
+# Test case 3: /metrics speaks the Prometheus text format and can be switched off
+def test_metrics_endpoint(app_db):
+    path, _ = app_db
+    response = make_client(path).get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type == metrics.CONTENT_TYPE
+
+    client = make_client(path, LIBRARY_METRICS_ENABLED=False)
+    assert client.get('/metrics').status_code == 404
+
+# Test case 4: X-Profile returns a cProfile and SQL breakdown only when profiling is enabled
+def test_profile_header(app_db):
+    path, _ = app_db
+    plain = make_client(path).get('/api/books/1', headers={'X-Profile': '1'})
+    assert plain.is_json and 'X-Profile-Duration-Ms' not in plain.headers
+
+    response = make_client(path, LIBRARY_PROFILING_ENABLED=True).get('/api/books/1', headers={'X-Profile': '1'})
+    report = response.get_data(as_text=True)
+    assert response.mimetype == 'text/plain'
+    assert int(response.headers['X-Profile-SQL-Statements']) >= 1
+    assert report.startswith('GET /api/books/1 -> 200')
+    assert 'SELECT' in report and 'cumulative' in report
+
+# Test case 5: gateway calls are timed by operation and outcome
+def test_gateway_latency(tmp_path):
+    with temp_database(tmp_path / 'gateway.db') as db:
+        book_id = add_book('Overdue Book', 'Author', '9780000000001')
+        now = datetime.now()
+        db.insert_borrow_record('123456', book_id, now - timedelta(days=24), now - timedelta(days=10))
+        gateway = Mock(spec=PaymentGateway)
+        gateway.process_payment.side_effect = TimeoutError('read timed out')
+        before = metrics.GATEWAY_DURATION.count('charge', 'error')
+
+        pay_late_fees('123456', book_id, gateway)
+
+        assert metrics.GATEWAY_DURATION.count('charge', 'error') == before + 1
@@ -0,0 +1,36 @@
+import pytest
+import sys
+import os
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.microbench import BENCHMARKS, compare, measure, run
+
+# Test case 1: every service function is timed on both backends, on their success paths
+def test_run_all_benchmarks():
+    results = run([200], ['memory', 'file'], min_time=0.01, min_rounds=3)
+
+    assert set(results) == {f'{name}[{backend}-200]' for name in BENCHMARKS for backend in ('memory', 'file')}
+    for stats in results.values():
+        assert stats['rounds'] >= 3
+        assert 0 < stats['min_us'] <= stats['median_us']
+
+# Test case 2: -k style filtering runs only the matching benchmarks
+def test_keyword_filter():
+    results = run([200], ['memory', 'file'], min_time=0.01, min_rounds=3, keyword='search_books_in_catalog[file')
+    assert list(results) == ['search_books_in_catalog[file-200]']
+
+# Test case 3: only setup/teardown run untimed, and the gate flags slowdowns beyond the tolerance
+def test_measure_and_compare():
+    calls = []
+    stats = measure(lambda i: calls.append(('call', i)), setup=lambda i: calls.append(('setup', i)),
+                    min_time=0, min_rounds=4)
+    assert stats['rounds'] == 4
+    assert calls[:2] == [('setup', 0), ('call', 0)]
+
+    baseline = {'a': {'median_us': 100.0, 'min_us': 90.0}, 'b': {'median_us': 100.0, 'min_us': 90.0}}
+    now = {'a': {'median_us': 130.0, 'min_us': 95.0}, 'b': {'median_us': 110.0, 'min_us': 90.0},
+           'new': {'median_us': 1.0, 'min_us': 1.0}}
+    assert compare(now, baseline, tolerance=25) == ['a']
+    assert compare(now, baseline, tolerance=25, stat='min') == []
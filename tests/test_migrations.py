@@ -0,0 +1,100 @@
+import pytest
+import sys
+import os
+import sqlite3
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import migrations
+from migrations import run_migrations, get_schema_version, backfill_in_batches, migration
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'migrate.db'))
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Isolated copy of the migration registry for tests that add migrations."""
+    monkeypatch.setattr(migrations, 'MIGRATIONS', list(migrations.MIGRATIONS))
+    return migrations.MIGRATIONS
+
+
+def table_names(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'index')")}
+
+# Test case 1: a new database is brought to the latest version
+def test_fresh_database_gets_all_migrations(conn):
+    applied = run_migrations(conn)
+
+    assert applied == [m['version'] for m in migrations.MIGRATIONS]
+    assert get_schema_version(conn) == migrations.MIGRATIONS[-1]['version']
+    assert {'books', 'borrow_records', 'idx_borrow_records_patron_borrow_date'} <= table_names(conn)
+    assert 'idx_borrow_records_active' not in table_names(conn)
+
+# Test case 2: running again is a no-op
+def test_run_migrations_is_idempotent(conn):
+    run_migrations(conn)
+
+    assert run_migrations(conn) == []
+
+# Test case 3: a pre-migration library.db (tables, no schema_version) is upgraded in place
+def test_legacy_database_is_upgraded(conn):
+    migrations.create_base_tables(conn)
+    conn.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) "
+                 "VALUES ('Old', 'Author', '1234567890123', 1, 1)")
+    conn.commit()
+
+    run_migrations(conn)
+
+    assert conn.execute('SELECT COUNT(*) FROM books').fetchone()[0] == 1
+    assert 'idx_books_title' in table_names(conn)
+
+# Test case 4: target stops the upgrade at a given version
+def test_run_migrations_up_to_target(conn):
+    assert run_migrations(conn, target=1) == [1]
+    assert get_schema_version(conn) == 1
+    assert 'idx_books_title' not in table_names(conn)
+
+# Test case 5: a failing migration is rolled back and not recorded
+def test_failing_migration_is_rolled_back(conn, registry):
+    run_migrations(conn)
+    version = registry[-1]['version'] + 1
+
+    @migration(version, 'broken')
+    def broken(conn):
+        conn.execute('CREATE TABLE half_done (x INTEGER)')
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        run_migrations(conn)
+
+    assert get_schema_version(conn) == version - 1
+    assert 'half_done' not in table_names(conn)
+
+# Test case 6: backfills run in several short transactions and cover every row
+def test_backfill_in_batches(conn, registry):
+    run_migrations(conn)
+    conn.executemany("INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) "
+                     "VALUES (?, 1, '2024-01-01', '2024-01-15')", [(f'{i:06d}',) for i in range(25)])
+    conn.commit()
+    conn.execute('ALTER TABLE borrow_records ADD COLUMN flag INTEGER')
+    commits = []
+    conn.set_trace_callback(lambda sql: commits.append(sql) if sql == 'COMMIT' else None)
+
+    changed = backfill_in_batches(conn, 'borrow_records',
+                                  'UPDATE borrow_records SET flag = 1 WHERE rowid > :start AND rowid <= :end',
+                                  batch_size=10)
+
+    assert changed == 25
+    assert len(commits) == 3
+    assert conn.execute('SELECT COUNT(*) FROM borrow_records WHERE flag = 1').fetchone()[0] == 25
+
+# Test case 7: duplicate versions are rejected at registration time
+def test_duplicate_version_rejected(registry):
+    with pytest.raises(ValueError):
+        migration(1, 'duplicate')(lambda conn: None)
@@ -0,0 +1,139 @@
+import pytest
+import sys
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import migrations
+from db_utils import temp_database, add_book
+from services.library_service import borrow_book_by_patron, return_book_by_patron, reconcile_patron_counters
+
+
+@pytest.fixture
+def db(tmp_path):
+    with temp_database(tmp_path / 'counters.db') as db:
+        yield db
+
+
+def counters(db, patron_id):
+    conn = db.get_db_connection()
+    try:
+        row = conn.execute('SELECT active_loans, fees_assessed FROM patrons WHERE patron_id = ?',
+                           (patron_id,)).fetchone()
+    finally:
+        conn.close()
+    return tuple(row) if row else None
+
+# Test case 1: borrow and return keep active_loans in step
+def test_borrow_and_return_update_active_loans(db):
+    book_id = add_book(copies=3)
+
+    borrow_book_by_patron('123456', book_id)
+    borrow_book_by_patron('123456', book_id)
+    assert counters(db, '123456') == (2, 0.0)
+    assert db.get_patron_borrow_count('123456') == 2
+
+    return_book_by_patron('123456', book_id)
+    assert counters(db, '123456') == (1, 0.0)
+
+# Test case 2: writes outside the transactions are counted by the triggers
+def test_direct_writes_update_active_loans(db):
+    book_id = add_book(copies=3)
+    now = datetime.now()
+
+    db.insert_borrow_record('123456', book_id, now, now + timedelta(days=14))
+    db.insert_borrow_record('123456', book_id, now, now + timedelta(days=14))
+    db.update_borrow_record_return_date('123456', book_id, now)
+    assert counters(db, '123456') == (0, 0.0)
+
+    db.insert_borrow_record('654321', book_id, now, now + timedelta(days=14))
+    conn = db.get_db_connection()
+    try:
+        conn.execute("DELETE FROM borrow_records WHERE patron_id = '654321'")
+        conn.commit()
+    finally:
+        conn.close()
+    assert counters(db, '654321') == (0, 0.0)
+
+# Test case 3: a late return adds its fee to fees_assessed in the same transaction
+def test_late_return_adds_assessed_fee(db):
+    book_id = add_book(copies=3)
+    now = datetime.now()
+    db.insert_borrow_record('123456', book_id, now - timedelta(days=24), now - timedelta(days=10))
+
+    success, message = return_book_by_patron('123456', book_id)
+
+    assert success and 'Late fee: $6.50' in message
+    assert counters(db, '123456') == (0, 6.5)
+
+# Test case 4: the limit check reads the counter, not borrow_records
+def test_borrow_limit_uses_counter(db):
+    book_id = add_book(copies=3)
+    conn = db.get_db_connection()
+    try:
+        conn.execute("INSERT INTO patrons (patron_id, active_loans) VALUES ('123456', 6)")
+        conn.commit()
+    finally:
+        conn.close()
+
+    success, message = borrow_book_by_patron('123456', book_id)
+
+    assert not success and 'maximum borrowing limit' in message
+
+# Test case 5: reconciliation finds and repairs drift, batch by batch
+def test_reconcile_repairs_drift(db):
+    book_id = add_book(copies=50)
+    now = datetime.now()
+    for i in range(7):
+        db.insert_borrow_record(f'10000{i}', book_id, now, now + timedelta(days=14))
+    db.insert_borrow_record('100001', book_id, now - timedelta(days=30), now - timedelta(days=16))
+    db.update_borrow_record_return_date('100001', book_id, now - timedelta(days=14))
+    conn = db.get_db_connection()
+    try:
+        conn.execute("UPDATE patrons SET active_loans = 9 WHERE patron_id = '100003'")
+        conn.execute("INSERT INTO patrons (patron_id, active_loans) VALUES ('100009', 2)")
+        conn.commit()
+    finally:
+        conn.close()
+
+    report = reconcile_patron_counters(fix=False, batch_size=3)
+    assert report['batches'] == 3
+    assert report['patrons_checked'] == 8
+    assert {m['patron_id'] for m in report['mismatches']} == {'100001', '100003', '100009'}
+    assert report['fixed'] == 0
+
+    reconcile_patron_counters(batch_size=3)
+    assert counters(db, '100001') == (0, 1.0)
+    assert counters(db, '100003') == (1, 0.0)
+    assert counters(db, '100009') == (0, 0.0)
+    assert reconcile_patron_counters()['mismatches'] == []
+
+# Test case 6: upgrading an existing database backfills the counters, one batch of patrons at a time
+def test_migration_backfills_counters(tmp_path, monkeypatch):
+    monkeypatch.setattr(migrations, 'PATRON_BACKFILL_BATCH_SIZE', 1)
+    conn = sqlite3.connect(str(tmp_path / 'legacy.db'))
+    try:
+        migrations.run_migrations(conn, target=6)
+        now = datetime(2024, 3, 1)
+        conn.executemany('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date)
+            VALUES (?, 1, ?, ?, ?)
+        ''', [('123456', now.isoformat(), (now + timedelta(days=14)).isoformat(), None),
+              ('123456', now.isoformat(), (now + timedelta(days=14)).isoformat(),
+               (now + timedelta(days=17)).isoformat()),
+              ('654321', now.isoformat(), (now + timedelta(days=14)).isoformat(),
+               (now + timedelta(days=10)).isoformat()),
+              ('777777', now.isoformat(), (now + timedelta(days=14)).isoformat(),
+               (now + timedelta(days=60)).isoformat())])
+        conn.commit()
+
+        migrations.run_migrations(conn)
+
+        rows = conn.execute('SELECT patron_id, active_loans, fees_assessed FROM patrons ORDER BY patron_id')
+        assert rows.fetchall() == [('123456', 1, 1.5), ('654321', 0, 0.0), ('777777', 0, 15.0)]
+        assert not conn.in_transaction
+    finally:
+        conn.close()
@@ -0,0 +1,107 @@
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db_utils import temp_database, add_book
+from services.library_service import get_patron_status_report, get_patron_history, calculate_late_fee_for_book
+from app import create_app
+
+
+@pytest.fixture
+def patron(tmp_path):
+    """Patron 123456 with five overdue loans, one current loan and a returned history."""
+    # A single pooled connection so the trace callback sees every query
+    with temp_database(tmp_path / 'report.db', LIBRARY_DB_POOL_SIZE=1) as db:
+        now = datetime.now()
+        book_ids = [add_book(f'Book {i}', 'Author', f'97800000000{i:02d}', copies=3) for i in range(6)]
+        for i in range(10):
+            borrowed = now - timedelta(days=100 + i)
+            db.insert_borrow_record('123456', book_ids[i % 6], borrowed, borrowed + timedelta(days=14))
+            db.update_borrow_record_return_date('123456', book_ids[i % 6], borrowed + timedelta(days=20))
+        for i, book_id in enumerate(book_ids[:5]):
+            db.insert_borrow_record('123456', book_id, now - timedelta(days=20 + i), now - timedelta(days=6 + 3 * i))
+        db.insert_borrow_record('123456', book_ids[5], now - timedelta(days=1), now + timedelta(days=13))
+
+        statements = []
+        conn = db.get_db_connection()
+        conn.set_trace_callback(lambda s: s != 'SELECT 1' and statements.append(s))
+        conn.close()
+        yield book_ids, statements
+
+# Test case 1: the report costs a fixed number of queries and only one history page
+def test_status_report_query_count_is_bounded(patron):
+    book_ids, statements = patron
+
+    report = get_patron_status_report('123456', history_limit=4)
+
+    # open loans with the SQL summary, then the first history page
+    assert len(statements) == 2
+    assert report['total_books_borrowed'] == 6
+    assert len(report['borrow_history']) == 4
+    assert report['history_cursor'] is not None
+
+# Test case 2: in-memory fees match the per-book late fee API
+def test_status_report_fees_match_per_book_calculation(patron):
+    book_ids, statements = patron
+
+    report = get_patron_status_report('123456')
+
+    expected = sum(calculate_late_fee_for_book('123456', book_id)['fee_amount'] for book_id in book_ids)
+    assert report['total_late_fees_owed'] == round(expected, 2)
+    assert [book['fee_amount'] for book in report['currently_borrowed']] == \
+        [calculate_late_fee_for_book('123456', book['book_id'])['fee_amount'] for book in report['currently_borrowed']]
+
+# Test case 3: current loans are oldest first, history is newest first
+def test_status_report_ordering(patron):
+    report = get_patron_status_report('123456')
+
+    borrowed = [book['borrow_date'] for book in report['currently_borrowed']]
+    history = [record['borrow_date'] for record in report['borrow_history']]
+    assert borrowed == sorted(borrowed)
+    assert history == sorted(history, reverse=True)
+
+# Test case 4: following the cursor visits every returned loan once, newest first
+def test_history_pages_cover_all_returned_loans(patron):
+    page = get_patron_status_report('123456', history_limit=3)
+    seen = page['borrow_history']
+    cursor = page['history_cursor']
+    while cursor:
+        page = get_patron_history('123456', before=cursor, limit=3)
+        seen += page['history']
+        cursor = page['next_cursor']
+
+    dates = [record['borrow_date'] for record in seen]
+    assert len({record['id'] for record in seen}) == len(seen) == 10
+    assert dates == sorted(dates, reverse=True)
+
+# Test case 5: totals are counted in SQL over the whole history
+def test_status_report_summary(patron):
+    summary = get_patron_status_report('123456', history_limit=1)['summary']
+
+    # ten returned six days late, five still out past their due date
+    assert summary == {'total_loans': 16, 'active_loans': 6, 'returned_loans': 10, 'overdue_loans': 15}
+
+# Test case 6: the JSON endpoint pages with an opaque cursor and rejects bad ones
+def test_history_api(tmp_path):
+    path = tmp_path / 'api.db'
+    with temp_database(path) as db:
+        app = create_app({'LIBRARY_DB_PATH': str(path)})
+        client = app.test_client()
+        book_id = add_book(isbn='9780000000099', copies=3)
+        borrowed = datetime(2024, 1, 1)
+        for i in range(3):
+            db.insert_borrow_record('222222', book_id, borrowed + timedelta(days=i), borrowed + timedelta(days=14 + i))
+            db.update_borrow_record_return_date('222222', book_id, borrowed + timedelta(days=10 + i))
+
+        first = client.get('/api/patrons/222222/history?limit=2').get_json()
+        second = client.get(f"/api/patrons/222222/history?limit=2&cursor={first['next_cursor']}").get_json()
+
+        assert [loan['borrow_date'][:10] for loan in first['history']] == ['2024-01-03', '2024-01-02']
+        assert [loan['borrow_date'][:10] for loan in second['history']] == ['2024-01-01']
+        assert second['next_cursor'] is None
+        assert client.get('/api/patrons/222222/history?cursor=bogus').status_code == 400
+        assert client.get('/api/patrons/12/history').status_code == 400
@@ -0,0 +1,161 @@
+import pytest
+import sys
+import os
+import threading
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db_utils import temp_database, add_book
+from services.library_service import (
+    enqueue_late_fee_payment, enqueue_late_fee_refund, get_payment_job_status
+)
+from services.payment_jobs import configure_payment_queue, get_payment_queue, shutdown_payment_queue
+from services.payment_service import PaymentGateway
+from app import create_app
+
+
+@pytest.fixture
+def gateway():
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.return_value = (True, 'txn_123456_1', 'Payment of $5.00 processed successfully')
+    gateway.refund_payment.return_value = (True, 'Refund of $5.00 processed successfully.')
+    return gateway
+
+
+@pytest.fixture
+def db(tmp_path, gateway):
+    with temp_database(tmp_path / 'payments.db') as db:
+        configure_payment_queue(2, gateway)
+        yield db
+        shutdown_payment_queue()
+
+
+def overdue_book(db, days_overdue=10):
+    book_id = add_book('Overdue Book', 'Author', '9780000000001')
+    now = datetime.now()
+    db.insert_borrow_record('123456', book_id, now - timedelta(days=14 + days_overdue),
+                            now - timedelta(days=days_overdue))
+    return book_id
+
+
+def finished(job_id):
+    assert get_payment_queue().wait(timeout=5)
+    return get_payment_job_status(job_id)
+
+# Test case 1: the request returns before the gateway replies; a worker completes the charge
+def test_payment_is_queued_and_processed(db, gateway):
+    book_id = overdue_book(db)
+    release = threading.Event()
+    gateway.process_payment.side_effect = lambda **kwargs: (
+        release.wait(5), (True, 'txn_123456_1', 'Payment of $5.00 processed successfully'))[1]
+
+    success, message, job_id = enqueue_late_fee_payment('123456', book_id)
+
+    assert success
+    assert message == 'Payment of $6.50 queued.'
+    assert get_payment_job_status(job_id)['status'] in ('queued', 'processing')
+    release.set()
+    job = finished(job_id)
+    assert job['status'] == 'succeeded'
+    assert job['transaction_id'] == 'txn_123456_1'
+    assert job['message'] == 'Payment successful! Payment of $5.00 processed successfully'
+    gateway.process_payment.assert_called_once_with(
+        patron_id='123456', amount=6.5, description="Late fees for 'Overdue Book'")
+
+# Test case 2: declines and gateway errors end as failed jobs
+def test_payment_failures_are_recorded(db, gateway):
+    book_id = overdue_book(db)
+    gateway.process_payment.return_value = (False, '', 'Payment declined: amount exceeds limit')
+    _, _, declined = enqueue_late_fee_payment('123456', book_id)
+    assert finished(declined)['message'] == 'Payment failed: Payment declined: amount exceeds limit'
+
+    gateway.process_payment.side_effect = TimeoutError('gateway timeout')
+    _, _, errored = enqueue_late_fee_payment('123456', book_id)
+    job = finished(errored)
+    assert job['status'] == 'failed'
+    assert job['transaction_id'] is None
+    assert job['message'] == 'Payment processing error: gateway timeout'
+
+# Test case 3: nothing is queued when there is no fee to pay
+def test_no_job_without_late_fee(db, gateway):
+    book_id = overdue_book(db, days_overdue=-3)
+
+    assert enqueue_late_fee_payment('123456', book_id) == (False, 'No late fees to pay for this book.', None)
+    assert enqueue_late_fee_payment('12345', book_id)[2] is None
+    assert enqueue_late_fee_refund('bad_id', 5.0) == (False, 'Invalid transaction ID.', None)
+    gateway.process_payment.assert_not_called()
+
+# Test case 4: refunds go through the same queue
+def test_refund_is_queued(db, gateway):
+    success, _, job_id = enqueue_late_fee_refund('txn_123456_1', 5.0)
+
+    job = finished(job_id)
+    assert success
+    assert job['kind'] == 'refund'
+    assert job['status'] == 'succeeded'
+    assert job['transaction_id'] == 'txn_123456_1'
+    gateway.refund_payment.assert_called_once_with('txn_123456_1', 5.0)
+
+# Test case 5: a job submitted twice is only charged once
+def test_job_is_claimed_once(db, gateway):
+    book_id = overdue_book(db)
+    job_id = db.insert_payment_job('charge', 5.0, 'Late fees', patron_id='123456', book_id=book_id)
+
+    queue = get_payment_queue()
+    queue.submit(job_id)
+    queue.submit(job_id)
+
+    assert finished(job_id)['status'] == 'succeeded'
+    assert gateway.process_payment.call_count == 1
+
+# Test case 6: after a restart queued jobs run again and interrupted ones are failed, not re-charged
+def test_resume_unfinished_jobs(db, gateway):
+    queued = db.insert_payment_job('charge', 5.0, 'Late fees', patron_id='123456', book_id=1)
+    interrupted = db.insert_payment_job('charge', 5.0, 'Late fees', patron_id='123456', book_id=1)
+    db.start_payment_job(interrupted)
+
+    assert get_payment_queue().resume() == 1
+
+    assert finished(queued)['status'] == 'succeeded'
+    assert get_payment_job_status(interrupted)['status'] == 'failed'
+    assert gateway.process_payment.call_count == 1
+
+# Test case 7: a job that errors after it was claimed is failed with the error, not left processing
+def test_job_error_is_recorded(db, gateway, monkeypatch):
+    job_id = db.insert_payment_job('charge', 5.0, 'Late fees', patron_id='123456', book_id=1)
+    monkeypatch.setattr('services.payment_jobs.insert_payment', Mock(side_effect=RuntimeError('disk I/O error')))
+
+    with pytest.raises(RuntimeError):
+        get_payment_queue().run_job(job_id)
+
+    job = get_payment_job_status(job_id)
+    assert job['status'] == 'failed'
+    assert job['message'] == 'Payment job error: disk I/O error; check the payment before retrying.'
+    assert get_payment_queue().resume() == 0
+    assert get_payment_job_status(job_id)['message'] == job['message']
+    gateway.process_payment.assert_not_called()
+
+# Test case 8: the API answers 202 with a status URL that reports the outcome
+def test_payment_api(tmp_path, gateway):
+    path = tmp_path / 'app.db'
+    with temp_database(path) as db:
+        client = create_app({'LIBRARY_DB_PATH': str(path), 'PAYMENT_GATEWAY': gateway}).test_client()
+        book_id = overdue_book(db)
+
+        response = client.post(f'/api/payments/late_fee/123456/{book_id}')
+        assert response.status_code == 202
+        status_url = response.headers['Location']
+        assert response.get_json()['job_id'] == int(status_url.rsplit('/', 1)[1])
+
+        assert get_payment_queue().wait(timeout=5)
+        job = client.get(status_url).get_json()
+        assert job['status'] == 'succeeded'
+        assert job['amount'] == 6.5
+
+        assert client.post('/api/payments/refund', json={'transaction_id': 'txn_1', 'amount': 'x'}).status_code == 400
+        assert client.post('/api/payments/late_fee/abc/1').status_code == 400
+        assert client.get('/api/payments/jobs/999').status_code == 404
+        shutdown_payment_queue()
@@ -20,6 +20,18 @@ from services.payment_service import (
     PaymentGateway
 )
 
+from db_utils import temp_database
+
+
+@pytest.fixture(autouse=True)
+def payments_ledger(tmp_path):
+    """
+    pay_late_fees() and refund_late_fee_payment() record every gateway call in
+    the payments ledger, so each test gets a throw-away database that has one.
+    """
+    with temp_database(tmp_path / 'payments.db') as db:
+        yield db
+
 """ ********************  Using Stubbing for Unit Testing  begin  ***********************  """
 
 def test_pay_late_fees_successful_payment_with_stubbing():
@@ -0,0 +1,122 @@
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db_utils import temp_database, add_book
+from services.library_service import pay_late_fees, refund_late_fee_payment, get_patron_payment_history
+from services.payment_jobs import get_payment_queue, shutdown_payment_queue
+from services.payment_service import PaymentGateway
+from app import create_app
+
+
+@pytest.fixture
+def gateway():
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.return_value = (True, 'txn_123456_1', 'Payment of $6.50 processed successfully')
+    gateway.refund_payment.return_value = (True, 'Refund of $2.00 processed successfully.')
+    return gateway
+
+
+@pytest.fixture
+def db(tmp_path):
+    with temp_database(tmp_path / 'ledger.db') as db:
+        yield db
+
+
+def overdue_book(db, patron_id='123456', isbn='9780000000001'):
+    book_id = add_book('Overdue Book', 'Author', isbn)
+    now = datetime.now()
+    db.insert_borrow_record(patron_id, book_id, now - timedelta(days=24), now - timedelta(days=10))
+    return book_id
+
+# Test case 1: every charge is entered in the ledger with its outcome
+def test_charges_are_recorded(db, gateway):
+    book_id = overdue_book(db)
+
+    assert pay_late_fees('123456', book_id, gateway)[0]
+    gateway.process_payment.return_value = (False, '', 'Payment declined: amount exceeds limit')
+    assert not pay_late_fees('123456', book_id, gateway)[0]
+
+    payments = get_patron_payment_history('123456')['payments']
+    assert [(p['kind'], p['status'], p['amount'], p['transaction_id']) for p in payments] == [
+        ('charge', 'failed', 6.5, None), ('charge', 'succeeded', 6.5, 'txn_123456_1')]
+    assert payments[0]['message'] == 'Payment failed: Payment declined: amount exceeds limit'
+
+# Test case 2: a retry with the same key returns the first result without charging again
+def test_idempotent_charge(db, gateway):
+    book_id = overdue_book(db)
+
+    first = pay_late_fees('123456', book_id, gateway, idempotency_key='key-1')
+    retry = pay_late_fees('123456', book_id, gateway, idempotency_key='key-1')
+
+    assert first == retry == (True, 'Payment successful! Payment of $6.50 processed successfully', 'txn_123456_1')
+    assert gateway.process_payment.call_count == 1
+    assert len(get_patron_payment_history('123456')['payments']) == 1
+
+# Test case 3: failures replay too, so a timed-out charge is never retried blindly
+def test_idempotent_failure(db, gateway):
+    book_id = overdue_book(db)
+    gateway.process_payment.side_effect = TimeoutError('read timed out')
+
+    first = pay_late_fees('123456', book_id, gateway, idempotency_key='key-1')
+    retry = pay_late_fees('123456', book_id, gateway, idempotency_key='key-1')
+
+    assert first == retry == (False, 'Payment processing error: read timed out', None)
+    assert gateway.process_payment.call_count == 1
+
+# Test case 4: a key still in flight, or reused for another payment, does not reach the gateway
+def test_pending_and_mismatched_keys(db, gateway):
+    book_id = overdue_book(db)
+    db.insert_payment('charge', 6.5, '123456', book_id, idempotency_key='in-flight')
+    pay_late_fees('123456', book_id, gateway, idempotency_key='key-1')
+
+    assert pay_late_fees('123456', book_id, gateway, idempotency_key='in-flight') == (
+        False, 'A payment with this idempotency key is still being processed.', None)
+    assert pay_late_fees('654321', book_id, gateway, idempotency_key='key-1') == (
+        False, 'This idempotency key was already used for a different payment.', None)
+    assert gateway.process_payment.call_count == 1
+
+# Test case 5: refunds are idempotent and filed under the patron of the original charge
+def test_idempotent_refund(db, gateway):
+    book_id = overdue_book(db)
+    pay_late_fees('123456', book_id, gateway)
+
+    first = refund_late_fee_payment('txn_123456_1', 2.0, gateway, idempotency_key='refund-1')
+    retry = refund_late_fee_payment('txn_123456_1', 2.0, gateway, idempotency_key='refund-1')
+
+    assert first == retry == (True, 'Refund of $2.00 processed successfully.')
+    assert gateway.refund_payment.call_count == 1
+    refund = get_patron_payment_history('123456')['payments'][0]
+    assert (refund['kind'], refund['reference'], refund['book_id']) == ('refund', 'txn_123456_1', book_id)
+
+# Test case 6: the queued API honours Idempotency-Key and the ledger is paged newest first
+def test_payments_api(tmp_path, gateway):
+    path = tmp_path / 'app.db'
+    with temp_database(path) as db:
+        client = create_app({'LIBRARY_DB_PATH': str(path), 'PAYMENT_GATEWAY': gateway}).test_client()
+        book_id = overdue_book(db)
+
+        headers = {'Idempotency-Key': 'req-1'}
+        first = client.post(f'/api/payments/late_fee/123456/{book_id}', headers=headers).get_json()
+        retry = client.post(f'/api/payments/late_fee/123456/{book_id}', headers=headers).get_json()
+        assert first['job_id'] == retry['job_id']
+        assert retry['message'] == 'Payment of $6.50 already queued.'
+        assert get_payment_queue().wait(timeout=5)
+        for _ in range(2):
+            pay_late_fees('123456', book_id, gateway)
+
+        page = client.get('/api/patrons/123456/payments?limit=2').get_json()
+        rest = client.get(f"/api/patrons/123456/payments?limit=2&cursor={page['next_cursor']}").get_json()
+
+        ids = [p['id'] for p in page['payments'] + rest['payments']]
+        assert ids == [3, 2, 1]
+        assert rest['next_cursor'] is None
+        assert rest['payments'][0]['idempotency_key'] == 'job-1'
+        assert gateway.process_payment.call_count == 3
+        assert client.get('/api/patrons/123456/payments?cursor=bogus').status_code == 400
+        shutdown_payment_queue()
@@ -0,0 +1,96 @@
+import pytest
+import sys
+import os
+import re
+from datetime import datetime, timedelta
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+from db_utils import temp_database, add_book
+from services.library_service import get_patron_status_report
+
+# Every table access must be an index or rowid lookup. "SCAN t" is a full
+# table scan and "SCAN t USING INDEX i" a full index scan; both read every row.
+INDEXED_SEARCH = re.compile(r'^SEARCH \w+( AS \w+)? USING (COVERING INDEX|INDEX|INTEGER PRIMARY KEY) ')
+INDEX_SCAN = re.compile(r'^SCAN \w+( AS \w+)? USING (COVERING )?INDEX ')
+
+# Calls that read a whole table by design may walk an index in order instead
+WHOLE_TABLE_READS = {'all_books'}
+
+
+@pytest.fixture
+def traced_db(tmp_path):
+    """Temp database with a single pooled connection whose statements are recorded."""
+    with temp_database(tmp_path / 'plans.db', LIBRARY_DB_POOL_SIZE=1) as db:
+        book_id = add_book(copies=3)
+        db.borrow_book_transaction('123456', book_id, datetime.now(),
+                                   datetime.now() + timedelta(days=14), borrow_limit=5)
+        statements = []
+        conn = db.get_db_connection()
+        conn.set_trace_callback(statements.append)
+        conn.close()
+        yield db, book_id, statements
+
+
+def query_plan(statement):
+    conn = database.get_db_connection()
+    try:
+        conn.set_trace_callback(None)
+        return [row['detail'] for row in conn.execute('EXPLAIN QUERY PLAN ' + statement)]
+    finally:
+        conn.close()
+
+
+def assert_indexed(statements, whole_table: bool = False):
+    queries = [s for s in statements if s.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE'))
+               and s.strip() != 'SELECT 1']
+    assert queries, "no queries were captured"
+    for statement in queries:
+        plan = query_plan(statement)
+        for detail in plan:
+            if detail.startswith(('SCAN ', 'SEARCH ')):
+                assert INDEXED_SEARCH.match(detail) or (whole_table and INDEX_SCAN.match(detail)), \
+                    f"table or index scan in:\n{statement}\n{plan}"
+            assert 'TEMP B-TREE' not in detail, f"unindexed sort in:\n{statement}\n{plan}"
+
+
+@pytest.mark.parametrize('call', [
+    lambda db, book_id: db.get_all_books(),
+    lambda db, book_id: db.get_book_by_id(book_id),
+    lambda db, book_id: db.get_book_by_isbn('1234567890123'),
+    lambda db, book_id: db.get_patron_borrowed_books('123456'),
+    lambda db, book_id: db.get_patron_borrow_count('123456'),
+    lambda db, book_id: db.get_patron_history_page('123456', limit=20),
+    lambda db, book_id: db.get_patron_history_page('123456', before=(datetime.now().isoformat(), 10), limit=20),
+    lambda db, book_id: db.get_patron_loans_and_summary('123456', datetime.now()),
+    lambda db, book_id: list(db.iter_overdue_loans(datetime.now() + timedelta(days=30))),
+    lambda db, book_id: db.update_borrow_record_return_date('654321', book_id, datetime.now()),
+    lambda db, book_id: db.borrow_book_transaction('654321', book_id, datetime.now(),
+                                                   datetime.now() + timedelta(days=14), borrow_limit=5),
+    lambda db, book_id: db.return_book_transaction('123456', book_id, datetime.now()),
+    lambda db, book_id: db.borrow_books_transaction('654321', [book_id, book_id], datetime.now(),
+                                                    datetime.now() + timedelta(days=14), borrow_limit=5),
+    lambda db, book_id: db.return_books_transaction('123456', [book_id], datetime.now()),
+    lambda db, book_id: get_patron_status_report('123456'),
+    lambda db, book_id: db.reconcile_patron_counters_batch('', 100, lambda due, returned: 0.0),
+    lambda db, book_id: db.search_books('test', 'title', match='prefix', limit=20),
+    lambda db, book_id: db.search_books('test', 'author', match='prefix', limit=20),
+    lambda db, book_id: db.search_books('1234567890123', 'isbn'),
+    lambda db, book_id: db.get_patron_payments_page('123456', limit=20),
+    lambda db, book_id: db.get_patron_payments_page('123456', before=(datetime.now().isoformat(), 10), limit=20),
+    lambda db, book_id: db.get_payment_by_key('key-1'),
+    lambda db, book_id: db.get_charge_by_transaction('txn_123456_1'),
+], ids=['all_books', 'book_by_id', 'book_by_isbn', 'borrowed_books', 'borrow_count', 'history_first_page',
+        'history_next_page', 'loan_summary', 'overdue_loans',
+        'return_date_update', 'borrow_transaction', 'return_transaction',
+        'batch_borrow_transaction', 'batch_return_transaction', 'status_report', 'reconcile_batch',
+        'search_title_prefix', 'search_author_prefix', 'search_isbn',
+        'payments_first_page', 'payments_next_page', 'payment_by_key', 'charge_by_transaction'])
+def test_hot_queries_use_indexes(traced_db, call, request):
+    db, book_id, statements = traced_db
+
+    call(db, book_id)
+
+    assert_indexed(statements, whole_table=request.node.callspec.id in WHOLE_TABLE_READS)
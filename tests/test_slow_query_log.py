@@ -0,0 +1,91 @@
+import pytest
+import sys
+import os
+import json
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+from db_utils import temp_database
+from slow_query_log import (
+    SlowQueryLog, configure_slow_query_log, normalize_sql, parameter_shape, read_log, summarize
+)
+from services.library_service import get_patron_status_report
+from services.payment_jobs import shutdown_payment_queue
+from app import create_app
+
+
+@pytest.fixture
+def db(tmp_path):
+    with temp_database(tmp_path / 'slow.db') as db:
+        yield db
+    configure_slow_query_log('')
+
+
+def entries(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+# Test case 1: literals, whitespace and IN-list lengths do not split a query into several groups
+def test_normalize_sql():
+    assert normalize_sql("SELECT *\n  FROM books WHERE id IN (?, ?, ?) AND title = 'It''s' LIMIT 20") == \
+        normalize_sql("SELECT * FROM books WHERE id IN (?,?) AND title = 'x' LIMIT 5") == \
+        'SELECT * FROM books WHERE id IN (?, ...) AND title = ? LIMIT ?'
+    assert normalize_sql('SELECT * FROM idx_books_2') == 'SELECT * FROM idx_books_2'
+
+# Test case 2: parameters are logged as types and lengths, never values
+def test_parameter_shape():
+    assert parameter_shape(('123456', 7, None, 1.5)) == ['str[6]', 'int', 'null', 'float']
+    assert parameter_shape({'patron_id': '123456'}) == {'patron_id': 'str[6]'}
+    assert parameter_shape(None) == 'executemany'
+
+# Test case 3: statements over the threshold are logged with their plan; faster ones are not
+def test_slow_statements_logged(db, tmp_path):
+    path = tmp_path / 'slow.log'
+    log = configure_slow_query_log(str(path), threshold_ms=0)
+
+    get_patron_status_report('123456')
+    log.threshold = 60.0
+    get_patron_status_report('123456')
+
+    logged = entries(path)
+    history = [e for e in logged if 'FROM borrow_records' in e['query'] and 'return_date IS NOT NULL' in e['query']]
+    assert history and len(history) == len([e for e in logged if e['query'] == history[0]['query']])
+    assert history[0]['params'][0] == 'str[6]'
+    assert '123456' not in path.read_text()
+    assert any('USING' in step for step in history[0]['plan'])
+    assert all(e['duration_ms'] >= 0 and e['request'] is None for e in logged)
+
+# Test case 4: requests are named by route, and logging can be switched off again
+def test_request_route_and_disable(tmp_path):
+    path, log_path = tmp_path / 'app.db', tmp_path / 'slow.log'
+    with temp_database(path):
+        client = create_app({'LIBRARY_DB_PATH': str(path), 'LIBRARY_SLOW_QUERY_LOG': str(log_path),
+                             'LIBRARY_SLOW_QUERY_MS': 0}).test_client()
+        client.post('/borrower_status', data={'action': 'query', 'patron_id': '123456'})
+        assert 'POST /borrower_status' in {e['request'] for e in entries(log_path)}
+
+        create_app({'LIBRARY_DB_PATH': str(path)})
+        size = log_path.stat().st_size
+        client.post('/borrower_status', data={'action': 'query', 'patron_id': '123456'})
+        assert log_path.stat().st_size == size
+    shutdown_payment_queue()
+
+# Test case 5: rotated files are read back and the summary aggregates by query
+def test_rotation_and_summary(db, tmp_path):
+    path = tmp_path / 'slow.log'
+    log = SlowQueryLog(str(path), threshold_ms=0, max_bytes=2000, backups=3)
+    for seconds in (0.001, 0.003, 0.002):
+        log('SELECT * FROM books WHERE id = ?', (1,), seconds)
+    for _ in range(10):
+        log('SELECT * FROM books WHERE isbn = ?', ('9780000000001',), 0.0005)
+    log('BEGIN', (), 0.004)
+    log.close()
+
+    assert os.path.exists(f'{path}.1')
+    summary = {group['query']: group for group in summarize(read_log(str(path)))}
+    by_id = summary['SELECT * FROM books WHERE id = ?']
+    assert (by_id['count'], by_id['total_ms'], by_id['max_ms']) == (3, 6.0, 3.0)
+    assert summary['SELECT * FROM books WHERE isbn = ?']['count'] == 10
+    assert summary['BEGIN']['plan'] is None
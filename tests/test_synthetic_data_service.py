@@ -0,0 +1,98 @@
+import pytest
+import sys
+import os
+from datetime import datetime
+
+# Add the parent directory to the path to import the module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db_utils import temp_database, add_book
+from services.synthetic_data_service import generate_library, isbn13
+from services.library_service import reconcile_patron_counters
+
+AS_OF = datetime(2026, 1, 1)
+
+
+def dump(db, sql):
+    conn = db.get_db_connection()
+    try:
+        return [tuple(row) for row in conn.execute(sql)]
+    finally:
+        conn.close()
+
+
+def schema(db):
+    return dump(db, "SELECT type, name, sql FROM sqlite_master WHERE type IN ('index', 'trigger') ORDER BY name")
+
+
+# Test case 1: counters, copies and the borrow limit match the generated loans; indexes and triggers come back
+def test_generated_library_is_consistent(tmp_path):
+    with temp_database(tmp_path / 'synthetic.db') as db:
+        before = schema(db)
+        version = dump(db, 'SELECT version FROM catalog_version')[0][0]
+        result = generate_library(books=500, patrons=100, loans=20000, history_days=120, seed=3, as_of=AS_OF)
+
+        assert result['loans'] == dump(db, 'SELECT COUNT(*) FROM borrow_records')[0][0] == 20000
+        open_loans = dump(db, 'SELECT COUNT(*) FROM borrow_records WHERE return_date IS NULL')[0][0]
+        assert result['active_loans'] == open_loans
+        assert 0 < result['overdue_loans'] < result['active_loans']
+        assert reconcile_patron_counters(fix=False)['mismatches'] == []
+        assert dump(db, '''
+            SELECT COUNT(*) FROM books b
+            WHERE available_copies != total_copies - (SELECT COUNT(*) FROM borrow_records r
+                                                      WHERE r.book_id = b.id AND r.return_date IS NULL)
+               OR available_copies < 0
+        ''')[0][0] == 0
+        assert dump(db, 'SELECT MAX(active_loans) FROM patrons')[0][0] <= 5
+        assert dump(db, '''SELECT COUNT(*) FROM (SELECT 1 FROM borrow_records WHERE return_date IS NULL
+                           GROUP BY patron_id, book_id HAVING COUNT(*) > 1)''')[0][0] == 0
+        assert dump(db, f"SELECT COUNT(*) FROM borrow_records WHERE return_date > '{AS_OF.isoformat()}'"
+                        f" OR borrow_date >= '{AS_OF.isoformat()}'")[0][0] == 0
+
+        for (isbn,) in dump(db, 'SELECT isbn FROM books'):
+            assert len(isbn) == 13 and isbn13(isbn[:12]) == isbn
+        assert schema(db) == before
+        assert dump(db, 'SELECT version FROM catalog_version')[0][0] > version
+        title = dump(db, 'SELECT title FROM books WHERE id = 1')[0][0]
+        assert title in [book['title'] for book in db.search_books_fulltext(title.split()[-1], limit=500)]
+
+
+# Test case 2: the same seed reproduces the database exactly; another seed does not
+def test_generation_is_deterministic(tmp_path):
+    dumps = []
+    for name, seed in (('a.db', 5), ('b.db', 5), ('c.db', 6)):
+        with temp_database(tmp_path / name) as db:
+            generate_library(books=300, patrons=60, loans=3000, seed=seed, as_of=AS_OF, batch_size=700)
+            dumps.append((dump(db, 'SELECT * FROM books ORDER BY id'),
+                          dump(db, 'SELECT * FROM borrow_records ORDER BY id'),
+                          dump(db, 'SELECT * FROM patrons ORDER BY patron_id')))
+    assert dumps[0] == dumps[1]
+    assert dumps[0] != dumps[2]
+
+
+# Test case 3: book popularity follows the Zipf exponent, and the late/lost mix follows the rates
+def test_popularity_and_return_mix(tmp_path):
+    shares = {}
+    for skew in (1.0, 0.0):
+        with temp_database(tmp_path / f'skew-{skew}.db') as db:
+            generate_library(books=1000, patrons=200, loans=20000, seed=1, as_of=AS_OF, book_skew=skew,
+                             late_rate=0.2, lost_rate=0.0)
+            counts = [row[0] for row in dump(db, '''
+                SELECT COUNT(*) AS n FROM borrow_records GROUP BY book_id ORDER BY n DESC LIMIT 10''')]
+            shares[skew] = sum(counts) / 20000
+            late = dump(db, 'SELECT COUNT(*) FROM borrow_records WHERE return_date > due_date')[0][0]
+            assert 0.17 < late / 20000 < 0.23
+    # The 10 most popular books of 1000: H(10)/H(1000) ~ 39% under Zipf, ~1% when uniform
+    assert shares[1.0] > 0.3
+    assert shares[0.0] < 0.03
+
+
+# Test case 4: a database that already has books is left alone
+def test_refuses_non_empty_database(tmp_path):
+    with temp_database(tmp_path / 'existing.db') as db:
+        add_book(isbn='9780000000019')
+        before = schema(db)
+        with pytest.raises(ValueError):
+            generate_library(books=10, patrons=5, loans=10, as_of=AS_OF)
+        assert dump(db, 'SELECT COUNT(*) FROM books')[0][0] == 1
+        assert schema(db) == before